@@ -5,7 +5,7 @@ const api = (() => {
     const handleApiError = async (response) => {
         if (!response.ok) {
             const data = await response.json();
-            throw new Error(data.message || 'API request failed');
+            throw new Error(data.error || data.message || 'API request failed');
         }
         return response.json();
     };
@@ -119,7 +119,8 @@ const api = (() => {
             return handleApiError(response);
         },
 
-        async generateTimetable(timetableData) {
+        // Queue a generation job; resolves with { job_id, status }
+        async submitGenerationJob(timetableData) {
             const response = await fetch('/api/generate-timetable', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
@@ -128,6 +129,73 @@ const api = (() => {
             return handleApiError(response);
         },
 
+        async generateTimetable(timetableData, onProgress) {
+            const job = await this.submitGenerationJob(timetableData);
+            return this.watchGenerationJob(job.job_id, onProgress);
+        },
+
+        async fetchGenerationJob(jobId) {
+            const response = await fetch(`/api/generation-jobs/${jobId}`);
+            return handleApiError(response);
+        },
+
+        async cancelGenerationJob(jobId) {
+            const response = await fetch(`/api/generation-jobs/${jobId}/cancel`, { method: 'POST' });
+            return handleApiError(response);
+        },
+
+        // Poll a generation job until it finishes; resolves with its result
+        async waitForGenerationJob(jobId, interval = 1000) {
+            for (;;) {
+                const job = await this.fetchGenerationJob(jobId);
+                if (job.status === 'done') {
+                    return job.result;
+                }
+                if (job.status === 'failed') {
+                    throw new Error(job.error || 'Timetable generation failed');
+                }
+                if (job.status === 'cancelled') {
+                    throw new Error('Timetable generation was cancelled');
+                }
+                await new Promise(resolve => setTimeout(resolve, interval));
+            }
+        },
+
+        // Follow a generation job's progress stream until it finishes; onProgress
+        // gets every { status, progress } update. Falls back to polling when the
+        // stream is unavailable.
+        watchGenerationJob(jobId, onProgress) {
+            if (typeof EventSource === 'undefined') {
+                return this.waitForGenerationJob(jobId);
+            }
+            return new Promise((resolve, reject) => {
+                const source = new EventSource(`/api/generation-jobs/${jobId}/events`);
+                const finish = (callback, value) => {
+                    source.close();
+                    callback(value);
+                };
+
+                source.addEventListener('progress', event => {
+                    if (onProgress) {
+                        onProgress(JSON.parse(event.data));
+                    }
+                });
+                source.addEventListener('done', event => finish(resolve, JSON.parse(event.data).result));
+                source.addEventListener('failed', event => {
+                    finish(reject, new Error(JSON.parse(event.data).error || 'Timetable generation failed'));
+                });
+                source.addEventListener('cancelled', () => {
+                    finish(reject, new Error('Timetable generation was cancelled'));
+                });
+                source.onerror = () => {
+                    if (source.readyState === EventSource.CLOSED) {
+                        source.close();
+                        this.waitForGenerationJob(jobId).then(resolve, reject);
+                    }
+                };
+            });
+        },
+
         async importTimetable(timetableData) {
             const response = await fetch('/api/timetables/import', {
                 method: 'POST',
@@ -541,17 +541,37 @@ const forms = (() => {
         }
     };
 
+    /**
+     * Describe a generation progress update for the status box
+     * @param {Object} update - { status, progress } from the job's progress stream
+     * @returns {string} Status text
+     */
+    const describeGenerationProgress = ({ status, progress }) => {
+        if (!progress) {
+            return status === 'queued' ? 'Waiting for a free solver...' : 'Starting solver...';
+        }
+        const parts = [
+            `${progress.stage || 'solving'}: ${progress.placed} placed, ${progress.remaining} remaining`
+        ];
+        if (progress.best_score !== null && progress.best_score !== undefined) {
+            parts.push(`best score ${progress.best_score}`);
+        }
+        if (progress.backtracks !== undefined) {
+            parts.push(`${progress.backtracks} backtracks`);
+        }
+        parts.push(`${progress.elapsed}s elapsed`);
+        return parts.join(' · ');
+    };
+
     /**
      * Handle generate timetable form submission
      * @param {Event} event - Form submission event
      */
-    const handleGenerateTimetable = (event) => {
+    const handleGenerateTimetable = async (event) => {
         event.preventDefault();
         
         const departmentId = document.getElementById('timetable-department').value;
         const academicYear = document.getElementById('timetable-academic-year').value.trim();
-        const dayStartTime = document.getElementById('day-start-time').value;
-        const dayEndTime = document.getElementById('day-end-time').value;
         
         if (!departmentId) {
             window.ui.showToast('Please select a department', 'error');
@@ -563,18 +583,10 @@ const forms = (() => {
             return;
         }
         
-        if (!dayStartTime) {
-            window.ui.showToast('Please enter day start time', 'error');
-            return;
-        }
-        
-        if (!dayEndTime) {
-            window.ui.showToast('Please enter day end time', 'error');
-            return;
-        }
-        
-        // Show loading state
-        window.ui.showLoadingState();
+        const generationStatus = document.getElementById('generation-status');
+        const generationSuccess = document.getElementById('generation-success');
+        const generationError = document.getElementById('generation-error');
+        [generationSuccess, generationError].forEach(el => el.classList.add('hidden'));
         
         // Get the department name for display
         let departmentName = 'Selected Department';
@@ -585,53 +597,62 @@ const forms = (() => {
             }
         }
         
-        // Prepare timetable generation data
-        const timetableData = {
-            department_id: departmentId,
-            academic_year: academicYear,
-            day_start_time: dayStartTime,
-            day_end_time: dayEndTime
-        };
-        
-        // Send request to generate timetable
-        window.api.generateTimetable(timetableData)
-            .then(result => {
-                // Show success message
-                window.ui.showToast('Timetable generated successfully');
-                
-                // Display generated timetable
-                const generateResult = document.getElementById('generate-result');
-                generateResult.classList.remove('hidden');
-                
-                // Set the result text
-                document.getElementById('generate-result-text').innerHTML = `
-                    <p class="mb-2">Successfully generated timetable for <span class="font-semibold">${departmentName}</span>!</p>
-                    <p>You can view and export it from the "View Timetables" section.</p>
-                `;
-                
-                // Add to global state
-                if (window.appCore && window.appCore.state) {
-                    window.appCore.state.timetables.push(result);
+        // Live progress with a cancel button while the job runs
+        const message = document.createElement('div');
+        message.textContent = 'Waiting for a free solver...';
+        const cancelButton = document.createElement('button');
+        cancelButton.type = 'button';
+        cancelButton.className = 'mt-2 bg-red-500 hover:bg-red-700 text-white font-bold py-1 px-3 rounded';
+        cancelButton.textContent = 'Cancel';
+        generationStatus.replaceChildren(message, cancelButton);
+        generationStatus.classList.remove('hidden');
+        
+        try {
+            const job = await window.api.submitGenerationJob({
+                department_id: departmentId,
+                academic_year: academicYear
+            });
+            cancelButton.addEventListener('click', async () => {
+                cancelButton.disabled = true;
+                message.textContent = 'Cancelling...';
+                try {
+                    await window.api.cancelGenerationJob(job.job_id);
+                } catch (error) {
+                    console.error('Error cancelling generation:', error);
+                }
+            });
+            
+            const result = await window.api.watchGenerationJob(job.job_id, update => {
+                if (!cancelButton.disabled) {
+                    message.textContent = describeGenerationProgress(update);
                 }
-                
-                // Clear form
-                document.getElementById('generate-form').reset();
-            })
-            .catch(error => {
-                console.error('Error generating timetable:', error);
-                window.ui.showToast('Error generating timetable', 'error');
-                
-                // Display error message
-                const generateResult = document.getElementById('generate-result');
-                generateResult.classList.remove('hidden');
-                
-                document.getElementById('generate-result-text').innerHTML = `
-                    <p class="text-red-500">Failed to generate timetable. Please try again or check the input parameters.</p>
-                `;
-            })
-            .finally(() => {
-                window.ui.hideLoadingState();
             });
+            
+            window.ui.showToast('Timetable generated successfully');
+            generationSuccess.innerHTML = `
+                <p class="mb-2">Successfully generated timetable for <span class="font-semibold">${departmentName}</span>!</p>
+                <p>You can view and export it from the "View Timetables" section.</p>
+            `;
+            generationSuccess.classList.remove('hidden');
+            if (result.cut_off) {
+                window.ui.showToast('The time limit was reached; some sessions may be unscheduled', 'error');
+            }
+            
+            // The job saved the timetable; reload the list to include it
+            if (window.appCore) {
+                await window.appCore.refreshTimetables();
+            }
+            
+            // Clear form
+            document.getElementById('generate-form').reset();
+        } catch (error) {
+            console.error('Error generating timetable:', error);
+            window.ui.showToast(`Error generating timetable: ${error.message}`, 'error');
+            generationError.textContent = `Error: ${error.message}`;
+            generationError.classList.remove('hidden');
+        } finally {
+            generationStatus.classList.add('hidden');
+        }
     };
 
     /**
@@ -21,4 +21,64 @@ class Teacher(BaseModel):
             
             teacher_data['code'] = teacher_data['code'].upper()
             
-        return cls.create(teacher_data)
\ No newline at end of file
+        return cls.create(teacher_data)
+
+    # Calendar fields accepted on create/update, each {day: "all" | [slot labels]}
+    CALENDAR_FIELDS = ('unavailable', 'available', 'preferred')
+
+    @staticmethod
+    def build_calendar(data, days, time_slots, existing=None):
+        """
+        Compact calendar document from readable calendar fields:
+            {"days": [...], "time_slots": [...], "unavailable": [mask per day], "preferred": [mask per day]}
+        Bit i of a day's mask stands for time_slots[i]. "available" lists the
+        only slots a teacher can take; days it leaves out are unavailable.
+        Fields not in data are kept from an existing calendar on the same grid.
+        """
+        day_index = {day: i for i, day in enumerate(days)}
+        slot_index = {slot: i for i, slot in enumerate(time_slots)}
+        full_day = (1 << len(time_slots)) - 1
+
+        def day_masks(value):
+            if not isinstance(value, dict):
+                raise ValueError("Calendar entries must map days to \"all\" or a list of time slots")
+            masks = [0] * len(days)
+            for day, slots in value.items():
+                if day not in day_index:
+                    raise ValueError(f"Unknown day: {day}")
+                if slots == "all":
+                    masks[day_index[day]] = full_day
+                    continue
+                if not isinstance(slots, list):
+                    raise ValueError(f"Time slots for {day} must be \"all\" or a list")
+                for slot in slots:
+                    if slot not in slot_index:
+                        raise ValueError(f"Unknown time slot: {slot}")
+                    masks[day_index[day]] |= 1 << slot_index[slot]
+            return masks
+
+        calendar = {"days": list(days), "time_slots": list(time_slots),
+                    "unavailable": [0] * len(days), "preferred": [0] * len(days)}
+        if existing and existing.get("days") == list(days) and existing.get("time_slots") == list(time_slots):
+            calendar["unavailable"] = list(existing.get("unavailable", calendar["unavailable"]))
+            calendar["preferred"] = list(existing.get("preferred", calendar["preferred"]))
+
+        if 'available' in data:
+            calendar["unavailable"] = [full_day & ~mask for mask in day_masks(data['available'])]
+        if 'unavailable' in data:
+            calendar["unavailable"] = day_masks(data['unavailable'])
+        if 'preferred' in data:
+            calendar["preferred"] = day_masks(data['preferred'])
+        return calendar
+
+    @staticmethod
+    def expand_calendar(calendar):
+        """Readable {"unavailable": {day: [slots]}, "preferred": {day: [slots]}} of a stored calendar"""
+        expanded = {}
+        for field in ('unavailable', 'preferred'):
+            expanded[field] = {}
+            for day, mask in zip(calendar.get("days", []), calendar.get(field, [])):
+                slots = [slot for i, slot in enumerate(calendar.get("time_slots", [])) if mask >> i & 1]
+                if slots:
+                    expanded[field][day] = slots
+        return expanded
@@ -2,14 +2,32 @@ from flask import Blueprint, jsonify, request
 from pymongo.errors import PyMongoError
 from api.models.teacher import Teacher
 from bson import ObjectId
+from timetable_generator import DEFAULT_DAYS, DEFAULT_TIME_SLOTS
 
 teachers = Blueprint('teachers', __name__)
 
+def _apply_calendar(teacher_data, existing=None):
+    """Replace readable calendar fields in request data by the stored bitmask calendar"""
+    fields = {field: teacher_data.pop(field) for field in Teacher.CALENDAR_FIELDS if field in teacher_data}
+    if fields:
+        # Calendars use the default bell schedule; other schedules are matched by time
+        teacher_data['calendar'] = Teacher.build_calendar(fields, DEFAULT_DAYS, DEFAULT_TIME_SLOTS, existing)
+
+def _teacher_json(teacher):
+    result = Teacher.to_json_friendly(teacher)
+    if teacher.get('calendar'):
+        result.update(Teacher.expand_calendar(teacher['calendar']))
+    return result
+
 @teachers.route('/api/teachers', methods=['GET', 'POST'])
 def handle_teachers():
     try:
         if request.method == 'POST':
             teacher_data = request.json
+            try:
+                _apply_calendar(teacher_data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
             teacher_id = Teacher.create_with_code(teacher_data)
             return jsonify({
                 "id": teacher_id,
@@ -17,7 +35,7 @@ def handle_teachers():
             }), 201
         else:
             teachers = Teacher.find_all()
-            return jsonify(Teacher.to_json_friendly(teachers))
+            return jsonify([_teacher_json(teacher) for teacher in teachers])
     except PyMongoError as e:
         print(f"Database error in teachers route: {str(e)}")
         return jsonify({"error": "Database error occurred"}), 500
@@ -32,10 +50,18 @@ def handle_teacher(teacher_id):
             teacher = Teacher.find_by_id(teacher_id)
             if not teacher:
                 return jsonify({"error": "Teacher not found"}), 404
-            return jsonify(Teacher.to_json_friendly(teacher))
+            return jsonify(_teacher_json(teacher))
             
         elif request.method == 'PUT':
-            if Teacher.update_by_id(teacher_id, request.json):
+            teacher = Teacher.find_by_id(teacher_id)
+            if not teacher:
+                return jsonify({"error": "Teacher not found"}), 404
+            teacher_data = request.json
+            try:
+                _apply_calendar(teacher_data, teacher.get('calendar'))
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if Teacher.update_by_id(teacher_id, teacher_data):
                 return jsonify({"message": "Teacher updated successfully"})
             return jsonify({"error": "Teacher not found"}), 404
             
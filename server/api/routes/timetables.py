@@ -1,11 +1,21 @@
-from flask import Blueprint, jsonify, request
+import json
+from datetime import datetime
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from pymongo.errors import PyMongoError
 from api.models.timetable import Timetable
 from api.models.department import Department
 from api.services.timetable_generator import TimetableGeneratorService
+from api.services.generation_jobs import generation_jobs
+from api.services.generation_metrics import generation_metrics
+from solver.stats import RunStats
+from timetable_generator import SOLVER_MODES, TimetableGenerator
 
 timetables = Blueprint('timetables', __name__)
 
+# Seconds between keep-alive comments on an idle progress stream
+PROGRESS_KEEPALIVE = 15
+FINISHED_JOB_STATES = ("done", "failed", "cancelled")
+
 @timetables.route('/api/timetables', methods=['GET'])
 def get_timetables():
     try:
@@ -64,6 +74,77 @@ def get_formatted_timetable(timetable_id):
         print(f"Error formatting timetable: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@timetables.route('/api/timetables/<timetable_id>/repair', methods=['POST'])
+def repair_timetable(timetable_id):
+    try:
+        data = request.json or {}
+        changes = data.get('changes')
+        if not isinstance(changes, list) or not all(isinstance(change, dict) for change in changes):
+            return jsonify({"error": "changes must be a list of change objects"}), 400
+
+        if not Timetable.find_by_id(timetable_id):
+            return jsonify({"error": "Timetable not found"}), 404
+
+        # Re-solve only what the changes invalidate; the stored timetable is updated
+        generator = TimetableGenerator(Timetable._get_collection().database)
+        try:
+            result = generator.repair_timetable(timetable_id, changes)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify({
+            "message": "Timetable repaired successfully",
+            "moved_cells": result["moved_cells"],
+            "reassigned": result["reassigned"],
+            "unscheduled": result["unscheduled"],
+            "resolved_years": result["resolved_years"],
+            "timetables": Timetable.to_json_friendly(result["timetables"])
+        })
+    except PyMongoError as e:
+        print(f"Database error repairing timetable: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+    except Exception as e:
+        print(f"Error repairing timetable: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@timetables.route('/api/timetables/<timetable_id>/score', methods=['GET'])
+def score_timetable(timetable_id):
+    try:
+        generator = TimetableGenerator(Timetable._get_collection().database)
+        scores = generator.score_timetables([timetable_id])
+        if not scores:
+            return jsonify({"error": "Timetable not found"}), 404
+        return jsonify(scores[0])
+    except PyMongoError as e:
+        print(f"Database error scoring timetable: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+    except Exception as e:
+        print(f"Error scoring timetable: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@timetables.route('/api/timetables/score', methods=['POST'])
+def score_timetables():
+    try:
+        data = request.json or {}
+        timetable_ids = data.get('timetable_ids')
+        weights = data.get('weights') or {}
+        if not isinstance(timetable_ids, list) or not timetable_ids:
+            return jsonify({"error": "timetable_ids must be a non-empty list"}), 400
+        if not isinstance(weights, dict) or not all(
+                isinstance(value, (int, float)) and not isinstance(value, bool) for value in weights.values()):
+            return jsonify({"error": "weights must map metric names to numbers"}), 400
+
+        # One batch for all candidates, best (lowest penalty) first
+        generator = TimetableGenerator(Timetable._get_collection().database)
+        scores = generator.score_timetables([str(timetable_id) for timetable_id in timetable_ids], weights)
+        return jsonify({"scores": sorted(scores, key=lambda score: score["penalty"])})
+    except PyMongoError as e:
+        print(f"Database error scoring timetables: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+    except Exception as e:
+        print(f"Error scoring timetables: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @timetables.route('/api/generate-timetable', methods=['POST'])
 def generate_timetable():
     try:
@@ -76,18 +157,58 @@ def generate_timetable():
                 "error": "Department ID and academic year are required"
             }), 400
             
-        generator = TimetableGeneratorService()
-        timetables = generator.generate_timetable(department_id, academic_year)
+        # Optional strategy, multi-start (number of seeded runs), wall-clock and
+        # search-node budgets and local-search improvement budget in seconds
+        solver_mode = data.get('solver', 'greedy')
+        if solver_mode not in SOLVER_MODES:
+            return jsonify({"error": f"solver must be one of: {', '.join(SOLVER_MODES)}"}), 400
+        restarts = data.get('restarts')
+        time_limit = data.get('time_limit')
+        improve_time = data.get('improve_time')
+        max_nodes = data.get('max_nodes')
+        try:
+            restarts = int(restarts) if restarts is not None else None
+            time_limit = float(time_limit) if time_limit is not None else None
+            improve_time = float(improve_time) if improve_time is not None else None
+            max_nodes = int(max_nodes) if max_nodes is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "restarts, time_limit, improve_time and max_nodes must be numbers"}), 400
+        if ((restarts is not None and restarts < 1) or (time_limit is not None and time_limit <= 0)
+                or (improve_time is not None and improve_time <= 0) or (max_nodes is not None and max_nodes < 1)):
+            return jsonify({"error": "restarts, time_limit, improve_time and max_nodes must be positive"}), 400
         
-        if not timetables:
-            return jsonify({
-                "error": "Failed to generate timetable. Check constraints and try again."
-            }), 500
+        # Run statistics are collected unless "stats": false
+        collect_stats = data.get('stats', True)
+        if not isinstance(collect_stats, bool):
+            return jsonify({"error": "stats must be true or false"}), 400
+        
+        # "warm_start": true keeps what still fits of the last stored timetable
+        warm_start = data.get('warm_start', False)
+        if not isinstance(warm_start, bool):
+            return jsonify({"error": "warm_start must be true or false"}), 400
+        
+        # Optional seed making the search repeatable; part of the result cache key
+        seed = data.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+            return jsonify({"error": "seed must be an integer"}), 400
+            
+        # Run the solve as a background job; identical requests share one job
+        options = {"solver_mode": solver_mode, "restarts": restarts, "time_limit": time_limit,
+                   "max_nodes": max_nodes, "improve_time": improve_time, "collect_stats": collect_stats, "warm_start": warm_start,
+                   "seed": seed}
+        key = generation_jobs.job_key(department_id, academic_year, **options)
+        job, created = generation_jobs.submit(
+            key, _run_generation, Timetable._get_collection().database,
+            department_id, academic_year, **options
+        )
+        if job is None:
+            return jsonify({"error": "Too many generation jobs queued. Try again later."}), 503
             
         return jsonify({
-            "message": "Timetable generated successfully",
-            "timetables": Timetable.to_json_friendly(timetables)
-        })
+            "message": "Timetable generation queued" if created else "Timetable generation already in progress",
+            "job_id": job["id"],
+            "status": job["status"]
+        }), 202
     except PyMongoError as e:
         print(f"Database error generating timetable: {str(e)}")
         return jsonify({"error": "Database error occurred"}), 500
@@ -95,6 +216,79 @@ def generate_timetable():
         print(f"Error generating timetable: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _run_generation(db, department_id, academic_year, solver_mode="greedy", restarts=None, time_limit=None,
+                    max_nodes=None, improve_time=None, collect_stats=True, warm_start=False, seed=None, hook=None):
+    """
+    Job body: generate and save timetables and return them JSON-friendly
+    with the stored document's id, flagged "cut_off" when a budget ran out
+    before the search finished, with the run statistics (also stored with
+    the timetable and added to the metrics) when collect_stats is set
+    """
+    # Counters are always kept; they carry the cut-off flag
+    stats = RunStats()
+    timetables = None
+    generator = TimetableGeneratorService(db, solver_mode=solver_mode, max_search_nodes=max_nodes)
+    try:
+        timetables, timetable_id = generator.generate_and_save(
+            department_id, academic_year, stats=stats, save_stats=collect_stats, restarts=restarts or 1,
+            time_limit=time_limit, improve_time=improve_time, warm_start=warm_start, seed=seed, hook=hook
+        )
+    finally:
+        if collect_stats:
+            generation_metrics.record(solver_mode, stats, succeeded=bool(timetables))
+    
+    if not timetables:
+        raise ValueError("Failed to generate timetable. Check constraints and try again.")
+    result = {"timetable_id": timetable_id, "timetables": Timetable.to_json_friendly(timetables),
+              "cut_off": bool(stats.counters.get("cut_off"))}
+    if collect_stats:
+        result["stats"] = stats.as_dict()
+    return result
+
+@timetables.route('/api/metrics/generation', methods=['GET'])
+def get_generation_metrics():
+    """Run statistics of the generations finished by this process, per engine"""
+    return jsonify(generation_metrics.summary())
+
+@timetables.route('/api/generation-jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    job = generation_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Generation job not found"}), 404
+    return jsonify(job)
+
+@timetables.route('/api/generation-jobs/<job_id>/events', methods=['GET'])
+def stream_generation_job(job_id):
+    """Server-sent events: "progress" while the job runs, then one final status event"""
+    if not generation_jobs.get(job_id):
+        return jsonify({"error": "Generation job not found"}), 404
+    
+    def events():
+        version = -1
+        while True:
+            job, latest = generation_jobs.wait_for_update(job_id, version, timeout=PROGRESS_KEEPALIVE)
+            if job is None:
+                return
+            if latest == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = latest
+            if job["status"] in FINISHED_JOB_STATES:
+                yield f"event: {job['status']}\ndata: {json.dumps(job, default=str)}\n\n"
+                return
+            update = {"status": job["status"], "progress": job["progress"]}
+            yield f"event: progress\ndata: {json.dumps(update)}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@timetables.route('/api/generation-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_generation_job(job_id):
+    job = generation_jobs.cancel(job_id)
+    if not job:
+        return jsonify({"error": "Generation job not found"}), 404
+    return jsonify({"message": "Cancellation requested", "status": job["status"]})
+
 @timetables.route('/api/timetables/import', methods=['POST'])
 def import_timetable():
     try:
@@ -107,8 +301,13 @@ def import_timetable():
                 "error": "Department ID and timetable data are required"
             }), 400
             
-        # Add department ID to timetable data
+        # Add department ID to timetable data; created_at orders it against generated ones
         timetable_data['department_id'] = department_id
+        timetable_data['created_at'] = datetime.now()
+        
+        # Keep the run statistics of the generation job it came from, if sent
+        if isinstance(data.get('stats'), dict):
+            timetable_data['stats'] = data['stats']
         
         timetable_id = Timetable.create(timetable_data)
         return jsonify({
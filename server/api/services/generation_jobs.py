@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from solver.progress import GenerationCancelled, ProgressHook
+
+
+class GenerationJobManager:
+    """
+    Runs timetable generation requests as background jobs.
+
+    Jobs execute on a bounded thread pool (the solvers start their own
+    processes for multi-start runs) and move through queued -> running ->
+    done/failed/cancelled. Submitting a request whose key matches a job that
+    is still queued or running returns that job instead of starting another
+    one. Only the most recent finished jobs are kept for polling.
+
+    Every job function receives a ``hook`` keyword argument (a ProgressHook);
+    its events are stored as the job's ``progress`` and wake up listeners
+    blocked in ``wait_for_update``. ``cancel`` drops a queued job or cancels
+    the hook of a running one.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, keep_finished=100):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs = {}          # {job id: job dict}
+        self._hooks = {}         # {job id: ProgressHook}
+        self._versions = {}      # {job id: number of updates so far}
+        self._active = {}        # {job key: job id} for queued and running jobs
+        self._finished = []      # finished job ids, oldest first
+
+    @staticmethod
+    def job_key(*parts, **options):
+        """Stable key for coalescing identical requests"""
+        return json.dumps([[str(part) for part in parts], options], sort_keys=True, default=str)
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) unless an identical job is active.
+        Returns (job snapshot, created), or (None, False) when the queue is full.
+        """
+        with self._lock:
+            job_id = self._active.get(key)
+            if job_id is not None:
+                return self._snapshot(self._jobs[job_id]), False
+
+            pending = sum(1 for active_id in self._active.values()
+                          if self._jobs[active_id]["status"] == "queued")
+            if pending >= self.max_pending:
+                return None, False
+
+            job = {
+                "id": uuid.uuid4().hex,
+                "key": key,
+                "status": "queued",
+                "submitted_at": datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "progress": None,
+                "result": None,
+                "error": None,
+                "report": None
+            }
+            job_id = job["id"]
+            self._jobs[job_id] = job
+            self._versions[job_id] = 0
+            self._hooks[job_id] = ProgressHook(lambda event: self._progress(job_id, event))
+            self._active[key] = job_id
+            self._executor.submit(self._run, job_id, func, args, kwargs)
+            return self._snapshot(job), True
+
+    def get(self, job_id):
+        """Snapshot of a job, or None if it is unknown or was dropped"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns its snapshot or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            if job["status"] == "queued":
+                self._finish(job, "cancelled", None, "Timetable generation was cancelled")
+            elif job["status"] == "running":
+                self._hooks[job_id].cancel()
+                self._release(job)
+            return self._snapshot(job)
+
+    def wait_for_update(self, job_id, version, timeout=None):
+        """
+        Block until the job changed after ``version`` or timeout passed.
+        Returns (snapshot, current version), or (None, version) if unknown.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions.get(job_id, version) != version, timeout)
+            job = self._jobs.get(job_id)
+            if not job:
+                return None, version
+            return self._snapshot(job), self._versions[job_id]
+
+    def _run(self, job_id, func, args, kwargs):
+        with self._lock:
+            job = self._jobs[job_id]
+            if job["status"] != "queued":
+                return
+            job["status"] = "running"
+            job["started_at"] = datetime.now().isoformat()
+            self._touch(job_id)
+            hook = self._hooks[job_id]
+
+        try:
+            result = func(*args, hook=hook, **kwargs)
+            status, error = "done", None
+        except GenerationCancelled as e:
+            result, status, error = None, "cancelled", str(e)
+        except Exception as e:
+            print(f"Error in generation job {job_id}: {str(e)}")
+            result, status, error = None, "failed", str(e)
+            # Structured details, e.g. the feasibility report of an infeasible input
+            job["report"] = getattr(e, "report", None)
+
+        with self._lock:
+            self._finish(job, status, result, error)
+
+    def _progress(self, job_id, event):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job["progress"] = event
+                self._touch(job_id)
+
+    def _touch(self, job_id):
+        self._versions[job_id] += 1
+        self._changed.notify_all()
+
+    def _release(self, job):
+        """Stop coalescing new requests into this job"""
+        if self._active.get(job["key"]) == job["id"]:
+            del self._active[job["key"]]
+
+    def _finish(self, job, status, result, error):
+        job["status"] = status
+        job["result"] = result
+        job["error"] = error
+        job["finished_at"] = datetime.now().isoformat()
+        self._release(job)
+        self._hooks.pop(job["id"], None)
+        self._touch(job["id"])
+        self._finished.append(job["id"])
+        while len(self._finished) > self.keep_finished:
+            dropped = self._finished.pop(0)
+            self._jobs.pop(dropped, None)
+            self._versions.pop(dropped, None)
+
+    def _snapshot(self, job):
+        return {key: value for key, value in job.items() if key != "key"}
+
+
+# Shared by the timetable routes; pool size from GENERATION_WORKERS
+generation_jobs = GenerationJobManager(max_workers=int(os.environ.get('GENERATION_WORKERS', 2)))
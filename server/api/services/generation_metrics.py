@@ -0,0 +1,65 @@
+import threading
+from datetime import datetime
+
+from solver.stats import RunStats
+
+
+class GenerationMetrics:
+    """
+    Process-wide totals of the run statistics of finished generations.
+
+    Runs are grouped by engine, the strategy they were solved with (see
+    solver.strategies). Each group keeps the number of runs and failures,
+    total and slowest wall time, and the summed phase times, counters and
+    conflicts of solver.stats.RunStats documents.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = {}
+        self._since = datetime.now().isoformat()
+
+    def record(self, engine, stats, succeeded=True):
+        """Add one run's RunStats or as_dict() document"""
+        document = stats.as_dict() if isinstance(stats, RunStats) else stats
+        with self._lock:
+            entry = self._engines.get(engine)
+            if entry is None:
+                entry = self._engines[engine] = {
+                    "runs": 0, "failed": 0, "total_time": 0.0, "max_time": 0.0, "totals": RunStats()
+                }
+            entry["runs"] += 1
+            if not succeeded:
+                entry["failed"] += 1
+            entry["total_time"] += document.get("total_time", 0)
+            entry["max_time"] = max(entry["max_time"], document.get("total_time", 0))
+            entry["totals"].merge(document)
+
+    def summary(self):
+        """Totals and per-run means of every engine"""
+        with self._lock:
+            engines = {}
+            for engine, entry in self._engines.items():
+                totals = entry["totals"].as_dict()
+                runs = entry["runs"]
+                engines[engine] = {
+                    "runs": runs,
+                    "failed": entry["failed"],
+                    "total_time": round(entry["total_time"], 4),
+                    "mean_time": round(entry["total_time"] / runs, 4),
+                    "max_time": round(entry["max_time"], 4),
+                    "phases": totals["phases"],
+                    "mean_phases": {name: round(seconds / runs, 4) for name, seconds in totals["phases"].items()},
+                    "counters": totals["counters"],
+                    "conflicts": totals["conflicts"]
+                }
+            return {"since": self._since, "engines": engines}
+
+    def reset(self):
+        with self._lock:
+            self._engines = {}
+            self._since = datetime.now().isoformat()
+
+
+# Fed by the generation jobs, read by the metrics route
+generation_metrics = GenerationMetrics()
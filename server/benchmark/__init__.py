@@ -0,0 +1,8 @@
+"""
+Synthetic instances and scaling benchmarks for the timetable solvers.
+
+Runs entirely against an in-memory store, so no MongoDB is needed:
+
+    cd server
+    python -m benchmark.runner --parameter teachers --values 8,16,32 --json teachers.json --csv teachers.csv
+"""
@@ -0,0 +1,151 @@
+"""
+Seeded synthetic departments, subjects, teachers and rooms
+"""
+import random
+
+from bson.objectid import ObjectId
+
+# Teaching slots per class and week in the default bell schedule (7 a day, 5 days)
+DEFAULT_TEACHING_CELLS = 35
+
+
+class InstanceSpec:
+    """
+    Size and tightness of a synthetic campus.
+
+    Every department gets ``years`` years of ``batches`` batches, each year
+    ``subjects`` subjects of which ``practical_ratio`` are 2-slot practicals.
+    ``teachers`` teachers per department qualify for a few subjects each;
+    ``fixed_teacher_ratio`` of the subjects name one of them as their fixed
+    teacher. ``classrooms`` and ``labs`` rooms are shared by the campus.
+    ``tightness`` is the share of a batch's weekly teaching slots its
+    lectures and practicals fill.
+    """
+
+    FIELDS = ("departments", "years", "batches", "subjects", "teachers", "classrooms", "labs",
+              "tightness", "practical_ratio", "fixed_teacher_ratio", "seed")
+
+    def __init__(self, departments=1, years=3, batches=3, subjects=6, teachers=7, classrooms=3, labs=3,
+                 tightness=0.5, practical_ratio=0.5, fixed_teacher_ratio=0.0, seed=0):
+        self.departments = departments
+        self.years = years
+        self.batches = batches
+        self.subjects = subjects
+        self.teachers = teachers
+        self.classrooms = classrooms
+        self.labs = labs
+        self.tightness = tightness
+        self.practical_ratio = practical_ratio
+        self.fixed_teacher_ratio = fixed_teacher_ratio
+        self.seed = seed
+
+    def replace(self, **changes):
+        values = self.as_dict()
+        values.update(changes)
+        return InstanceSpec(**values)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @property
+    def year_labels(self):
+        return [f"Y{year}" for year in range(1, self.years + 1)]
+
+
+def build_instance(db, spec):
+    """
+    Insert a synthetic campus described by ``spec`` into db.
+
+    Returns the department ids. The same spec always produces the same
+    documents apart from their ObjectIds.
+    """
+    rng = random.Random(spec.seed)
+
+    for number in range(spec.classrooms):
+        db.rooms.insert_one({"number": f"C{number + 1:03d}", "type": "classroom",
+                             "capacity": rng.choice((60, 60, 80, 120))})
+    for number in range(spec.labs):
+        db.rooms.insert_one({"number": f"L{number + 1:03d}", "type": ("computer_lab", "lab")[number % 2],
+                             "capacity": rng.choice((20, 30, 40))})
+
+    department_ids = []
+    for department_number in range(spec.departments):
+        department = {
+            "name": f"Department {department_number + 1}",
+            "code": f"D{department_number + 1}",
+            "years": {year: {"num_batches": spec.batches} for year in spec.year_labels}
+        }
+        db.departments.insert_one(department)
+        department_id = department["_id"]
+        department_ids.append(department_id)
+
+        subjects = []
+        for year in spec.year_labels:
+            subjects.extend(_year_subjects(rng, spec, department_id, year))
+
+        teachers = []
+        for number in range(spec.teachers):
+            code = f"D{department_number + 1}T{number + 1}"
+            teachers.append({"_id": ObjectId(), "name": f"Teacher {code}", "code": code,
+                             "departments": [department_id], "subjects": []})
+
+        # Two qualified teachers per subject; some subjects fix one of them
+        for subject in subjects:
+            qualified = rng.sample(teachers, min(2, len(teachers)))
+            for teacher in qualified:
+                teacher["subjects"].append(str(subject["_id"]))
+            if rng.random() < spec.fixed_teacher_ratio:
+                subject["teacher_id"] = qualified[0]["_id"]
+
+        for subject in subjects:
+            db.subjects.insert_one(subject)
+        for teacher in teachers:
+            db.teachers.insert_one(teacher)
+
+    return department_ids
+
+
+def _year_subjects(rng, spec, department_id, year):
+    practicals = round(spec.subjects * spec.practical_ratio)
+    lectures = max(spec.subjects - practicals, 0)
+
+    # Lecture hours fill what the practicals leave of the target, at most one a day
+    target = round(spec.tightness * DEFAULT_TEACHING_CELLS)
+    budget = max(target - 2 * practicals, lectures)
+    per_week = [0] * lectures
+    for hour in range(budget):
+        if not lectures:
+            break
+        subject = hour % lectures
+        if per_week[subject] < 5:
+            per_week[subject] += 1
+
+    subjects = []
+    for number in range(lectures):
+        subjects.append({
+            "_id": ObjectId(),
+            "name": f"{year} Subject {number + 1}",
+            "code": f"{year}S{number + 1}",
+            "department_id": department_id,
+            "department_id_str": str(department_id),
+            "year": year,
+            "type": "lecture",
+            "lectures_per_week": max(per_week[number], 1)
+        })
+    for number in range(practicals):
+        subject = {
+            "_id": ObjectId(),
+            "name": f"{year} Lab {number + 1}",
+            "code": f"{year}L{number + 1}",
+            "department_id": department_id,
+            "department_id_str": str(department_id),
+            "year": year,
+            "type": "practical",
+            "practicals_per_week": 1,
+            "consecutive_slots": 2
+        }
+        # A third of the practicals need a computer lab; the rest take any lab
+        if rng.random() < 1 / 3:
+            subject["room_type"] = "computer_lab"
+        subjects.append(subject)
+    return subjects
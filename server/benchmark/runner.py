@@ -0,0 +1,178 @@
+"""
+Scaling benchmark: wall time, peak memory, placed sessions and soft score
+per solver mode over a range of synthetic instances
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from solver.feasibility import InfeasibleError
+from solver.tensor_scoring import score_grids
+from timetable_generator import SOLVER_MODES, TimetableGenerator
+
+from .instances import InstanceSpec, build_instance
+from .store import InMemoryDatabase
+
+
+def run_case(spec, solver_mode, time_limit=None, restarts=1, improve_time=None, trace_memory=True, quiet=True):
+    """
+    Build the instance of ``spec`` in a fresh in-memory store and generate
+    every department against one campus ledger with ``solver_mode``.
+
+    Returns one record: the spec fields, the mode, wall time in seconds,
+    peak traced memory in KiB, sessions demanded and placed, the summed
+    soft score and how many departments failed or were infeasible. Memory
+    of worker processes (restarts > 1) is not traced, and tracing slows
+    the solvers down; with trace_memory=False the peak is None and wall
+    times are the untraced ones.
+    """
+    db = InMemoryDatabase()
+    department_ids = build_instance(db, spec)
+    generator = TimetableGenerator(db, solver_mode=solver_mode)
+    generator.years = spec.year_labels
+    if time_limit is not None:
+        generator.search_time_limit = time_limit
+
+    output = io.StringIO() if quiet else sys.stdout
+    results = []
+    infeasible = 0
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        ledger = generator.load_ledger(exclude_departments=department_ids)
+        for department_id in department_ids:
+            try:
+                results.append(generator.generate_timetable(
+                    department_id, "benchmark", ledger=ledger, restarts=restarts,
+                    time_limit=time_limit if restarts > 1 else None, improve_time=improve_time))
+            except InfeasibleError:
+                results.append(None)
+                infeasible += 1
+    wall_time = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    timetables = [result for result in results if result]
+    scores = score_grids(timetables)
+    record = spec.as_dict()
+    record.update({
+        "solver_mode": solver_mode,
+        "wall_time": round(wall_time, 4),
+        "peak_memory_kb": round(peak / 1024, 1) if peak is not None else None,
+        "sessions": _demanded_sessions(db, spec),
+        "placed": sum(_placed_sessions(result) for result in timetables),
+        "penalty": sum(score["penalty"] for score in scores),
+        "failed_departments": len(results) - len(timetables) - infeasible,
+        "infeasible_departments": infeasible
+    })
+    return record
+
+
+def _demanded_sessions(db, spec):
+    total = 0
+    for subject in db.subjects.find({}):
+        if subject["type"] == "lecture":
+            total += subject.get("lectures_per_week", 3)
+        else:
+            total += subject.get("practicals_per_week", 1) * spec.batches
+    return total
+
+
+def _placed_sessions(timetables):
+    """Lecture cells plus runs of identical practical cells in the stored grids"""
+    placed = 0
+    for grid in timetables.values():
+        for row in grid.values():
+            previous = None
+            for cell in row.values():
+                kind = cell.get("type")
+                key = (cell.get("subject"), cell.get("teacher"), cell.get("room"))
+                if kind == "lecture" or (kind == "practical" and key != previous):
+                    placed += 1
+                previous = key if kind == "practical" else None
+    return placed
+
+
+def run_scaling(base, parameter, values, solver_modes=SOLVER_MODES, seeds=(0,), **options):
+    """One run_case record per value of ``parameter``, solver mode and seed"""
+    records = []
+    for value in values:
+        for seed in seeds:
+            spec = base.replace(**{parameter: value, "seed": seed})
+            for solver_mode in solver_modes:
+                record = run_case(spec, solver_mode, **options)
+                record["parameter"] = parameter
+                records.append(record)
+    return records
+
+
+def write_json(records, path):
+    with open(path, "w") as handle:
+        json.dump(records, handle, indent=2)
+
+
+def write_csv(records, path):
+    if not records:
+        return
+    fields = list(records[0])
+    with open(path, "w", newline="") as handle:
+        writer = csv.DictWriter(handle, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Timetable solver scaling benchmark")
+    parser.add_argument("--parameter", default="batches", choices=[
+        field for field in InstanceSpec.FIELDS if field != "seed"],
+                        help="instance field to vary")
+    parser.add_argument("--values", default="1,2,3,4", help="comma-separated values of the parameter")
+    parser.add_argument("--modes", default=",".join(SOLVER_MODES), help="comma-separated solver modes")
+    parser.add_argument("--seeds", type=int, default=1, help="instances per value, seeded 0..n-1")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per search")
+    parser.add_argument("--restarts", type=int, default=1)
+    parser.add_argument("--improve-time", type=float, default=None)
+    parser.add_argument("--no-memory", action="store_true", help="skip memory tracing for exact wall times")
+    for field in InstanceSpec.FIELDS:
+        if field not in ("seed",):
+            parser.add_argument(f"--{field.replace('_', '-')}", type=_parse_value, default=None,
+                                help=f"base value of {field}")
+    parser.add_argument("--json", help="write records as JSON to this path")
+    parser.add_argument("--csv", help="write records as CSV to this path")
+    args = parser.parse_args(argv)
+
+    base = InstanceSpec(**{field: getattr(args, field) for field in InstanceSpec.FIELDS
+                           if field != "seed" and getattr(args, field) is not None})
+    modes = [mode for mode in args.modes.split(",") if mode]
+    records = run_scaling(base, args.parameter, [_parse_value(value) for value in args.values.split(",")],
+                          solver_modes=modes, seeds=range(args.seeds), time_limit=args.time_limit,
+                          restarts=args.restarts, improve_time=args.improve_time,
+                          trace_memory=not args.no_memory)
+
+    for record in records:
+        print(f"{args.parameter}={record[args.parameter]} seed={record['seed']} {record['solver_mode']}: "
+              f"{record['placed']}/{record['sessions']} placed, penalty {record['penalty']}, "
+              f"{record['wall_time']}s, {record['peak_memory_kb']} KiB")
+    if args.json:
+        write_json(records, args.json)
+    if args.csv:
+        write_csv(records, args.csv)
+
+
+if __name__ == "__main__":
+    main()
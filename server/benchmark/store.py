@@ -0,0 +1,121 @@
+"""
+In-memory stand-in for the pymongo database used by the generators
+"""
+import copy
+
+from bson.objectid import ObjectId
+
+
+def _matches(document, query):
+    """The subset of the Mongo query language the generators use"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, option) for option in condition):
+                return False
+            continue
+
+        value = document.get(key)
+        if isinstance(condition, dict) and any(operator.startswith("$") for operator in condition):
+            for operator, argument in condition.items():
+                if operator == "$in":
+                    values = value if isinstance(value, list) else [value]
+                    if not any(item in argument for item in values):
+                        return False
+                elif operator == "$nin":
+                    values = value if isinstance(value, list) else [value]
+                    if any(item in argument for item in values):
+                        return False
+                elif operator == "$exists":
+                    if (key in document) != bool(argument):
+                        return False
+                elif operator == "$ne":
+                    if value == argument:
+                        return False
+                else:
+                    raise NotImplementedError(f"Unsupported query operator: {operator}")
+        elif isinstance(value, list) and not isinstance(condition, list):
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class InsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class UpdateResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+
+
+class InMemoryCollection:
+    """
+    A list of documents with insert/find/update/delete. Projections are
+    accepted and ignored; found documents are the stored objects, as the
+    generators only read them.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.documents = []
+
+    def insert_one(self, document):
+        document.setdefault("_id", ObjectId())
+        self.documents.append(document)
+        return InsertResult(document["_id"])
+
+    def find(self, query=None, projection=None):
+        return [document for document in self.documents if _matches(document, query or {})]
+
+    def find_one(self, query=None, projection=None, sort=None):
+        documents = self.find(query)
+        if sort:
+            for key, direction in reversed(sort):
+                documents.sort(key=lambda document: str(document.get(key, "")), reverse=direction < 0)
+        return documents[0] if documents else None
+
+    def update_one(self, query, update, upsert=False):
+        document = self.find_one(query)
+        if document is None:
+            if not upsert:
+                return UpdateResult(0)
+            document = {key: value for key, value in query.items()
+                        if not key.startswith("$") and not isinstance(value, dict)}
+            self.insert_one(document)
+        document.update(copy.deepcopy(update.get("$set", {})))
+        return UpdateResult(1)
+
+    def delete_one(self, query):
+        document = self.find_one(query)
+        if document is None:
+            return DeleteResult(0)
+        self.documents.remove(document)
+        return DeleteResult(1)
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+
+class InMemoryDatabase:
+    """Collections created on first access, by attribute or by key"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(self)
+        return self._collections[name]
@@ -0,0 +1,3 @@
+"""
+Solver building blocks shared by the timetable generators
+"""
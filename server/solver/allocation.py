@@ -0,0 +1,190 @@
+"""
+Teacher-to-subject allocation as a min-cost flow
+"""
+import heapq
+from collections import defaultdict
+
+# Cost of an hour taught by a teacher who does not list the subject
+UNLISTED_COST = 20
+# Extra cost of every further hour a teacher takes, spreading the load
+LOAD_COST = 1
+
+
+class MinCostFlow:
+    """Successive shortest paths with Dijkstra on reduced costs"""
+
+    def __init__(self, num_nodes):
+        self.num_nodes = num_nodes
+        # Per node: [target, capacity, cost, index of the reverse edge]
+        self.edges = [[] for _ in range(num_nodes)]
+
+    def add_edge(self, source, target, capacity, cost):
+        """Add an arc; returns (node, edge index) to read its flow back"""
+        self.edges[source].append([target, capacity, cost, len(self.edges[target])])
+        self.edges[target].append([source, 0, -cost, len(self.edges[source]) - 1])
+        return source, len(self.edges[source]) - 1
+
+    def flow(self, edge, capacity):
+        node, position = edge
+        return capacity - self.edges[node][position][1]
+
+    def solve(self, source, sink, limit):
+        """Push up to ``limit`` units at minimum cost; returns (flow, cost)"""
+        potential = [0] * self.num_nodes
+        total_flow = total_cost = 0
+        while total_flow < limit:
+            distance = [None] * self.num_nodes
+            previous = [None] * self.num_nodes
+            distance[source] = 0
+            queue = [(0, source)]
+            while queue:
+                dist, node = heapq.heappop(queue)
+                if dist > distance[node]:
+                    continue
+                for position, (target, capacity, cost, _) in enumerate(self.edges[node]):
+                    if capacity <= 0:
+                        continue
+                    candidate = dist + cost + potential[node] - potential[target]
+                    if distance[target] is None or candidate < distance[target]:
+                        distance[target] = candidate
+                        previous[target] = (node, position)
+                        heapq.heappush(queue, (candidate, target))
+            if distance[sink] is None:
+                break
+            for node in range(self.num_nodes):
+                if distance[node] is not None:
+                    potential[node] += distance[node]
+
+            push = limit - total_flow
+            node = sink
+            while node != source:
+                parent, position = previous[node]
+                push = min(push, self.edges[parent][position][1])
+                node = parent
+            node = sink
+            while node != source:
+                parent, position = previous[node]
+                edge = self.edges[parent][position]
+                edge[1] -= push
+                self.edges[node][edge[3]][1] += push
+                total_cost += push * edge[2]
+                node = parent
+            total_flow += push
+        return total_flow, total_cost
+
+
+def allocate_teachers(model, index, teacher_subjects=None):
+    """
+    Fix one teacher per session for subjects that have no teacher of their
+    own, before any slot search.
+
+    Every such subject is a source of its weekly hours, every teacher a
+    sink of the hours left under its workload limit (and free cells, net
+    of other departments) after the subjects already fixed to it. An hour
+    costs nothing for a teacher listing the subject in ``teacher_subjects``
+    ({subject id: [teacher codes]}, from the teacher documents) and
+    UNLISTED_COST otherwise; each further hour a teacher takes costs
+    LOAD_COST more than the one before, so hours are spread. The minimum
+    cost flow is then rounded to one teacher per (subject, groups) demand,
+    so a class keeps the same teacher for all its weekly sessions: each
+    demand goes to the teacher with the largest share of the subject's
+    flow that still has the hours for all of it. Only a demand no teacher
+    has enough hours left for is split, session by session.
+
+    Sessions get ``teachers`` narrowed to the chosen teacher. Sessions no
+    teacher has hours left for keep every eligible teacher, and the search
+    chooses for them as before.
+
+    Returns {"assigned": sessions fixed, "open": session ids left open,
+    "cost": flow cost}.
+    """
+    teacher_subjects = teacher_subjects or {}
+    teacher_codes = defaultdict(list)
+    for teacher in model.teachers:
+        teacher_codes[teacher.code].append(teacher.id)
+
+    teaching_cells = 0
+    for session in model.sessions:
+        for position in session.positions:
+            teaching_cells |= position[2]
+
+    capacity = [min(teacher.max_workload, bin(teaching_cells & ~index.teachers[teacher.id]).count("1"))
+                for teacher in model.teachers]
+    open_sessions = defaultdict(list)     # {subject id: [session ids]}
+    for session in model.sessions:
+        if len(session.teachers) == 1:
+            capacity[session.teachers[0]] -= session.length
+        elif session.teachers:
+            open_sessions[session.subject].append(session.id)
+    if not open_sessions:
+        return {"assigned": 0, "open": [], "cost": 0}
+
+    # Nodes: source, open subjects, teachers, sink
+    subject_ids = list(open_sessions)
+    subject_node = {subject_id: 1 + i for i, subject_id in enumerate(subject_ids)}
+    teacher_node = [1 + len(subject_ids) + teacher.id for teacher in model.teachers]
+    source, sink = 0, 1 + len(subject_ids) + len(model.teachers)
+    network = MinCostFlow(sink + 1)
+
+    demand = 0
+    arcs = {}                             # {(subject id, teacher): (edge, capacity)}
+    listed = {}                           # {subject id: teachers listing it}
+    for subject_id in subject_ids:
+        sessions = [model.sessions[session_id] for session_id in open_sessions[subject_id]]
+        hours = sum(session.length for session in sessions)
+        demand += hours
+        network.add_edge(source, subject_node[subject_id], hours, 0)
+        listed[subject_id] = set()
+        for code in teacher_subjects.get(str(model.subjects[subject_id].doc_id), ()):
+            listed[subject_id].update(teacher_codes.get(code, ()))
+        for teacher in sessions[0].teachers:
+            cost = 0 if teacher in listed[subject_id] else UNLISTED_COST
+            arcs[(subject_id, teacher)] = (
+                network.add_edge(subject_node[subject_id], teacher_node[teacher], hours, cost), hours)
+
+    # One arc per hour with a rising cost makes the load cost convex
+    for teacher in model.teachers:
+        for hour in range(max(capacity[teacher.id], 0)):
+            network.add_edge(teacher_node[teacher.id], sink, 1, hour * LOAD_COST)
+
+    _, cost = network.solve(source, sink, demand)
+
+    # One teacher per (subject, groups) demand: the flow's shares first, then whoever
+    # has the hours; demands with the fewest eligible teachers choose first
+    demands = defaultdict(list)           # {(subject id, groups): [session ids]}
+    for subject_id in subject_ids:
+        for session_id in open_sessions[subject_id]:
+            demands[(subject_id, tuple(model.sessions[session_id].groups))].append(session_id)
+    shares = defaultdict(dict)            # {subject id: {teacher: hours of its flow not yet used}}
+    for (subject_id, teacher), (edge, arc_capacity) in arcs.items():
+        shares[subject_id][teacher] = network.flow(edge, arc_capacity)
+    demand_hours = {demand: sum(model.sessions[session_id].length for session_id in session_ids)
+                    for demand, session_ids in demands.items()}
+
+    residual = [max(hours, 0) for hours in capacity]
+    assigned = 0
+    left_open = []
+    for demand in sorted(demands, key=lambda demand: (len(shares[demand[0]]), -demand_hours[demand])):
+        subject_id = demand[0]
+        subject_shares = shares[subject_id]
+
+        def choose(hours):
+            fits = [teacher for teacher in subject_shares if residual[teacher] >= hours]
+            return max(fits, default=None, key=lambda teacher: (
+                subject_shares[teacher] >= hours, subject_shares[teacher],
+                teacher in listed[subject_id], residual[teacher]))
+
+        # Split by whole sessions only when no teacher has the hours for all of it
+        teacher = choose(demand_hours[demand])
+        for session_id in demands[demand]:
+            session = model.sessions[session_id]
+            chosen = teacher if teacher is not None else choose(session.length)
+            if chosen is None:
+                left_open.append(session_id)
+                continue
+            subject_shares[chosen] -= session.length
+            residual[chosen] -= session.length
+            session.teachers = [chosen]
+            assigned += 1
+
+    return {"assigned": assigned, "open": sorted(left_open), "cost": cost}
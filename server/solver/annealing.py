@@ -0,0 +1,282 @@
+"""
+Simulated-annealing improvement of a solved timetable
+"""
+import math
+import random
+import time
+
+from .scoring import (BUNCHING_WEIGHT, GAP_WEIGHT, OVERLOAD_WEIGHT, PREFERENCE_WEIGHT, day_gaps,
+                      outside_preference, soft_penalty, subject_bunching)
+
+
+class AnnealingImprover:
+    """
+    Local search over an existing assignment that lowers the soft penalty
+    without breaking any hard constraint.
+
+    Two neighbourhoods are sampled: relocating one lecture or practical to
+    another position (changing teacher or room only when the current ones
+    are busy there), and swapping the positions of two sessions of the same
+    kind and length. The cost of a move is a delta over the teacher-days,
+    group-days and subject rows it touches, never a rescore of the grid.
+
+    The index must already contain the assignment; on return both the index
+    and ``assignment`` hold the best state found. An optional ProgressHook
+    receives the iteration count and best penalty and can stop the run early;
+    a RunStats gets the iterations, accepted moves and the penalty removed.
+    """
+
+    def __init__(self, model, index, assignment, workload, rng=None, time_limit=1.0,
+                 max_iterations=None, start_temperature=2.0, end_temperature=0.05, hook=None, stats=None):
+        self.model = model
+        self.index = index
+        self.assignment = dict(assignment)
+        self.workload = workload
+        self.capacity = [teacher.max_workload for teacher in model.teachers]
+        self.rng = rng or random.Random()
+        self.time_limit = time_limit
+        self.max_iterations = max_iterations
+        self.start_temperature = start_temperature
+        self.end_temperature = end_temperature
+        self.hook = hook
+        self.stats = stats
+
+        self.iterations = 0
+        self.accepted = 0
+
+        num_days = len(model.days)
+        self.teacher_days = [[0] * num_days for _ in model.teachers]
+        self.group_loads = [[0] * num_days for _ in model.groups]
+        self.subject_days = {}
+        for session_id, value in self.assignment.items():
+            self._score_add(session_id, value)
+        self.group_share = [-(-sum(loads) // num_days) for loads in self.group_loads]
+
+        self.cost = soft_penalty(model, self.assignment)
+        self.initial_cost = self.cost
+
+    def run(self):
+        """Improve until the time or iteration budget is spent; returns the assignment"""
+        session_ids = list(self.assignment)
+        if len(session_ids) < 2 or (self.time_limit is None and self.max_iterations is None):
+            return self.assignment
+
+        start = time.monotonic()
+        best_cost = self.cost
+        best = dict(self.assignment)
+        temperature = self.start_temperature
+        ratio = self.end_temperature / self.start_temperature
+
+        while self.max_iterations is None or self.iterations < self.max_iterations:
+            # Cool geometrically over whichever budget is used up first
+            if self.iterations & 63 == 0:
+                progress = 0.0
+                if self.time_limit is not None:
+                    progress = (time.monotonic() - start) / self.time_limit
+                if self.max_iterations is not None:
+                    progress = max(progress, self.iterations / self.max_iterations)
+                if progress >= 1.0:
+                    break
+                if self.hook is not None:
+                    if self.hook.cancelled:
+                        break
+                    self.hook.best_score = best_cost
+                    self.hook.report(iterations=self.iterations, penalty=self.cost)
+                temperature = self.start_temperature * ratio ** progress
+
+            self.iterations += 1
+            if self.rng.random() < 0.5:
+                moved = self._try_relocate(self.rng.choice(session_ids), temperature)
+            else:
+                moved = self._try_swap(self.rng.choice(session_ids), self.rng.choice(session_ids), temperature)
+
+            if moved and self.cost < best_cost:
+                best_cost = self.cost
+                best = dict(self.assignment)
+
+        if best_cost < self.cost:
+            self._restore(best)
+        if self.stats is not None:
+            self.stats.count("iterations", self.iterations)
+            self.stats.count("accepted_moves", self.accepted)
+            self.stats.count("penalty_removed", self.initial_cost - self.cost)
+        return self.assignment
+
+    def _accept(self, delta, temperature):
+        if delta <= 0:
+            return True
+        return self.rng.random() < math.exp(-delta / temperature)
+
+    def _try_relocate(self, session_id, temperature):
+        session = self.model.sessions[session_id]
+        old = self.assignment[session_id]
+        day, slots, mask = self.rng.choice(session.positions)
+        if mask == old[2]:
+            return False
+
+        self._index_remove(session, old)
+        new = self._fit(session, day, slots, mask, old[3], old[4])
+        if new is None:
+            self._index_place(session, old)
+            return False
+
+        keys = self._affected(session, old, new)
+        before = self._local_cost(keys)
+        self._score_remove(session_id, old)
+        self._score_add(session_id, new)
+        delta = self._local_cost(keys) - before
+
+        if self._accept(delta, temperature):
+            self._index_place(session, new)
+            self.workload[old[3]] -= session.length
+            self.workload[new[3]] += session.length
+            self.assignment[session_id] = new
+            self.cost += delta
+            self.accepted += 1
+            return True
+
+        self._score_remove(session_id, new)
+        self._score_add(session_id, old)
+        self._index_place(session, old)
+        return False
+
+    def _try_swap(self, first_id, second_id, temperature):
+        sessions = self.model.sessions
+        first, second = sessions[first_id], sessions[second_id]
+        if first_id == second_id or first.kind != second.kind or first.length != second.length:
+            return False
+        first_old, second_old = self.assignment[first_id], self.assignment[second_id]
+        if first_old[2] == second_old[2]:
+            return False
+
+        # Exchange positions, keeping each session's teacher and room
+        self._index_remove(first, first_old)
+        self._index_remove(second, second_old)
+        first_new = self._fit(first, *second_old[:3], first_old[3], first_old[4], keep_resources=True)
+        second_new = None
+        if first_new is not None:
+            self._index_place(first, first_new)
+            second_new = self._fit(second, *first_old[:3], second_old[3], second_old[4], keep_resources=True)
+            self._index_remove(first, first_new)
+        if second_new is None:
+            self._index_place(first, first_old)
+            self._index_place(second, second_old)
+            return False
+
+        keys = self._merge(self._affected(first, first_old, first_new),
+                           self._affected(second, second_old, second_new))
+        before = self._local_cost(keys)
+        self._score_remove(first_id, first_old)
+        self._score_remove(second_id, second_old)
+        self._score_add(first_id, first_new)
+        self._score_add(second_id, second_new)
+        delta = self._local_cost(keys) - before
+
+        if self._accept(delta, temperature):
+            self._index_place(first, first_new)
+            self._index_place(second, second_new)
+            self.assignment[first_id] = first_new
+            self.assignment[second_id] = second_new
+            self.cost += delta
+            self.accepted += 1
+            return True
+
+        self._score_remove(first_id, first_new)
+        self._score_remove(second_id, second_new)
+        self._score_add(first_id, first_old)
+        self._score_add(second_id, second_old)
+        self._index_place(first, first_old)
+        self._index_place(second, second_old)
+        return False
+
+    def _fit(self, session, day, slots, mask, teacher, room, keep_resources=False):
+        """A hard-feasible value at the position, preferring the current teacher and room"""
+        index = self.index
+        if session.one_per_day and any(index.subject_on_day(group, session.subject, day)
+                                       for group in session.groups):
+            return None
+        if not index.groups_free(session.check_groups, mask):
+            return None
+
+        if index.teachers[teacher] & mask:
+            if keep_resources:
+                return None
+            teachers = [other for other in session.teachers
+                        if not index.teachers[other] & mask
+                        and self.workload[other] + session.length <= self.capacity[other]]
+            if not teachers:
+                return None
+            teacher = self.rng.choice(teachers)
+
+        if index.rooms[room] & mask:
+            if keep_resources:
+                return None
+            rooms = [other for other in session.rooms if not index.rooms[other] & mask]
+            if not rooms:
+                return None
+            room = self.rng.choice(rooms)
+
+        return day, slots, mask, teacher, room
+
+    def _index_place(self, session, value):
+        day, slots, mask, teacher, room = value
+        self.index.place(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+
+    def _index_remove(self, session, value):
+        day, slots, mask, teacher, room = value
+        self.index.remove(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+
+    def _score_add(self, session_id, value):
+        session = self.model.sessions[session_id]
+        day, slots, mask, teacher, room = value
+        self.teacher_days[teacher][day] |= mask >> (day * self.model.slots_per_day)
+        for group in session.groups:
+            self.group_loads[group][day] += 1
+            counts = self.subject_days.setdefault((group, session.subject), [0] * len(self.model.days))
+            counts[day] += 1
+
+    def _score_remove(self, session_id, value):
+        session = self.model.sessions[session_id]
+        day, slots, mask, teacher, room = value
+        self.teacher_days[teacher][day] &= ~(mask >> (day * self.model.slots_per_day))
+        for group in session.groups:
+            self.group_loads[group][day] -= 1
+            self.subject_days[(group, session.subject)][day] -= 1
+
+    def _affected(self, session, old, new):
+        teacher_days = {(old[3], old[0]), (new[3], new[0])}
+        group_days = set()
+        subjects = set()
+        for group in session.groups:
+            group_days.add((group, old[0]))
+            group_days.add((group, new[0]))
+            subjects.add((group, session.subject))
+        return teacher_days, group_days, subjects
+
+    def _merge(self, first, second):
+        return first[0] | second[0], first[1] | second[1], first[2] | second[2]
+
+    def _local_cost(self, keys):
+        teacher_days, group_days, subjects = keys
+        teaching_mask = self.model.teaching_day_mask
+        gaps = sum(day_gaps(self.teacher_days[teacher][day], teaching_mask) for teacher, day in teacher_days)
+        overload = sum(max(0, self.group_loads[group][day] - self.group_share[group]) for group, day in group_days)
+        bunching = sum(subject_bunching(self.subject_days[key]) for key in subjects)
+        preference = sum(outside_preference(self.teacher_days[teacher][day], self.model.preferred_day_mask(teacher, day))
+                         for teacher, day in teacher_days)
+        return (GAP_WEIGHT * gaps + OVERLOAD_WEIGHT * overload + BUNCHING_WEIGHT * bunching
+                + PREFERENCE_WEIGHT * preference)
+
+    def _restore(self, best):
+        """Bring index, workload and score tables back to a saved assignment"""
+        sessions = self.model.sessions
+        for session_id, value in self.assignment.items():
+            self._index_remove(sessions[session_id], value)
+            self._score_remove(session_id, value)
+            self.workload[value[3]] -= sessions[session_id].length
+        for session_id, value in best.items():
+            self._index_place(sessions[session_id], value)
+            self._score_add(session_id, value)
+            self.workload[value[3]] += sessions[session_id].length
+        self.assignment = best
+        self.cost = soft_penalty(self.model, best)
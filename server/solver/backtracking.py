@@ -0,0 +1,298 @@
+"""
+Backtracking search with MRV ordering and forward checking
+"""
+import random
+import time
+from collections import defaultdict
+
+from .matching import RoomMatcher
+
+
+def luby(run):
+    """Term ``run`` (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..."""
+    while True:
+        size = 1
+        while size < run:
+            size = 2 * size + 1
+        if run == size:
+            return (size + 1) // 2
+        # Past a complete block the sequence starts over
+        run -= size // 2
+
+
+class BacktrackingSolver:
+    """
+    Depth-first search over the sessions of a ProblemModel on top of an
+    OccupancyIndex.
+
+    Every node expands the most constrained unassigned session first (the
+    one with the fewest feasible position/teacher/room combinations). The
+    same count doubles as forward checking: as soon as any remaining session
+    has no option left the branch is abandoned. Positions are tried least
+    constraining first, i.e. those removing the fewest feasible positions
+    from sessions of the same groups. Placements are undone by clearing the
+    masks they set, so backtracking costs a handful of ANDs.
+
+    Search is bounded by ``max_nodes`` and ``time_limit``; ``timed_out`` is
+    set when either bound stopped it, and ``best_assignment`` then holds the
+    largest partial assignment the search reached. ``preferred`` maps session ids to a
+    previous (day, slots, mask, teacher, room) value that is tried before
+    any other, so a repair keeps as much of an old timetable as it can.
+    An optional ProgressHook gets node and backtrack counts and can cancel
+    the search. With a SymmetryBreaking, interchangeable rooms are tried
+    once per occupancy, and a position refuted for one session is excluded
+    for the sessions interchangeable with it in the sibling branches, so
+    relabelings of a dead end are not explored again.
+
+    Rooms are not branched on beyond one per free class: when no eligible
+    room is free at a position, the RoomMatcher may still fit the session
+    by moving sessions of the same position to other rooms.
+
+    With a RunStats, values tried, rejections by conflict kind while
+    counting options, and the node and backtrack totals are added to it.
+    """
+
+    def __init__(self, model, index, session_ids, workload, rng=None, max_nodes=200000, time_limit=None,
+                 preferred=None, hook=None, symmetry=None, stats=None):
+        self.model = model
+        self.index = index
+        self.sessions = model.sessions
+        self.session_ids = list(session_ids)
+        self.workload = workload
+        self.capacity = [teacher.max_workload for teacher in model.teachers]
+        self.rng = rng or random.Random()
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.preferred = preferred or {}
+        self.hook = hook
+        self.symmetry = symmetry
+        self.stats = stats
+        self.room_class = symmetry.room_class if symmetry is not None else None
+        # {session index: position masks refuted for an interchangeable session}
+        self.excluded = defaultdict(set)
+        self._twin_rooms = {}
+        # {(eligible-room list id, position mask): free rooms}, valid for one room_version
+        self._rooms_cache = {}
+        self._rooms_version = None
+
+        # {session index: (day, slots, mask, teacher, room)}
+        self.assignment = {}
+        self.best_assignment = {}
+        self.matcher = RoomMatcher(model, index, self.assignment)
+        self.nodes = 0
+        self.backtracks = 0
+        self.timed_out = False
+        self.cancelled = False
+        self._deadline = None
+
+    def solve(self):
+        """Assign every session; returns False if none exists within the bounds"""
+        if self.time_limit is not None:
+            self._deadline = time.monotonic() + self.time_limit
+        solved = self._search(set(self.session_ids))
+        if self.stats is not None:
+            self.stats.count("nodes", self.nodes)
+            self.stats.count("backtracks", self.backtracks)
+            self.stats.count("placed", len(self.assignment))
+        return solved
+
+    def _search(self, unassigned):
+        if not unassigned:
+            return True
+        if len(self.assignment) > len(self.best_assignment):
+            self.best_assignment = dict(self.assignment)
+
+        self.nodes += 1
+        if self.nodes > self.max_nodes or (self._deadline is not None and time.monotonic() > self._deadline):
+            self.timed_out = True
+            return False
+        if self.hook is not None and not self.nodes & 255:
+            if self.hook.cancelled:
+                self.cancelled = self.timed_out = True
+                return False
+            self.hook.report(placed=len(self.assignment), nodes=self.nodes, backtracks=self.backtracks)
+
+        # Minimum remaining values, with forward checking on every count
+        best, best_count = None, None
+        free_positions = {}
+        for session_idx in unassigned:
+            count, free_positions[session_idx] = self._count_options(self.sessions[session_idx])
+            if count == 0:
+                return False
+            if best_count is None or count < best_count:
+                best, best_count = session_idx, count
+
+        unassigned.remove(best)
+        equivalent = ()
+        if self.symmetry is not None:
+            equivalent = self.symmetry.equivalent(self.sessions[best], unassigned, self.index.groups)
+        refuted = []
+        for mask, values in self._values(best, unassigned, free_positions):
+            for value in values:
+                if self.stats is not None:
+                    self.stats.counters["attempts"] += 1
+                if not self._place(best, value):
+                    continue
+                if self._search(unassigned):
+                    return True
+                self._undo(best)
+                if self.timed_out:
+                    break
+                self.backtracks += 1
+            if self.timed_out:
+                break
+            # Every value here failed, so it fails for any relabeling of this session too
+            for other in equivalent:
+                if mask not in self.excluded[other]:
+                    self.excluded[other].add(mask)
+                    refuted.append((other, mask))
+        for other, mask in refuted:
+            self.excluded[other].discard(mask)
+        unassigned.add(best)
+        return False
+
+    def _position_free(self, session, day, mask):
+        index = self.index
+        if session.one_per_day:
+            for group in session.groups:
+                if index.subject_on_day(group, session.subject, day):
+                    return False
+        if session.id in self.excluded and mask in self.excluded[session.id]:
+            return False
+        if index.groups_free(session.check_groups, mask):
+            return True
+        if self.stats is not None:
+            self.stats.conflicts["batch"] += 1
+        return False
+
+    def _free_teachers(self, session, mask):
+        teacher_masks = self.index.teachers
+        workload = self.workload
+        capacity = self.capacity
+        length = session.length
+        return [teacher for teacher in session.teachers
+                if not teacher_masks[teacher] & mask and workload[teacher] + length <= capacity[teacher]]
+
+    def _free_rooms(self, session, mask):
+        """
+        Free eligible rooms at a position, cached until the next room change
+        since the sessions counted at one node share room lists and positions;
+        callers must not modify the returned list
+        """
+        if self._rooms_version != self.index.room_version:
+            self._rooms_cache.clear()
+            self._rooms_version = self.index.room_version
+        key = (id(session.rooms), mask)
+        rooms = self._rooms_cache.get(key)
+        if rooms is None:
+            rooms = self._rooms_cache[key] = self._distinct_free_rooms(session, mask)
+        return rooms
+
+    def _distinct_free_rooms(self, session, mask):
+        room_masks = self.index.rooms
+        rooms = self.index.free_rooms(session.rooms, mask)
+        if self.room_class is None or len(rooms) < 2 or not self._has_twin_rooms(session.rooms):
+            return rooms
+        # One representative per class of identically occupied rooms
+        seen = set()
+        distinct = []
+        for room in rooms:
+            key = (self.room_class[room], room_masks[room])
+            if key not in seen:
+                seen.add(key)
+                distinct.append(room)
+        return distinct
+
+    def _has_twin_rooms(self, rooms):
+        """Whether an eligible-room list has two rooms of one class, cached per list"""
+        key = id(rooms)
+        if key not in self._twin_rooms:
+            classes = [self.room_class[room] for room in rooms]
+            self._twin_rooms[key] = len(set(classes)) < len(classes)
+        return self._twin_rooms[key]
+
+    def _prefer_room(self, rooms, room, mask):
+        """Rooms with the given one first, standing in for its class if it was collapsed"""
+        if room in rooms:
+            return [room] + [other for other in rooms if other != room]
+        room_masks = self.index.rooms
+        if self.room_class is None or room_masks[room] & mask:
+            return rooms
+        key = (self.room_class[room], room_masks[room])
+        return [room] + [other for other in rooms if (self.room_class[other], room_masks[other]) != key]
+
+    def _count_options(self, session):
+        """Number of feasible (position, teacher, room) triples and the usable positions"""
+        count = 0
+        positions = []
+        for position in session.positions:
+            day, slots, mask = position
+            if not self._position_free(session, day, mask):
+                continue
+            teachers = len(self._free_teachers(session, mask))
+            if not teachers:
+                if self.stats is not None:
+                    self.stats.conflicts["teacher"] += 1
+                continue
+            rooms = len(self._free_rooms(session, mask))
+            if not rooms and self.matcher.can_place(session, mask):
+                rooms = 1
+            if not rooms and self.stats is not None:
+                self.stats.conflicts["room"] += 1
+            options = teachers * rooms
+            if options:
+                count += options
+                positions.append(position)
+        return count, positions
+
+    def _values(self, session_idx, unassigned, free_positions):
+        """(position mask, [values at it]) pairs, least constraining position first"""
+        session = self.sessions[session_idx]
+        groups = set(session.groups)
+        related = [free_positions[other] for other in unassigned
+                   if groups.intersection(self.sessions[other].check_groups)]
+
+        def conflicts(position):
+            mask = position[2]
+            return sum(1 for positions in related for other in positions if other[2] & mask)
+
+        positions = list(free_positions[session_idx])
+        self.rng.shuffle(positions)
+        positions.sort(key=conflicts)
+        previous = self.preferred.get(session_idx)
+        if previous is not None:
+            positions.sort(key=lambda position: position[2] != previous[2])
+        for day, slots, mask in positions:
+            teachers = self._free_teachers(session, mask)
+            rooms = list(self._free_rooms(session, mask))
+            if not rooms:
+                # Let the matcher find a room by moving others, if it can
+                rooms = [None]
+            self.rng.shuffle(teachers)
+            self.rng.shuffle(rooms)
+            if previous is not None:
+                teachers.sort(key=lambda teacher: teacher != previous[3])
+                rooms = self._prefer_room(rooms, previous[4], mask)
+            yield mask, [(day, slots, mask, teacher, room) for teacher in teachers for room in rooms]
+
+    def _place(self, session_idx, value):
+        """Place a value; False if the matcher can no longer give it a room"""
+        session = self.sessions[session_idx]
+        value = self.matcher.place(session_idx, value)
+        if value is None:
+            return False
+        day, slots, mask, teacher, room = value
+        self.index.place(mask, day, teacher=teacher, room=room,
+                         groups=session.groups, subject=session.subject)
+        self.workload[teacher] += session.length
+        self.assignment[session_idx] = value
+        return True
+
+    def _undo(self, session_idx):
+        session = self.sessions[session_idx]
+        value = self.assignment.pop(session_idx)
+        self.matcher.remove(session_idx, value)
+        day, slots, mask, teacher, room = value
+        self.index.remove(mask, day, teacher=teacher, room=room,
+                          groups=session.groups, subject=session.subject)
+        self.workload[teacher] -= session.length
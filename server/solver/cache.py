@@ -0,0 +1,110 @@
+"""
+Generation results cached under a fingerprint of the compiled solver input
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+def fingerprint(model, teacher_masks, room_masks, **parts):
+    """
+    Canonical sha256 of everything a solve depends on: the model's time
+    grid, teachers, rooms, subjects, groups and sessions (labels, limits,
+    calendars, eligibility and positions), the occupancy already taken by
+    other departments, and the keyword ``parts`` (solver mode, seed,
+    options...). Changing any document that went into the model changes
+    the fingerprint, so stale entries are never looked up again.
+    """
+    positions = {}
+    sessions = []
+    for session in model.sessions:
+        # Sessions share position lists; serialize each list once
+        key = id(session.positions)
+        if key not in positions:
+            positions[key] = len(positions)
+        sessions.append([session.subject, session.kind, session.year, session.batch, session.groups,
+                         session.check_groups, positions[key], session.teachers, session.rooms,
+                         session.length, session.one_per_day])
+    position_lists = [None] * len(positions)
+    for session in model.sessions:
+        index = positions[id(session.positions)]
+        if position_lists[index] is None:
+            position_lists[index] = [[day, slots] for day, slots, mask in session.positions]
+
+    document = {
+        "days": model.days,
+        "time_slots": model.time_slots,
+        "teachers": [[teacher.code, teacher.name, str(teacher.doc_id), teacher.max_workload,
+                      hex(teacher.unavailable), hex(teacher.preferred)] for teacher in model.teachers],
+        "rooms": [[room.number, room.type, room.capacity, str(room.doc_id)] for room in model.rooms],
+        "subjects": [[subject.code, subject.name, subject.year, subject.kind, subject.per_week, subject.length,
+                      subject.teachers, subject.rooms, str(subject.doc_id)] for subject in model.subjects],
+        "groups": model.groups,
+        "sessions": sessions,
+        "positions": position_lists,
+        "teacher_masks": [hex(mask) for mask in teacher_masks],
+        "room_masks": [hex(mask) for mask in room_masks],
+        "parts": parts
+    }
+    encoded = json.dumps(document, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of solve results keyed by ``fingerprint``.
+
+    Entries are plain JSON-friendly dicts. The ``max_entries`` most
+    recently used stay in memory; with a Mongo ``collection`` every entry is
+    also written there and misses fall back to it, so results survive
+    restarts and are shared between server processes. The collection is not
+    trimmed here; a TTL index on ``created_at`` can expire it.
+    """
+
+    def __init__(self, max_entries=64, collection=None):
+        self.max_entries = max_entries
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """The entry stored under key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        if self.collection is not None:
+            document = self.collection.find_one({"_id": key})
+            if document is not None:
+                entry = document["entry"]
+                self._remember(key, entry)
+                with self._lock:
+                    self.hits += 1
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        if self.collection is not None:
+            self.collection.update_one({"_id": key}, {"$set": {"entry": entry, "created_at": datetime.now()}},
+                                       upsert=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
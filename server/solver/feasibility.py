@@ -0,0 +1,189 @@
+"""
+Supply/demand bounds checked before any search
+"""
+from collections import defaultdict
+
+
+class InfeasibleError(ValueError):
+    """The pre-check proved that no complete timetable exists; ``report`` says why"""
+
+    def __init__(self, report):
+        super().__init__("Timetable is infeasible: " + "; ".join(
+            violation["message"] for violation in report["violations"]))
+        self.report = report
+
+
+def _cells(mask):
+    return bin(mask).count("1")
+
+
+def _pool_demands(demand):
+    """
+    For a {sorted resource tuple: demand} map, the summed demand of every
+    pool and of all pools it contains. A contained pool starts with one of
+    the pool's members, so pools are bucketed by their first member once and
+    each pool is only compared with the buckets of its own members.
+    """
+    by_first = defaultdict(list)
+    for pool, amount in demand.items():
+        if pool:
+            by_first[pool[0]].append((pool, amount))
+    totals = {}
+    for pool in demand:
+        if pool:
+            members = set(pool)
+            totals[pool] = sum(amount for member in pool for other, amount in by_first[member]
+                               if members.issuperset(other))
+    return totals
+
+
+def check_feasibility(model, index):
+    """
+    Necessary conditions for scheduling every session of ``model`` on top of
+    the occupancy already in ``index`` (other departments' teachers and
+    rooms).
+
+    Each condition compares a demand with a supply that no assignment can
+    exceed, so a violation proves infeasibility while passing proves
+    nothing. Checked, in one pass over the sessions:
+
+    - sessions without an eligible teacher, room or position;
+    - lectures of a subject per week against working days (one per day);
+    - per class group, the cells its lectures and practicals need against
+      its free teaching cells, and practicals against practical slot pairs;
+    - per teacher pool, the hours of sessions only that pool can teach
+      against the pool's workload limits and free cells;
+    - per room pool, the cells (and for practicals, slot pairs) of sessions
+      only that pool can host against the pool's free cells and pairs.
+
+    A pool's demand sums the pools it contains; each distinct eligible
+    teacher or room tuple is compared only with the tuples starting at one
+    of its members (see _pool_demands), not with every other tuple.
+
+    Returns {"feasible": bool, "violations": [...]} where each violation
+    has a resource kind, its name, demand, supply and a readable message.
+    """
+    violations = []
+
+    def violation(resource, name, demand, supply, message, year=None):
+        entry = {"resource": resource, "name": name, "demand": demand, "supply": supply, "message": message}
+        if year is not None:
+            entry["year"] = year
+        violations.append(entry)
+
+    # Cells any session may use at all, and the practical slot pairs
+    position_lists = {}
+    for session in model.sessions:
+        position_lists.setdefault(id(session.positions), session.positions)
+    teaching_cells = 0
+    for positions in position_lists.values():
+        for position in positions:
+            teaching_cells |= position[2]
+
+    occupied_cells = defaultdict(int)     # {group: cells of sessions occupying it}
+    checked_cells = defaultdict(lambda: defaultdict(int))  # {group: {occupied group: cells keeping it free}}
+    occupier_checks = {}                  # {group: groups every occupier keeps free}
+    group_pairs = defaultdict(int)        # {(group, positions id): sessions needing those positions}
+    subject_lectures = defaultdict(int)   # {(group, subject): one-per-day sessions}
+    subject_days = {}                     # {(group, subject): days it has positions on}
+    teacher_demand = defaultdict(int)     # {eligible teacher tuple: hours}
+    room_demand = defaultdict(int)        # {eligible room tuple: cells}
+    room_pair_demand = defaultdict(lambda: defaultdict(int))  # {positions id: {eligible room tuple: sessions}}
+    missing = set()
+
+    for session in model.sessions:
+        subject = model.subjects[session.subject]
+        for resource, options, label in (("teacher", session.teachers, "eligible teacher"),
+                                         ("room", session.rooms, "suitable room"),
+                                         ("position", session.positions, "usable time slot")):
+            if not options and (subject.id, resource) not in missing:
+                missing.add((subject.id, resource))
+                violation(resource, subject.code, session.length, 0,
+                          f"No {label} for {subject.name or subject.code} ({subject.year})",
+                          year=subject.year)
+
+        # A session occupies its groups and keeps the other checked groups free
+        for group in session.groups:
+            occupied_cells[group] += session.length
+            checks = set(session.check_groups)
+            occupier_checks[group] = occupier_checks[group] & checks if group in occupier_checks else checks
+        for group in session.check_groups:
+            if group not in session.groups:
+                for occupied in session.groups:
+                    checked_cells[group][occupied] += session.length
+        if session.length > 1:
+            for group in session.groups:
+                group_pairs[(group, id(session.positions))] += 1
+        if session.one_per_day:
+            for group in session.groups:
+                subject_lectures[(group, session.subject)] += 1
+                if (group, session.subject) not in subject_days:
+                    subject_days[(group, session.subject)] = len({position[0] for position in session.positions})
+
+        teacher_demand[tuple(sorted(session.teachers))] += session.length
+        room_demand[tuple(sorted(session.rooms))] += session.length
+        if session.length > 1:
+            room_pair_demand[id(session.positions)][tuple(sorted(session.rooms))] += 1
+
+    # One lecture of a subject per day
+    for (group, subject_id), count in subject_lectures.items():
+        subject = model.subjects[subject_id]
+        days = subject_days[(group, subject_id)]
+        if count > days:
+            violation("subject", subject.code, count, days,
+                      f"{subject.name or subject.code} needs {count} lectures a week but only {days} working days",
+                      year=subject.year)
+
+    # Class and batch timelines
+    group_year = {}
+    for year, main in model.main_group.items():
+        group_year[main] = year
+        for batch in model.batch_groups[year]:
+            group_year[batch] = year
+    # Occupiers of a group are pairwise disjoint, and disjoint from the sessions
+    # of any one other group h that keep it free as long as they all keep h free
+    for group in range(len(model.groups)):
+        allowed = occupier_checks.get(group)
+        demand = occupied_cells[group] + max(
+            (cells for occupied, cells in checked_cells[group].items()
+             if allowed is None or occupied in allowed), default=0)
+        supply = _cells(teaching_cells & ~index.groups[group])
+        if demand > supply:
+            violation("group", model.groups[group], demand, supply,
+                      f"{model.groups[group]} needs {demand} slots but has {supply} free",
+                      year=group_year.get(group))
+    for (group, positions_id), demand in group_pairs.items():
+        supply = sum(1 for position in position_lists[positions_id] if not index.groups[group] & position[2])
+        if demand > supply:
+            violation("group", model.groups[group], demand, supply,
+                      f"{model.groups[group]} needs {demand} practical slot pairs but has {supply}",
+                      year=group_year.get(group))
+
+    # Teacher pools: sessions restricted to a pool cannot use anyone else
+    teacher_supply = [min(teacher.max_workload, _cells(teaching_cells & ~index.teachers[teacher.id]))
+                      for teacher in model.teachers]
+    for pool, demand in _pool_demands(teacher_demand).items():
+        supply = sum(teacher_supply[teacher] for teacher in pool)
+        if demand > supply:
+            name = ", ".join(model.teachers[teacher].code for teacher in pool)
+            violation("teacher", name, demand, supply,
+                      f"Teachers {name} are assigned {demand} hours but can take at most {supply}")
+
+    # Room pools, in cells and in practical slot pairs
+    room_supply = [_cells(teaching_cells & ~index.rooms[room.id]) for room in model.rooms]
+    for pool, demand in _pool_demands(room_demand).items():
+        supply = sum(room_supply[room] for room in pool)
+        if demand > supply:
+            name = ", ".join(model.rooms[room].number for room in pool)
+            violation("room", name, demand, supply,
+                      f"Rooms {name} are needed for {demand} slots but have {supply} free")
+    for positions_id, pool_demand in room_pair_demand.items():
+        for pool, demand in _pool_demands(pool_demand).items():
+            supply = sum(1 for room in pool for position in position_lists[positions_id]
+                         if not index.rooms[room] & position[2])
+            if demand > supply:
+                name = ", ".join(model.rooms[room].number for room in pool)
+                violation("room", name, demand, supply,
+                          f"Rooms {name} are needed for {demand} practical slot pairs but have {supply} free")
+
+    return {"feasible": not violations, "violations": violations}
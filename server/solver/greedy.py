@@ -0,0 +1,134 @@
+"""
+Randomized first-fit scheduling
+"""
+import random
+import time
+
+from .matching import RoomMatcher
+
+
+class GreedySolver:
+    """
+    Single pass over the sessions of a ProblemModel in model order.
+
+    Every session takes the first free (day, slots, teacher) found in a
+    shuffled order and a random free room there; when every eligible room
+    is taken, a RoomMatcher may free one by moving sessions of the same
+    position to other rooms. When a session cannot be placed, the remaining
+    sessions of the same subject and group are skipped; all of them end up
+    in ``unscheduled``. Past ``time_limit`` seconds the sessions not yet
+    tried are left unscheduled as well and ``timed_out`` is set.
+
+    With a RunStats, candidates tried, rejections by conflict kind and the
+    time spent on lectures and on practicals are added to it.
+    """
+
+    def __init__(self, model, index, session_ids, workload, rng=None, time_limit=None, hook=None, stats=None):
+        self.model = model
+        self.index = index
+        self.session_ids = list(session_ids)
+        self.workload = workload
+        self.capacity = [teacher.max_workload for teacher in model.teachers]
+        self.rng = rng or random.Random()
+        self.time_limit = time_limit
+        self.hook = hook
+        self.stats = stats
+
+        # {session index: (day, slots, mask, teacher, room)}
+        self.assignment = {}
+        self.matcher = RoomMatcher(model, index, self.assignment)
+        self.unscheduled = []
+        self.timed_out = False
+        self._positions_by_day = {}
+
+    def solve(self):
+        """Place as many sessions as possible; True if all of them were placed"""
+        sessions = self.model.sessions
+        stats = self.stats
+        failed = set()
+        deadline = time.monotonic() + self.time_limit if self.time_limit is not None else None
+        for tried, session_id in enumerate(self.session_ids):
+            if deadline is not None and time.monotonic() > deadline:
+                self.timed_out = True
+                self.unscheduled.extend(self.session_ids[tried:])
+                break
+            if self.hook is not None:
+                if self.hook.cancelled:
+                    return False
+                self.hook.report(placed=len(self.assignment))
+            session = sessions[session_id]
+            key = (session.subject, session.groups)
+            if key in failed:
+                self.unscheduled.append(session_id)
+                continue
+
+            if stats is not None:
+                start = time.perf_counter()
+            value = self._first_fit(session)
+            if stats is not None:
+                stats.add_time(f"{session.kind}s", time.perf_counter() - start)
+                stats.count("placed" if value is not None else "failed")
+            if value is None:
+                failed.add(key)
+                self.unscheduled.append(session_id)
+                continue
+
+            value = self.matcher.place(session_id, value)
+            day, slots, mask, teacher, room = value
+            self.index.place(mask, day, teacher=teacher, room=room,
+                             groups=session.groups, subject=session.subject)
+            self.workload[teacher] += session.length
+            self.assignment[session_id] = value
+        return not self.unscheduled
+
+    def _by_day(self, positions):
+        """Candidate positions grouped by day, cached per shared positions list"""
+        key = id(positions)
+        if key not in self._positions_by_day:
+            by_day = {}
+            for position in positions:
+                by_day.setdefault(position[0], []).append(position)
+            self._positions_by_day[key] = by_day
+        return self._positions_by_day[key]
+
+    def _first_fit(self, session):
+        index = self.index
+        rng = self.rng
+        stats = self.stats
+        by_day = self._by_day(session.positions)
+
+        days = list(by_day)
+        rng.shuffle(days)
+        for day in days:
+            # Skip days that already have this subject when it is once a day
+            if session.one_per_day and any(index.subject_on_day(group, session.subject, day)
+                                           for group in session.groups):
+                continue
+
+            positions = [position for position in by_day[day]
+                         if index.groups_free(session.check_groups, position[2])]
+            if stats is not None:
+                stats.conflicts["batch"] += len(by_day[day]) - len(positions)
+            rng.shuffle(positions)
+            for day, slots, mask in positions:
+                rooms = self.matcher.free_rooms(session, mask)
+                if not rooms and not self.matcher.can_place(session, mask):
+                    if stats is not None:
+                        stats.conflicts["room"] += 1
+                    continue
+                teachers = list(session.teachers)
+                rng.shuffle(teachers)
+                for teacher in teachers:
+                    if stats is not None:
+                        stats.counters["attempts"] += 1
+                    if index.teachers[teacher] & mask:
+                        if stats is not None:
+                            stats.conflicts["teacher"] += 1
+                        continue
+                    if self.workload[teacher] + session.length > self.capacity[teacher]:
+                        if stats is not None:
+                            stats.conflicts["workload"] += 1
+                        continue
+                    # No free room means the matcher moves others to make one
+                    return day, slots, mask, teacher, rng.choice(rooms) if rooms else None
+        return None
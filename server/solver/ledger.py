@@ -0,0 +1,169 @@
+"""
+Campus-wide teacher and room ledger shared between scheduling passes
+"""
+from collections import defaultdict
+from bson.objectid import ObjectId
+
+from .timegrid import TimeGrid
+
+
+class ResourceLedger:
+    """
+    Occupancy of every teacher and room across years and departments.
+
+    Masks are keyed by teacher code and room number, which stay stable
+    across departments, and use the same cell layout as OccupancyIndex. A
+    generation pass loads the ledger into its index before solving and
+    records its placements back after every year, so later passes see them.
+
+    Persisted timetables carry an ``occupancy`` summary (see
+    ``occupancy_document``) so a ledger can be seeded from the collection
+    by OR-ing a few integers per teacher and room instead of rescanning the
+    stored grids.
+
+    Departments may use other bell schedules: masks from a different grid
+    are translated by slot times (see TimeGrid.translate), marking every
+    slot they overlap. A campus ledger is laid out over TimeGrid.union of
+    every department's grid so no day or slot time is lost on the way.
+    """
+
+    def __init__(self, days, time_slots):
+        self.days = list(days)
+        self.time_slots = list(time_slots)
+        self.slots_per_day = len(self.time_slots)
+        self.day_index = {day: i for i, day in enumerate(self.days)}
+        self.slot_index = {slot: i for i, slot in enumerate(self.time_slots)}
+        self.day_full_mask = (1 << self.slots_per_day) - 1
+        self.grid = TimeGrid(self.days, self.time_slots)
+
+        # {teacher code / room number: bitmask of occupied cells}
+        self.teachers = defaultdict(int)
+        self.rooms = defaultdict(int)
+
+    def matches_grid(self, days, time_slots):
+        return self.days == list(days) and self.time_slots == list(time_slots)
+
+    def load_into(self, index, model):
+        """OR the ledger's occupancy into an index built for a model"""
+        translate = lambda mask: mask
+        if not self.matches_grid(model.days, model.time_slots):
+            model_grid = TimeGrid(model.days, model.time_slots)
+            translate = lambda mask: model_grid.translate(mask, self.days, self.time_slots)
+        for teacher in model.teachers:
+            index.teachers[teacher.id] |= translate(self.teachers.get(teacher.code, 0))
+        for room in model.rooms:
+            index.rooms[room.id] |= translate(self.rooms.get(room.number, 0))
+
+    def record(self, index, model):
+        """Store an index's teacher and room occupancy back under their labels"""
+        translate = lambda mask: mask
+        if not self.matches_grid(model.days, model.time_slots):
+            translate = lambda mask: self.grid.translate(mask, model.days, model.time_slots)
+        for teacher in model.teachers:
+            if index.teachers[teacher.id]:
+                self.teachers[teacher.code] |= translate(index.teachers[teacher.id])
+        for room in model.rooms:
+            if index.rooms[room.id]:
+                self.rooms[room.number] |= translate(index.rooms[room.id])
+
+    def add_timetables(self, timetables):
+        """Mark every teacher and room used in a {key: {day: {slot: cell}}} grid set"""
+        # Slots of another bell schedule mark the slots they overlap
+        slot_bits = {}
+        for grid in timetables.values():
+            if not isinstance(grid, dict):
+                continue
+            for day, row in grid.items():
+                if day not in self.day_index or not isinstance(row, dict):
+                    continue
+                for slot, cell in row.items():
+                    if not isinstance(cell, dict) or cell.get("type") == "break":
+                        continue
+                    if slot not in slot_bits:
+                        slot_bits[slot] = sum(1 << target for target in self.grid.slot_map([slot])[0])
+                    bit = slot_bits[slot] << (self.day_index[day] * self.slots_per_day)
+                    if not bit:
+                        continue
+                    if cell.get("teacher"):
+                        self.teachers[cell["teacher"]] |= bit
+                    if cell.get("room"):
+                        self.rooms[cell["room"]] |= bit
+
+    def clashes(self, timetables):
+        """Teacher codes and room numbers a grid set books at a time this ledger already holds"""
+        other = ResourceLedger(self.days, self.time_slots)
+        other.add_timetables(timetables)
+        return ([key for key, mask in other.teachers.items() if mask & self.teachers.get(key, 0)] +
+                [key for key, mask in other.rooms.items() if mask & self.rooms.get(key, 0)])
+
+    def add_occupancy(self, occupancy):
+        """OR in a summary produced by occupancy_document()"""
+        days = occupancy.get("days", [])
+        time_slots = occupancy.get("time_slots", [])
+        same_grid = self.matches_grid(days, time_slots)
+        for target, source in ((self.teachers, occupancy.get("teachers", {})),
+                               (self.rooms, occupancy.get("rooms", {}))):
+            for key, day_masks in source.items():
+                if same_grid:
+                    mask = 0
+                    for day_idx, day_mask in enumerate(day_masks):
+                        mask |= day_mask << (day_idx * self.slots_per_day)
+                    target[key] |= mask
+                else:
+                    target[key] |= self._remap(days, time_slots, day_masks)
+
+    def _remap(self, days, time_slots, day_masks):
+        """Translate per-day masks from another grid by day and slot times"""
+        return self.grid.translate_days(day_masks, days, time_slots)
+
+    def occupancy_document(self, timetables):
+        """
+        Compact per-day bitmask summary of the teachers and rooms used by one
+        department's timetables, stored alongside them for fast seeding
+        """
+        ledger = ResourceLedger(self.days, self.time_slots)
+        ledger.add_timetables(timetables)
+        return {
+            "days": self.days,
+            "time_slots": self.time_slots,
+            "teachers": {key: ledger._split(mask) for key, mask in ledger.teachers.items()},
+            "rooms": {key: ledger._split(mask) for key, mask in ledger.rooms.items()}
+        }
+
+    def _split(self, mask):
+        return [(mask >> (day_idx * self.slots_per_day)) & self.day_full_mask
+                for day_idx in range(len(self.days))]
+
+    def seed_from_collection(self, collection, exclude_departments=()):
+        """
+        Load the latest stored timetable of every department into the ledger.
+
+        Documents with an occupancy summary are read with a projection that
+        skips the grids entirely; only older documents without one are scanned.
+        """
+        query = {}
+        excluded = set()
+        for department_id in exclude_departments:
+            excluded.add(department_id)
+            excluded.add(str(department_id))
+            if isinstance(department_id, str) and ObjectId.is_valid(department_id):
+                excluded.add(ObjectId(department_id))
+        if excluded:
+            query["department_id"] = {"$nin": list(excluded)}
+
+        seen_departments = set()
+        documents = collection.find(query, {"department_id": 1, "created_at": 1, "occupancy": 1})
+        for doc in sorted(documents, key=lambda d: str(d.get("created_at", "")), reverse=True):
+            department = str(doc.get("department_id"))
+            if department in seen_departments:
+                continue
+            seen_departments.add(department)
+
+            if doc.get("occupancy"):
+                self.add_occupancy(doc["occupancy"])
+            else:
+                full_doc = collection.find_one({"_id": doc["_id"]}) or {}
+                grids = full_doc.get("raw_data") or full_doc.get("timetables") or {}
+                if isinstance(grids, dict):
+                    self.add_timetables(grids)
+        return self
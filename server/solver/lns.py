@@ -0,0 +1,150 @@
+"""
+Large-neighbourhood search: free a structured chunk of a solution and re-solve it
+"""
+import random
+import time
+
+from .backtracking import BacktrackingSolver
+from .scoring import soft_penalty
+from .symmetry import SymmetryBreaking
+
+# Structured chunks a destroy step may free
+NEIGHBOURHOODS = ("teacher", "year_day", "lab")
+
+
+class LargeNeighbourhoodSearch:
+    """
+    Destroy-and-repair improvement of an assignment on its own model and
+    index.
+
+    Every iteration frees one chunk of placed sessions: all sessions of one
+    teacher, every session of one year on one day, or all practicals held in
+    one lab. The freed sessions, plus one still unscheduled session if there
+    is any, are searched again by a node-bounded BacktrackingSolver with
+    everything else fixed; if that fails only the freed ones are re-placed. The result is kept
+    when it schedules more sessions, or as many at no higher soft penalty
+    (solver.scoring.soft_penalty, as for generation); otherwise the old
+    placements are restored. Nothing is recompiled between iterations.
+
+    The index must already contain the assignment; on return both hold the
+    best state found. ``unscheduled`` lists sessions the construction left
+    out. An optional ProgressHook gets the iteration count and can stop the
+    run; a RunStats gets iteration and acceptance counts.
+    """
+
+    def __init__(self, model, index, assignment, workload, unscheduled=(), rng=None, time_limit=2.0,
+                 max_iterations=None, repair_nodes=500, neighbourhoods=NEIGHBOURHOODS, hook=None, stats=None):
+        self.model = model
+        self.index = index
+        self.assignment = dict(assignment)
+        self.workload = workload
+        self.unscheduled = list(unscheduled)
+        self.rng = rng or random.Random()
+        self.time_limit = time_limit
+        self.max_iterations = max_iterations
+        self.repair_nodes = repair_nodes
+        self.neighbourhoods = tuple(neighbourhoods)
+        self.hook = hook
+        self.stats = stats
+        # Kept placements break session symmetry; rooms stay interchangeable
+        self.symmetry = SymmetryBreaking(model, order_sessions=False)
+
+        self.iterations = 0
+        self.accepted = 0
+        self.penalty = soft_penalty(model, self.assignment)
+        self.initial_penalty = self.penalty
+        self._labs = sorted({room for session in model.sessions if session.kind == "practical"
+                             for room in session.rooms})
+
+    def run(self):
+        """Destroy and repair until the time or iteration budget is spent; returns the assignment"""
+        if not self.assignment or (self.time_limit is None and self.max_iterations is None):
+            return self.assignment
+        deadline = time.monotonic() + self.time_limit if self.time_limit is not None else None
+
+        while self.max_iterations is None or self.iterations < self.max_iterations:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            if self.hook is not None:
+                if self.hook.cancelled:
+                    break
+                self.hook.best_score = self.penalty
+                self.hook.report(iterations=self.iterations, penalty=self.penalty)
+            self.iterations += 1
+            freed = self._destroy_chunk()
+            if freed and self._repair(freed, deadline):
+                self.accepted += 1
+
+        if self.stats is not None:
+            self.stats.count("lns_iterations", self.iterations)
+            self.stats.count("lns_accepted", self.accepted)
+        return self.assignment
+
+    def _destroy_chunk(self):
+        """Session ids of one randomly chosen chunk of the current assignment"""
+        kind = self.rng.choice(self.neighbourhoods)
+        sessions = self.model.sessions
+        if kind == "teacher":
+            teacher = self.rng.choice([value[3] for value in self.assignment.values()])
+            return [session_id for session_id, value in self.assignment.items() if value[3] == teacher]
+        if kind == "year_day":
+            session_id, value = self.rng.choice(list(self.assignment.items()))
+            year, day = sessions[session_id].year, value[0]
+            return [other for other, other_value in self.assignment.items()
+                    if other_value[0] == day and sessions[other].year == year]
+        if not self._labs:
+            return []
+        lab = self.rng.choice(self._labs)
+        return [session_id for session_id, value in self.assignment.items()
+                if value[4] == lab and sessions[session_id].kind == "practical"]
+
+    def _repair(self, freed, deadline=None):
+        """Re-solve a freed chunk; True if the new placements were kept"""
+        old = {session_id: self.assignment.pop(session_id) for session_id in freed}
+        for session_id, value in old.items():
+            self._remove(session_id, value)
+        before = (len(self.unscheduled), self.penalty)
+
+        # Try to fit an unscheduled session in with the chunk, then the chunk alone
+        attempts = [freed]
+        if self.unscheduled:
+            attempts.insert(0, freed + [self.rng.choice(self.unscheduled)])
+        placed = None
+        for session_ids in attempts:
+            time_limit = None if deadline is None else max(0.0, deadline - time.monotonic())
+            solver = BacktrackingSolver(self.model, self.index, session_ids, self.workload, rng=self.rng,
+                                        max_nodes=self.repair_nodes, time_limit=time_limit,
+                                        symmetry=self.symmetry)
+            if solver.solve():
+                placed = solver.assignment
+                break
+
+        if placed is not None:
+            candidate = dict(self.assignment)
+            candidate.update(placed)
+            unscheduled = [session_id for session_id in self.unscheduled if session_id not in placed]
+            penalty = soft_penalty(self.model, candidate)
+            if (len(unscheduled), penalty) <= before:
+                self.assignment = candidate
+                self.unscheduled = unscheduled
+                self.penalty = penalty
+                return True
+            for session_id, value in placed.items():
+                self._remove(session_id, value)
+
+        for session_id, value in old.items():
+            self._place(session_id, value)
+            self.assignment[session_id] = value
+        return False
+
+    def _place(self, session_id, value):
+        session = self.model.sessions[session_id]
+        day, slots, mask, teacher, room = value
+        self.index.place(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+        self.workload[teacher] += session.length
+
+    def _remove(self, session_id, value):
+        session = self.model.sessions[session_id]
+        day, slots, mask, teacher, room = value
+        self.index.remove(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+        self.workload[teacher] -= session.length
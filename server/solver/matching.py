@@ -0,0 +1,94 @@
+"""
+Room assignment as an incrementally maintained bipartite matching
+"""
+
+
+class RoomMatcher:
+    """
+    Keeps the rooms of the sessions a solver placed as a matching between
+    the sessions at each position and their eligible rooms.
+
+    A session can be placed at a position as long as the matching of that
+    position can grow by one: either an eligible room is free, or an
+    augmenting path moves already placed sessions of the same position to
+    other eligible rooms so one becomes free. This is the single-path step
+    of Hopcroft-Karp, run as sessions are added, so a room shortage shows
+    up exactly when no augmenting path exists rather than after an unlucky
+    first-fit choice.
+
+    Only sessions placed through the matcher move; anything else in the
+    index (earlier years, other departments, sessions at overlapping but
+    different positions) is fixed occupancy. Moves are written to both the
+    index and ``assignment``.
+    """
+
+    def __init__(self, model, index, assignment):
+        self.model = model
+        self.index = index
+        self.assignment = assignment
+
+        # {(position mask, room): session index} for the sessions placed here
+        self.holder = {}
+
+    def free_rooms(self, session, mask):
+        return self.index.free_rooms(session.rooms, mask)
+
+    def can_place(self, session, mask):
+        """True if the session can get a room at the position, moving others if needed"""
+        if self.index.free_rooms(session.rooms, mask):
+            return True
+        return self._find_path(session, mask, set()) is not None
+
+    def place(self, session_idx, value):
+        """
+        Record a placement. A value whose room is None or no longer free gets
+        a room through an augmenting path; returns the value with the room
+        actually used, or None if there is no way to give the session a room.
+        """
+        day, slots, mask, teacher, room = value
+        if room is None or self.index.rooms[room] & mask:
+            path = self._find_path(self.model.sessions[session_idx], mask, set())
+            if path is None:
+                return None
+            # Shift every session on the path to its next room, back to front
+            for moved, new_room in reversed(path[1:]):
+                self._move(moved, mask, new_room)
+            room = path[0][1]
+            value = (day, slots, mask, teacher, room)
+        self.holder[(mask, room)] = session_idx
+        return value
+
+    def remove(self, session_idx, value):
+        mask, room = value[2], value[4]
+        if self.holder.get((mask, room)) == session_idx:
+            del self.holder[(mask, room)]
+
+    def _find_path(self, session, mask, visited):
+        """
+        Rooms along an augmenting path as [(session, room), ...]: the first
+        entry is the room for ``session`` and every later entry moves the
+        previous room's holder to a new room. None if no path exists.
+        """
+        room_masks = self.index.rooms
+        for room in session.rooms:
+            if room in visited:
+                continue
+            visited.add(room)
+            if not room_masks[room] & mask:
+                return [(session.id, room)]
+            holder = self.holder.get((mask, room))
+            if holder is None or room_masks[room] & mask != mask:
+                continue
+            # Occupied by a session of this same position: try to move it on
+            rest = self._find_path(self.model.sessions[holder], mask, visited)
+            if rest is not None:
+                return [(session.id, room)] + rest
+        return None
+
+    def _move(self, session_idx, mask, room):
+        day, slots, mask, teacher, old_room = self.assignment[session_idx]
+        self.index.move_room(old_room, room, mask)
+        if self.holder.get((mask, old_room)) == session_idx:
+            del self.holder[(mask, old_room)]
+        self.holder[(mask, room)] = session_idx
+        self.assignment[session_idx] = (day, slots, mask, teacher, room)
@@ -0,0 +1,287 @@
+"""
+Compiled problem model: Mongo documents turned into dense integer records
+"""
+from collections import defaultdict
+
+
+class TeacherRecord:
+    """``unavailable`` and ``preferred`` are cell masks from the teacher's calendar, 0 if unset"""
+    __slots__ = ("id", "code", "name", "doc_id", "max_workload", "unavailable", "preferred")
+
+    def __init__(self, id, code, name, doc_id, max_workload, unavailable=0, preferred=0):
+        self.id = id
+        self.code = code
+        self.name = name
+        self.doc_id = doc_id
+        self.max_workload = max_workload
+        self.unavailable = unavailable
+        self.preferred = preferred
+
+
+class RoomRecord:
+    __slots__ = ("id", "number", "type", "capacity", "doc_id")
+
+    def __init__(self, id, number, type, capacity, doc_id):
+        self.id = id
+        self.number = number
+        self.type = type
+        self.capacity = capacity
+        self.doc_id = doc_id
+
+
+class SubjectRecord:
+    __slots__ = ("id", "code", "name", "year", "kind", "per_week", "length", "teachers", "rooms", "doc_id")
+
+    def __init__(self, id, code, name, year, kind, per_week, length, teachers, rooms, doc_id):
+        self.id = id
+        self.code = code
+        self.name = name
+        self.year = year
+        self.kind = kind
+        self.per_week = per_week
+        self.length = length
+        self.teachers = teachers
+        self.rooms = rooms
+        self.doc_id = doc_id
+
+
+class Session:
+    """
+    One lecture or practical occurrence that still needs a day, consecutive
+    slots, a teacher and a room.
+
+    ``positions`` holds (day, slots, mask) tuples the session may start at,
+    ``groups`` the class/batch groups it occupies and ``check_groups`` the
+    groups that must be free for it (a batch practical cannot overlap a
+    lecture of the whole class). Everything is an integer id of the model.
+    """
+    __slots__ = ("id", "subject", "kind", "year", "batch", "groups", "check_groups",
+                 "positions", "teachers", "rooms", "length", "one_per_day")
+
+    def __init__(self, id, subject, kind, year, groups, check_groups, positions, teachers, rooms,
+                 length=1, one_per_day=False, batch=None):
+        self.id = id
+        self.subject = subject
+        self.kind = kind
+        self.year = year
+        self.batch = batch
+        self.groups = tuple(groups)
+        self.check_groups = tuple(check_groups)
+        self.positions = positions
+        self.teachers = teachers
+        self.rooms = rooms
+        self.length = length
+        self.one_per_day = one_per_day
+
+
+class ProblemModel:
+    """
+    Everything the solvers need, indexed by dense integer ids.
+
+    Teachers, rooms, subjects, class/batch groups and sessions are plain
+    lists whose position is the id. Eligibility (subject -> teachers,
+    session type -> rooms) and the candidate (day, slots, mask) positions
+    are resolved once here, so the search loops never touch a document.
+    Labels are only looked up again in ``materialize``.
+    """
+
+    def __init__(self, days, time_slots):
+        self.days = list(days)
+        self.time_slots = list(time_slots)
+        self.slots_per_day = len(self.time_slots)
+        # Bits of the non-break slots within one day
+        self.teaching_day_mask = (1 << self.slots_per_day) - 1
+
+        self.teachers = []
+        self.rooms = []
+        self.subjects = []
+        self.groups = []          # group labels, e.g. "SE_Main", "SE_B1"
+        self.sessions = []
+
+        # {year: group id of the whole class}, {year: [batch group ids]}
+        self.main_group = {}
+        self.batch_groups = {}
+        # {year: [session ids]}
+        self.year_sessions = defaultdict(list)
+
+    def cell_mask(self, day, slots):
+        """Bitmask covering the given slot indices of one day index"""
+        base = day * self.slots_per_day
+        mask = 0
+        for slot in slots:
+            mask |= 1 << (base + slot)
+        return mask
+
+    def restrict_positions(self, teacher_masks):
+        """
+        Drop the positions of every session at which none of its eligible
+        teachers is free in ``teacher_masks`` (calendars, other departments),
+        so the search never tries them. Sessions that shared a position list
+        and have the same teachers keep sharing the restricted one.
+        """
+        restricted = {}
+        for session in self.sessions:
+            key = (id(session.positions), tuple(session.teachers))
+            if key not in restricted:
+                masks = [teacher_masks[teacher] for teacher in session.teachers]
+                restricted[key] = (session.positions, [
+                    position for position in session.positions
+                    if any(not mask & position[2] for mask in masks)])
+            session.positions = restricted[key][1]
+
+    def preferred_day_mask(self, teacher, day):
+        """Preferred slots of a teacher on one day, or None without preferences"""
+        preferred = self.teachers[teacher].preferred
+        if not preferred:
+            return None
+        return (preferred >> (day * self.slots_per_day)) & ((1 << self.slots_per_day) - 1)
+
+    def materialize(self, assignment, timetables):
+        """Write {session id: (day, slots, mask, teacher, room)} into label-keyed grids"""
+        for session_id, (day, slots, mask, teacher, room) in assignment.items():
+            session = self.sessions[session_id]
+            subject = self.subjects[session.subject]
+            cell = {
+                "subject": subject.code,
+                "subject_name": subject.name,
+                "teacher": self.teachers[teacher].code,
+                "teacher_name": self.teachers[teacher].name,
+                "room": self.rooms[room].number,
+                "type": session.kind
+            }
+            if session.kind == "practical":
+                cell["batch"] = self.groups[session.batch].split("_", 1)[1]
+            grid = timetables[self.groups[session.groups[0]]]
+            for slot in slots:
+                grid[self.days[day]][self.time_slots[slot]] = dict(cell)
+        return timetables
+
+
+def compile_problem(department, year_subjects, teachers, rooms, constraints, grid):
+    """
+    Compile department, subject, teacher and room documents into a
+    ProblemModel with one Session per lecture and per batch practical.
+    A subject may narrow its rooms with ``room_type`` and ``min_capacity``,
+    and without a fixed ``teacher_id`` its teachers with ``specialization``
+    (all teachers when nobody has that specialization); a teacher's
+    ``calendar`` becomes its unavailable and preferred cells.
+    Sessions start at the runs of the TimeGrid ``grid`` matching their
+    length, on its working days.
+    """
+    model = ProblemModel(grid.days, grid.time_slots)
+
+    max_workload = constraints.get("teacher_max_workload", {})
+    teacher_by_doc_id = {}
+    teachers_by_specialization = defaultdict(list)
+    for teacher in teachers:
+        code = teacher.get("code", "TCH")
+        calendar = teacher.get("calendar") or {}
+        unavailable = preferred = 0
+        if calendar:
+            unavailable = grid.translate_days(calendar.get("unavailable", []), calendar["days"],
+                                              calendar["time_slots"])
+            preferred = grid.translate_days(calendar.get("preferred", []), calendar["days"],
+                                            calendar["time_slots"])
+        record = TeacherRecord(len(model.teachers), code, teacher.get("name", code),
+                               teacher.get("_id"), max_workload[code] if code in max_workload else 20,
+                               unavailable=unavailable, preferred=preferred)
+        model.teachers.append(record)
+        teacher_by_doc_id[str(teacher.get("_id"))] = record.id
+        if teacher.get("specialization"):
+            teachers_by_specialization[teacher["specialization"]].append(record.id)
+
+    for room in rooms:
+        model.rooms.append(RoomRecord(len(model.rooms), room.get("number", "RM"), room.get("type", ""),
+                                      room.get("capacity", 0), room.get("_id")))
+
+    room_types = constraints["room_types"]
+    rooms_by_kind = {
+        kind: [room.id for room in model.rooms if room.type in types]
+        for kind, types in room_types.items()
+    }
+    all_teachers = [teacher.id for teacher in model.teachers]
+    # {(kind, room type, minimum capacity): [room ids]}, shared by the subjects asking for it
+    subject_rooms = {}
+
+    def eligible_rooms(kind, subject):
+        room_type = subject.get("room_type")
+        min_capacity = subject.get("min_capacity", 0)
+        if room_type is None and not min_capacity:
+            return rooms_by_kind.get(kind, [])
+        key = (kind, room_type, min_capacity)
+        if key not in subject_rooms:
+            subject_rooms[key] = [room for room in rooms_by_kind.get(kind, [])
+                                  if (room_type is None or model.rooms[room].type == room_type)
+                                  and (model.rooms[room].capacity or 0) >= min_capacity]
+        return subject_rooms[key]
+
+    # Candidate positions on the working days, one shared list per session length
+    model.teaching_day_mask = grid.teaching_day_mask
+    position_lists = {}
+
+    def positions(length):
+        if length not in position_lists:
+            position_lists[length] = [(day, run, model.cell_mask(day, run))
+                                      for day in grid.working_days for run in grid.runs_of(length)]
+        return position_lists[length]
+
+    priority = constraints.get("department_subject_priority", {})
+    for year, subjects in year_subjects.items():
+        main = len(model.groups)
+        model.groups.append(f"{year}_Main")
+        model.main_group[year] = main
+        num_batches = constraints.get(f"{year}_batch_count", 3)
+        batches = []
+        for batch_num in range(1, num_batches + 1):
+            batches.append(len(model.groups))
+            model.groups.append(f"{year}_B{batch_num}")
+        model.batch_groups[year] = batches
+        class_groups = [main] + batches
+
+        year_records = []
+        for subject in subjects:
+            kind = subject.get("type")
+            if kind not in ("lecture", "practical"):
+                continue
+            if kind == "lecture":
+                per_week = subject.get("lectures_per_week", constraints.get("max_lectures_per_subject", 3))
+                length = 1
+            else:
+                per_week = subject.get("practicals_per_week", constraints.get("max_practicals_per_subject", 1))
+                length = subject.get("consecutive_slots", constraints.get("practical_duration", 2))
+
+            if subject.get("teacher_id") is None:
+                eligible = teachers_by_specialization.get(subject.get("specialization")) or all_teachers
+            else:
+                teacher_id = teacher_by_doc_id.get(str(subject["teacher_id"]))
+                eligible = [teacher_id] if teacher_id is not None else []
+
+            record = SubjectRecord(len(model.subjects), subject.get("code", "SUBJ"), subject.get("name", ""),
+                                   year, kind, per_week, length, eligible, eligible_rooms(kind, subject),
+                                   subject.get("_id"))
+            model.subjects.append(record)
+            year_records.append((priority.get(str(subject.get("_id")), 5), record))
+
+        # Lectures by department priority first, then practicals batch by batch
+        lectures = [record for _, record in sorted(
+            (item for item in year_records if item[1].kind == "lecture"),
+            key=lambda item: item[0], reverse=True)]
+        practicals = [record for _, record in year_records if record.kind == "practical"]
+
+        for record in lectures:
+            for _ in range(record.per_week):
+                session = Session(len(model.sessions), record.id, "lecture", year, (main,), class_groups,
+                                  positions(1), record.teachers, record.rooms,
+                                  length=1, one_per_day=True)
+                model.sessions.append(session)
+                model.year_sessions[year].append(session.id)
+        for record in practicals:
+            for batch in batches:
+                for _ in range(record.per_week):
+                    session = Session(len(model.sessions), record.id, "practical", year, (batch,),
+                                      (main, batch), positions(record.length), record.teachers, record.rooms,
+                                      length=record.length, batch=batch)
+                    model.sessions.append(session)
+                    model.year_sessions[year].append(session.id)
+
+    return model
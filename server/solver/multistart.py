@@ -0,0 +1,220 @@
+"""
+Independent solver runs and best-of-N selection across worker processes
+"""
+import multiprocessing
+import os
+import queue
+import random
+import time
+
+from .occupancy import OccupancyIndex
+from .scoring import soft_penalty
+from .stats import RunStats, phase
+from .strategies import make_strategy
+from .tensor_scoring import score_assignments
+
+
+def solve_model(model, solver_mode, seed, teacher_masks, room_masks,
+                max_nodes=200000, time_limit=None, hook=None, stats=None, options=None):
+    """
+    Solve every year of a model once with the given seed, using the
+    registered Strategy named ``solver_mode`` (see solver.strategies).
+
+    ``teacher_masks`` and ``room_masks`` are the occupancy already taken by
+    other departments; ``options`` configure the strategy. ``time_limit``
+    is a wall-clock budget for the whole solve, shared out over the years
+    still to do, and ``max_nodes`` bounds each search. Returns a result
+    dict with the assignment, the sessions left unscheduled, the soft
+    penalty, the years proven unsolvable and ``cut_off``, set when a budget
+    ran out and the result is the best partial one found. A ProgressHook,
+    if given, is passed on to the solvers; once it is cancelled the
+    remaining years are skipped. A RunStats, if given, gets a phase per year
+    and the solvers' counters.
+    """
+    rng = random.Random(seed)
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    index = OccupancyIndex.for_model(model)
+    index.teachers[:] = teacher_masks
+    index.rooms[:] = room_masks
+    index.track_room_cells(len(model.days) * model.slots_per_day)
+    workload = [0] * len(model.teachers)
+    strategy = make_strategy(solver_mode, model, **(options or {}))
+
+    assignment = {}
+    unscheduled = []
+    failed_years = []
+    years = list(model.year_sessions.items())
+    for position, (year, session_ids) in enumerate(years):
+        remaining = None
+        if deadline is not None:
+            remaining = max(0.0, deadline - time.monotonic()) / (len(years) - position)
+        if hook is not None:
+            if hook.cancelled:
+                unscheduled.extend(session_ids)
+                continue
+            hook.begin(f"solve {year}", placed=len(assignment))
+        with phase(stats, f"solve {year}"):
+            year_assignment, year_unscheduled, failure = strategy.solve_year(
+                index, session_ids, workload, rng, max_nodes=max_nodes, time_limit=remaining,
+                hook=hook, stats=stats)
+        if failure is not None:
+            failed_years.append(dict(failure, year=year))
+        unscheduled.extend(year_unscheduled)
+        assignment.update(year_assignment)
+
+    if not failed_years and not (hook is not None and hook.cancelled):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        assignment, unscheduled = strategy.finish(index, assignment, unscheduled, workload, rng,
+                                                  time_limit=remaining, hook=hook, stats=stats)
+
+    penalty = soft_penalty(model, assignment)
+    if hook is not None:
+        hook.best_score = penalty
+        hook.begin("solved", placed=len(assignment))
+    return {
+        "seed": seed,
+        "assignment": assignment,
+        "unscheduled": unscheduled,
+        "failed_years": failed_years,
+        "penalty": penalty,
+        "cut_off": strategy.cut_off
+    }
+
+
+def result_score(result):
+    """Lower is better: unscheduled sessions first, then soft penalty"""
+    return (len(result["unscheduled"]), result["penalty"])
+
+
+def best_result(model, results):
+    """
+    The best (see result_score) of several results of one model, or None.
+    Their soft penalties are recomputed together in one vectorized batch
+    (solver.tensor_scoring.score_assignments).
+    """
+    scores = score_assignments(model, [result["assignment"] for result in results])
+    for result, score in zip(results, scores):
+        result["penalty"] = score["penalty"]
+    return min(results, key=result_score, default=None)
+
+
+# Seconds between cancellation checks while waiting on worker processes
+HOOK_POLL_INTERVAL = 0.5
+
+# Seconds past the time limit to wait for the best-so-far results of runs
+# that stopped at it themselves
+RESULT_GRACE = 0.5
+
+
+def _solve_seeds(results, seeds, model, solver_mode, teacher_masks, room_masks, max_nodes, time_limit,
+                 collect_stats, options=None):
+    """Worker process: solve its seeds one after another within time_limit, sending every result"""
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    for run_seed in seeds:
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        stats = RunStats() if collect_stats else None
+        result = solve_model(model, solver_mode, run_seed, teacher_masks, room_masks, max_nodes, remaining,
+                             stats=stats, options=options)
+        if stats is not None:
+            result["stats"] = stats.as_dict()
+        results.put(result)
+
+
+def multi_start(model, solver_mode, teacher_masks, room_masks, restarts, time_limit=None,
+                max_nodes=200000, workers=None, seed=None, hook=None, stats=None, options=None):
+    """
+    Run ``restarts`` independently seeded solves and return the best result.
+
+    Runs are spread over ``workers`` worker processes, each solving its
+    share of the seeds in turn. Every run stops at ``time_limit`` with its
+    best result so far; collection stops as soon as a complete,
+    zero-penalty result arrives or RESULT_GRACE seconds after the limit,
+    and the workers are then terminated, so no run outlives the call. The
+    finished runs are ranked in one batch (see best_result); None means no
+    run finished by then. A ProgressHook gets an
+    event per finished run and cancelling it stops collection like the time
+    limit does. A RunStats gets the counters and phase times of every
+    finished run summed (phase times of parallel runs add up to more than
+    the wall time) and a "restarts" count of them. ``options`` configure
+    the strategy of every run, as in solve_model.
+    """
+    base_seed = seed if seed is not None else random.randrange(1 << 30)
+    seeds = [base_seed + k for k in range(restarts)]
+    workers = min(workers or os.cpu_count() or 1, restarts)
+
+    if workers <= 1:
+        return _run_sequential(model, solver_mode, seeds, teacher_masks, room_masks, time_limit, max_nodes, hook,
+                               stats, options)
+
+    deadline = time.monotonic() + time_limit + RESULT_GRACE if time_limit is not None else None
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    processes = [
+        context.Process(target=_solve_seeds, daemon=True,
+                        args=(results, seeds[worker::workers], model, solver_mode, teacher_masks, room_masks,
+                              max_nodes, time_limit, stats is not None, options))
+        for worker in range(workers)
+    ]
+    candidates = []
+    if hook is not None:
+        hook.begin("multi-start")
+    try:
+        for process in processes:
+            process.start()
+        while len(candidates) < len(seeds):
+            # Wake up regularly to notice the deadline, a cancellation or crashed workers
+            timeout = HOOK_POLL_INTERVAL
+            if deadline is not None:
+                timeout = min(timeout, max(0, deadline - time.monotonic()))
+            try:
+                result = results.get(timeout=timeout)
+            except queue.Empty:
+                if ((hook is not None and hook.cancelled)
+                        or (deadline is not None and time.monotonic() >= deadline)
+                        or not any(process.is_alive() for process in processes)):
+                    break
+                continue
+
+            candidates.append(result)
+            if stats is not None:
+                stats.merge(result.pop("stats"))
+                stats.count("restarts")
+            if hook is not None:
+                _report_best(hook, model, candidates)
+            if result_score(result) == (0, 0) or (hook is not None and hook.cancelled):
+                break
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        results.close()
+    return best_result(model, candidates)
+
+
+def _run_sequential(model, solver_mode, seeds, teacher_masks, room_masks, time_limit, max_nodes, hook=None,
+                    stats=None, options=None):
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    candidates = []
+    for run_seed in seeds:
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        result = solve_model(model, solver_mode, run_seed, teacher_masks, room_masks, max_nodes, remaining, hook,
+                             stats, options=options)
+        if hook is not None and hook.cancelled:
+            break
+        if stats is not None:
+            stats.count("restarts")
+        candidates.append(result)
+        if hook is not None:
+            _report_best(hook, model, candidates)
+        if result_score(result) == (0, 0) or (deadline is not None and time.monotonic() >= deadline):
+            break
+    return best_result(model, candidates)
+
+
+def _report_best(hook, model, candidates):
+    best = min(candidates, key=result_score)
+    hook.best_score = best["penalty"]
+    hook.placed = len(model.sessions) - len(best["unscheduled"])
+    hook.report(force=True, runs=len(candidates))
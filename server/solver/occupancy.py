@@ -0,0 +1,142 @@
+"""
+Bitset occupancy index for timetable generation
+"""
+from collections import defaultdict
+
+
+class OccupancyIndex:
+    """
+    Tracks which (day, slot) cells are taken by every teacher, room and
+    class group of a ProblemModel as integer bitmasks.
+
+    Cell (day, slot) maps to bit ``day * slots_per_day + slot``, so asking
+    whether a resource is free for a set of cells is one AND against the
+    mask of those cells. Teachers, rooms and groups are addressed by their
+    dense model ids.
+
+    After ``track_room_cells`` the index also keeps, per cell, a bitmask of
+    the rooms busy in it, updated by place/remove/move_room, so the free
+    rooms of a position are the eligible-room bits minus an OR of one or two
+    integers instead of a scan of every eligible room's mask.
+    """
+
+    def __init__(self, num_days, num_teachers, num_rooms, num_groups):
+        self.num_days = num_days
+
+        # [bitmask of occupied cells] indexed by model id
+        self.teachers = [0] * num_teachers
+        self.rooms = [0] * num_rooms
+        self.groups = [0] * num_groups
+
+        # {(group, subject): bitmask of days}, {(group, subject): [count per day]}
+        self.subject_days = defaultdict(int)
+        self.subject_counts = defaultdict(lambda: [0] * num_days)
+
+        # [bitmask of busy room ids] per cell once tracked, {mask: cell indices}
+        self.room_cells = None
+        self._cells = {}
+        # Bumped on every room change made through the index, for callers caching free rooms
+        self.room_version = 0
+
+    @classmethod
+    def for_model(cls, model):
+        return cls(len(model.days), len(model.teachers), len(model.rooms), len(model.groups))
+
+    def teacher_free(self, teacher, mask):
+        return not self.teachers[teacher] & mask
+
+    def room_free(self, room, mask):
+        return not self.rooms[room] & mask
+
+    def groups_free(self, groups, mask):
+        for group in groups:
+            if self.groups[group] & mask:
+                return False
+        return True
+
+    def track_room_cells(self, num_cells):
+        """Index the current room occupancy by cell; later changes must go through this index"""
+        room_cells = [0] * num_cells
+        for room, mask in enumerate(self.rooms):
+            for cell in self.cells(mask):
+                room_cells[cell] |= 1 << room
+        self.room_cells = room_cells
+
+    def cells(self, mask):
+        """Cell indices set in a mask, cached per mask"""
+        cells = self._cells.get(mask)
+        if cells is None:
+            cells = []
+            rest = mask
+            while rest:
+                low = rest & -rest
+                cells.append(low.bit_length() - 1)
+                rest ^= low
+            cells = self._cells[mask] = tuple(cells)
+        return cells
+
+    def busy_rooms(self, mask):
+        """Bitmask of the room ids busy in any cell of mask (needs track_room_cells)"""
+        room_cells = self.room_cells
+        busy = 0
+        for cell in self.cells(mask):
+            busy |= room_cells[cell]
+        return busy
+
+    def free_rooms(self, rooms, mask):
+        """The rooms of a list that are free in every cell of mask, in list order"""
+        if self.room_cells is None:
+            room_masks = self.rooms
+            return [room for room in rooms if not room_masks[room] & mask]
+        busy = self.busy_rooms(mask)
+        if not busy:
+            return list(rooms)
+        return [room for room in rooms if not busy >> room & 1]
+
+    def move_room(self, old_room, room, mask):
+        """Move the cells in mask from one room to another"""
+        self.rooms[old_room] &= ~mask
+        self.rooms[room] |= mask
+        self.room_version += 1
+        if self.room_cells is not None:
+            change = (1 << old_room) | (1 << room)
+            for cell in self.cells(mask):
+                self.room_cells[cell] ^= change
+
+    def subject_on_day(self, group, subject, day):
+        """True if the subject already has a session for the group on this day"""
+        return bool(self.subject_days[(group, subject)] & (1 << day))
+
+    def place(self, mask, day, teacher=None, room=None, groups=(), subject=None):
+        """Mark the cells in mask as taken by the given resources"""
+        if teacher is not None:
+            self.teachers[teacher] |= mask
+        if room is not None:
+            self.rooms[room] |= mask
+            self.room_version += 1
+            if self.room_cells is not None:
+                for cell in self.cells(mask):
+                    self.room_cells[cell] |= 1 << room
+        for group in groups:
+            self.groups[group] |= mask
+            if subject is not None:
+                self.subject_counts[(group, subject)][day] += 1
+                self.subject_days[(group, subject)] |= 1 << day
+
+    def remove(self, mask, day, teacher=None, room=None, groups=(), subject=None):
+        """Undo a previous place() with the same arguments"""
+        if teacher is not None:
+            self.teachers[teacher] &= ~mask
+        if room is not None:
+            self.rooms[room] &= ~mask
+            self.room_version += 1
+            if self.room_cells is not None:
+                for cell in self.cells(mask):
+                    self.room_cells[cell] &= ~(1 << room)
+        for group in groups:
+            self.groups[group] &= ~mask
+            if subject is not None:
+                counts = self.subject_counts[(group, subject)]
+                counts[day] -= 1
+                if counts[day] == 0:
+                    self.subject_days[(group, subject)] &= ~(1 << day)
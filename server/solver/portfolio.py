@@ -0,0 +1,152 @@
+"""
+Portfolio solving: differently configured strategies raced on one model
+"""
+import multiprocessing
+import os
+import queue
+import random
+import time
+
+from .multistart import HOOK_POLL_INTERVAL, RESULT_GRACE, best_result, result_score, solve_model
+from .stats import RunStats
+
+# Entries race in parallel; with a single worker they run in this order,
+# so the cheap ones come first
+DEFAULT_PORTFOLIO = (
+    {"name": "greedy", "strategy": "greedy"},
+    {"name": "local_search", "strategy": "local_search", "options": {"improve_time": 0.5}},
+    {"name": "backtracking", "strategy": "backtracking"},
+)
+
+
+def entry_label(entry):
+    return entry.get("name") or entry["strategy"]
+
+
+def _run_entry(results, position, entry, model, seed, teacher_masks, room_masks, max_nodes, time_limit,
+               collect_stats):
+    stats = RunStats() if collect_stats else None
+    result = solve_model(model, entry["strategy"], seed, teacher_masks, room_masks, max_nodes, time_limit,
+                         stats=stats, options=entry.get("options"))
+    if stats is not None:
+        result["stats"] = stats.as_dict()
+    results.put((position, result))
+
+
+def solve_portfolio(model, teacher_masks, room_masks, portfolio=DEFAULT_PORTFOLIO, time_limit=None,
+                    max_nodes=200000, workers=None, seed=None, hook=None, stats=None):
+    """
+    Race the entries of a portfolio on one model and return the first
+    complete result, or the best one (see result_score) once every entry
+    finished or stopped at ``time_limit`` seconds with its best result so
+    far.
+
+    An entry is a dict with the ``strategy`` to run, optional strategy
+    ``options`` and a ``name`` for the statistics. Entries run in worker
+    processes, at most ``workers`` at a time; the rest are terminated as
+    soon as a winner is known. With one worker they run in portfolio order
+    in this process instead. Without a complete result the finished entries
+    are ranked in one batch (see multistart.best_result). The result carries
+    the winning entry's name under "strategy"; None means no entry finished
+    in time.
+
+    A RunStats gets the finished entries' counters and phase times, a
+    "runs.<name>" count per finished entry and "wins.<name>" for the
+    winner, so the metrics show which entries win in practice. A
+    ProgressHook gets an event per finished entry and cancelling it stops
+    the race.
+    """
+    entries = list(portfolio)
+    base_seed = seed if seed is not None else random.randrange(1 << 30)
+    workers = min(workers or os.cpu_count() or 1, len(entries))
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+
+    if workers <= 1:
+        best = _race_sequential(model, teacher_masks, room_masks, entries, base_seed, deadline, max_nodes,
+                                hook, stats)
+    else:
+        best = _race_parallel(model, teacher_masks, room_masks, entries, base_seed, deadline, max_nodes,
+                              workers, hook, stats)
+    if best is not None and stats is not None:
+        stats.count(f"wins.{best['strategy']}")
+    return best
+
+
+def _finished(entry, result, candidates, model, hook, stats):
+    """Record a finished entry among the candidates"""
+    label = entry_label(entry)
+    result["strategy"] = label
+    candidates.append(result)
+    if stats is not None:
+        if "stats" in result:
+            stats.merge(result.pop("stats"))
+        stats.count(f"runs.{label}")
+    if hook is not None:
+        best = min(candidates, key=result_score)
+        hook.best_score = best["penalty"]
+        hook.placed = len(model.sessions) - len(best["unscheduled"])
+        hook.report(force=True, runs=len(candidates), strategy=label)
+
+
+def _race_sequential(model, teacher_masks, room_masks, entries, base_seed, deadline, max_nodes, hook, stats):
+    candidates = []
+    for position, entry in enumerate(entries):
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        result = solve_model(model, entry["strategy"], base_seed + position, teacher_masks, room_masks,
+                             max_nodes, remaining, hook, stats, options=entry.get("options"))
+        if hook is not None and hook.cancelled:
+            break
+        _finished(entry, result, candidates, model, hook, stats)
+        if not result["unscheduled"] or (deadline is not None and time.monotonic() >= deadline):
+            break
+    return best_result(model, candidates)
+
+
+def _race_parallel(model, teacher_masks, room_masks, entries, base_seed, deadline, max_nodes, workers, hook,
+                   stats):
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    waiting = list(enumerate(entries))
+    running = {}
+    candidates = []
+    if hook is not None:
+        hook.begin("portfolio")
+    try:
+        while waiting or running:
+            while waiting and len(running) < workers:
+                position, entry = waiting.pop(0)
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                process = context.Process(
+                    target=_run_entry, daemon=True,
+                    args=(results, position, entry, model, base_seed + position, teacher_masks, room_masks,
+                          max_nodes, remaining, stats is not None))
+                process.start()
+                running[position] = process
+
+            # Wake up regularly to notice the deadline, a cancellation or a crashed worker;
+            # entries stop at the deadline themselves, so their results get a grace period
+            timeout = HOOK_POLL_INTERVAL
+            if deadline is not None:
+                timeout = min(timeout, max(0, deadline + RESULT_GRACE - time.monotonic()))
+            try:
+                position, result = results.get(timeout=timeout)
+            except queue.Empty:
+                if ((hook is not None and hook.cancelled)
+                        or (deadline is not None and time.monotonic() >= deadline + RESULT_GRACE)):
+                    break
+                for position, process in list(running.items()):
+                    if not process.is_alive() and process.exitcode != 0:
+                        del running[position]
+                continue
+
+            running.pop(position).join()
+            _finished(entries[position], result, candidates, model, hook, stats)
+            if not result["unscheduled"] or (hook is not None and hook.cancelled):
+                break
+    finally:
+        for process in running.values():
+            process.terminate()
+        for process in running.values():
+            process.join()
+        results.close()
+    return best_result(model, candidates)
@@ -0,0 +1,65 @@
+"""
+Progress reporting and cooperative cancellation for long solves
+"""
+import time
+
+
+class GenerationCancelled(Exception):
+    """Raised when a solve stops because its hook was cancelled"""
+
+
+class ProgressHook:
+    """
+    Passed to the solvers to receive progress events and request a stop.
+
+    Solvers only touch the hook every few hundred nodes or iterations and
+    ``report`` drops events arriving within ``interval`` seconds of the last
+    one, so a hook costs next to nothing; without one (the default) the
+    solvers do a single None check.
+
+    Events are dicts with the current stage, sessions placed and remaining,
+    the best soft penalty seen so far, elapsed seconds and whatever counters
+    the reporting solver adds (nodes, backtracks, iterations, runs).
+    """
+
+    def __init__(self, callback=None, interval=0.5):
+        self.callback = callback
+        self.interval = interval
+        self.cancelled = False
+
+        self.stage = None
+        self.total = 0
+        self.placed = 0          # sessions placed by finished stages
+        self.best_score = None
+        self._start = time.monotonic()
+        self._last = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def begin(self, stage, placed=None):
+        """Start a new stage, optionally resetting the finished-session count"""
+        self.stage = stage
+        if placed is not None:
+            self.placed = placed
+        self.report(force=True)
+
+    def report(self, placed=0, force=False, **counters):
+        """Emit an event; ``placed`` counts sessions placed within the current stage"""
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if not force and self._last is not None and now - self._last < self.interval:
+            return
+        self._last = now
+
+        done = self.placed + placed
+        event = {
+            "stage": self.stage,
+            "placed": done,
+            "remaining": max(0, self.total - done),
+            "best_score": self.best_score,
+            "elapsed": round(now - self._start, 2)
+        }
+        event.update(counters)
+        self.callback(event)
@@ -0,0 +1,209 @@
+"""
+Incremental repair of a stored timetable after a change
+"""
+import random
+import time
+from collections import defaultdict
+
+from .backtracking import BacktrackingSolver
+from .greedy import GreedySolver
+from .symmetry import SymmetryBreaking
+
+
+def recover_assignment(model, timetables):
+    """
+    Map label-keyed grids (as written by ``ProblemModel.materialize``) back
+    onto the sessions of a model.
+
+    Returns {session id: (day, slots, mask, teacher, room)} for every stored
+    cell run that still matches a session of the same group and subject, an
+    eligible teacher and room and one of the session's positions. Cells that
+    match nothing (a removed subject, an unknown teacher, a slot that is no
+    longer a valid position) are dropped.
+    """
+    day_ids = {day: i for i, day in enumerate(model.days)}
+    slot_ids = {slot: i for i, slot in enumerate(model.time_slots)}
+    group_ids = {label: i for i, label in enumerate(model.groups)}
+    teacher_ids = {}
+    for teacher in model.teachers:
+        teacher_ids.setdefault(teacher.code, teacher.id)
+    room_ids = {}
+    for room in model.rooms:
+        room_ids.setdefault(room.number, room.id)
+    subject_ids = {}
+    for subject in model.subjects:
+        subject_ids.setdefault((subject.year, subject.kind, subject.code), subject.id)
+    group_year = {}
+    for year, main in model.main_group.items():
+        group_year[main] = year
+        for batch in model.batch_groups[year]:
+            group_year[batch] = year
+
+    # Sessions of every (group, subject) still waiting for a stored placement
+    open_sessions = defaultdict(list)
+    for session in model.sessions:
+        open_sessions[(session.groups[0], session.subject)].append(session.id)
+    position_masks = {}
+
+    assignment = {}
+    for label, grid in timetables.items():
+        group = group_ids.get(label)
+        if group is None:
+            continue
+        year = group_year[group]
+        for day_label, row in grid.items():
+            day = day_ids.get(day_label)
+            if day is None:
+                continue
+
+            # Runs of identical consecutive practical cells form one placement; rows
+            # that went through JSON may have their slots in label order
+            cells = sorted((slot_ids[slot_label], cell) for slot_label, cell in row.items()
+                           if slot_label in slot_ids and isinstance(cell, dict))
+            runs = []
+            for slot, cell in cells:
+                if not cell or cell.get("type") not in ("lecture", "practical"):
+                    continue
+                key = (cell.get("type"), cell.get("subject"), cell.get("teacher"), cell.get("room"))
+                if key[0] == "practical" and runs and runs[-1][0] == key and runs[-1][1][-1] == slot - 1:
+                    runs[-1][1].append(slot)
+                else:
+                    runs.append((key, [slot]))
+
+            for (kind, subject_code, teacher_code, room_number), slots in runs:
+                subject = subject_ids.get((year, kind, subject_code))
+                teacher = teacher_ids.get(teacher_code)
+                room = room_ids.get(room_number)
+                candidates = open_sessions.get((group, subject))
+                if teacher is None or room is None or not candidates:
+                    continue
+                length = model.sessions[candidates[0]].length
+                for start in range(0, len(slots) - length + 1, length):
+                    chunk = tuple(slots[start:start + length])
+                    # Sessions of one subject may have been given different teachers
+                    for candidate, session_id in enumerate(candidates):
+                        session = model.sessions[session_id]
+                        if teacher not in session.teachers or room not in session.rooms:
+                            continue
+                        key = id(session.positions)
+                        if key not in position_masks:
+                            position_masks[key] = {(position[0], position[1]): position[2]
+                                                   for position in session.positions}
+                        mask = position_masks[key].get((day, chunk))
+                        if mask is not None:
+                            assignment[candidates.pop(candidate)] = (day, chunk, mask, teacher, room)
+                            break
+    return assignment
+
+
+def repair_assignment(model, index, previous, workload, rng=None, max_nodes=200000, time_limit=None):
+    """
+    Re-solve the sessions of ``previous`` that no longer fit, keeping the
+    rest of it in place.
+
+    ``index`` must hold everything outside the model (other departments,
+    blocked cells) and nothing of ``previous``. Previous placements that are
+    still valid are kept; the freed sessions of each year are searched with
+    their old value tried first. When that fails the whole year is
+    re-solved, and when even that fails the freed sessions are placed
+    first-fit and whatever does not fit is reported as unscheduled.
+
+    ``time_limit`` bounds the whole repair: every search gets what is left
+    of it, and once it is spent the remaining freed sessions stay
+    unscheduled.
+
+    Returns a dict with the new assignment, the unscheduled session ids, the
+    number of cells whose day or slot changed, the sessions kept in their
+    slot but given another teacher or room, the years that had to be
+    re-solved in full, and "cut_off", set when a search was stopped by the
+    time or node limit.
+    """
+    rng = rng or random.Random()
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    remaining = lambda: None if deadline is None else max(0.0, deadline - time.monotonic())
+    sessions = model.sessions
+    # Kept placements break session and batch symmetry; rooms stay interchangeable
+    symmetry = SymmetryBreaking(model, order_sessions=False)
+    capacity = [teacher.max_workload for teacher in model.teachers]
+
+    assignment = {}
+    for session_id in sorted(previous):
+        session = sessions[session_id]
+        day, slots, mask, teacher, room = previous[session_id]
+        if (session.one_per_day and any(index.subject_on_day(group, session.subject, day)
+                                        for group in session.groups)
+                or not index.groups_free(session.check_groups, mask)
+                or not index.teacher_free(teacher, mask) or not index.room_free(room, mask)
+                or workload[teacher] + session.length > capacity[teacher]):
+            continue
+        _place(model, index, workload, session_id, previous[session_id])
+        assignment[session_id] = previous[session_id]
+
+    unscheduled = []
+    widened = []
+    cut_off = False
+    for year, session_ids in model.year_sessions.items():
+        freed = [session_id for session_id in session_ids if session_id not in assignment]
+        if not freed:
+            continue
+        solver = BacktrackingSolver(model, index, freed, workload, rng=rng, max_nodes=max_nodes,
+                                    time_limit=remaining(), preferred=previous, symmetry=symmetry)
+        solved = solver.solve()
+        cut_off = cut_off or solver.timed_out
+        if solved:
+            assignment.update(solver.assignment)
+            continue
+
+        # Release the rest of the year and search it as a whole
+        kept = {session_id: assignment.pop(session_id) for session_id in session_ids if session_id in assignment}
+        for session_id, value in kept.items():
+            _remove(model, index, workload, session_id, value)
+        solver = BacktrackingSolver(model, index, session_ids, workload, rng=rng, max_nodes=max_nodes,
+                                    time_limit=remaining(), preferred=previous, symmetry=symmetry)
+        solved = solver.solve()
+        cut_off = cut_off or solver.timed_out
+        if solved:
+            assignment.update(solver.assignment)
+            widened.append(year)
+            continue
+
+        for session_id, value in kept.items():
+            _place(model, index, workload, session_id, value)
+        assignment.update(kept)
+        solver = GreedySolver(model, index, freed, workload, rng=rng, time_limit=remaining())
+        solver.solve()
+        cut_off = cut_off or solver.timed_out
+        assignment.update(solver.assignment)
+        unscheduled.extend(solver.unscheduled)
+
+    moved_cells = 0
+    reassigned = 0
+    for session_id, value in assignment.items():
+        old = previous.get(session_id)
+        if old is None or old[2] != value[2]:
+            moved_cells += len(value[1])
+        elif old[3:] != value[3:]:
+            reassigned += 1
+
+    return {
+        "assignment": assignment,
+        "unscheduled": unscheduled,
+        "moved_cells": moved_cells,
+        "reassigned": reassigned,
+        "widened_years": widened,
+        "cut_off": cut_off
+    }
+
+
+def _place(model, index, workload, session_id, value):
+    session = model.sessions[session_id]
+    day, slots, mask, teacher, room = value
+    index.place(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+    workload[teacher] += session.length
+
+
+def _remove(model, index, workload, session_id, value):
+    session = model.sessions[session_id]
+    day, slots, mask, teacher, room = value
+    index.remove(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+    workload[teacher] -= session.length
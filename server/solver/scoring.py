@@ -0,0 +1,79 @@
+"""
+Soft-constraint scoring of solved timetables
+"""
+
+# Weight of each soft penalty in the total
+GAP_WEIGHT = 1
+OVERLOAD_WEIGHT = 1
+BUNCHING_WEIGHT = 1
+PREFERENCE_WEIGHT = 1
+
+
+def penalty_breakdown(model, assignment):
+    """
+    Soft penalties of an assignment {session id: (day, slots, mask, teacher, room)}:
+
+    - ``gaps``: idle teaching slots between a teacher's first and last
+      session of a day
+    - ``overload``: sessions a group has on a day above its even share,
+      ceil(weekly sessions / days)
+    - ``bunching``: pairs of sessions of one subject for one group on the
+      same or on adjacent days
+    - ``preference``: cells taught outside the preferred slots of teachers
+      whose calendar has any
+    """
+    num_days = len(model.days)
+    teacher_days = {}
+    group_loads = {}
+    subject_days = {}
+    for session_id, (day, slots, mask, teacher, room) in assignment.items():
+        session = model.sessions[session_id]
+        day_masks = teacher_days.setdefault(teacher, [0] * num_days)
+        day_masks[day] |= mask >> (day * model.slots_per_day)
+        for group in session.groups:
+            group_loads.setdefault(group, [0] * num_days)[day] += 1
+            subject_days.setdefault((group, session.subject), [0] * num_days)[day] += 1
+
+    gaps = sum(day_gaps(day_mask, model.teaching_day_mask)
+               for day_masks in teacher_days.values() for day_mask in day_masks)
+    overload = sum(group_overload(loads) for loads in group_loads.values())
+    bunching = sum(subject_bunching(counts) for counts in subject_days.values())
+    preference = sum(outside_preference(day_mask, model.preferred_day_mask(teacher, day))
+                     for teacher, day_masks in teacher_days.items() for day, day_mask in enumerate(day_masks))
+    return {"gaps": gaps, "overload": overload, "bunching": bunching, "preference": preference}
+
+
+def soft_penalty(model, assignment):
+    breakdown = penalty_breakdown(model, assignment)
+    return (GAP_WEIGHT * breakdown["gaps"]
+            + OVERLOAD_WEIGHT * breakdown["overload"]
+            + BUNCHING_WEIGHT * breakdown["bunching"]
+            + PREFERENCE_WEIGHT * breakdown["preference"])
+
+
+def day_gaps(day_mask, teaching_mask):
+    """Idle teaching slots between the first and last busy slot of one day"""
+    if not day_mask:
+        return 0
+    low = day_mask & -day_mask
+    span = (1 << day_mask.bit_length()) - low
+    return bin(span & teaching_mask & ~day_mask).count("1")
+
+
+def group_overload(loads):
+    total = sum(loads)
+    share = -(-total // len(loads))
+    return sum(load - share for load in loads if load > share)
+
+
+def subject_bunching(counts):
+    same_day = sum(count * (count - 1) // 2 for count in counts)
+    adjacent = sum(counts[day] * counts[day + 1] for day in range(len(counts) - 1))
+    return same_day + adjacent
+
+
+def outside_preference(day_mask, preferred_mask):
+    """Busy slots of one day outside the preferred ones; 0 without preferences"""
+    if preferred_mask is None:
+        return 0
+    return bin(day_mask & ~preferred_mask).count("1")
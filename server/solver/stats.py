@@ -0,0 +1,71 @@
+"""
+Structured run statistics: phase timings and solver counters
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+# Conflict kinds the solvers count when they reject a candidate placement
+CONFLICT_KINDS = ("teacher", "room", "batch", "workload")
+
+_NO_PHASE = nullcontext()
+
+
+class RunStats:
+    """
+    Collected during one generation when passed to the generator or the
+    solvers; nothing is collected without one (the default), which costs
+    a None check on the paths that would count.
+
+    ``phases`` maps a phase name to seconds spent in it. Phases nest: the
+    per-year ("solve SE") and per-kind ("lectures", "practicals") timings
+    of a solve are part of its "solve" phase. ``counters`` holds attempted
+    and made placements, search nodes, backtracks, restarts and annealing
+    iterations; ``conflicts`` how often a candidate was rejected because
+    its teacher, room or batch was busy or its teacher fully loaded.
+    """
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.conflicts = defaultdict(int)
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.phases[name] += seconds
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def merge(self, other):
+        """Add another RunStats or as_dict() document into this one"""
+        if isinstance(other, RunStats):
+            other = other.as_dict()
+        for name, seconds in other.get("phases", {}).items():
+            self.phases[name] += seconds
+        for name, amount in other.get("counters", {}).items():
+            self.counters[name] += amount
+        for kind, amount in other.get("conflicts", {}).items():
+            self.conflicts[kind] += amount
+        return self
+
+    def as_dict(self):
+        return {
+            "total_time": round(time.perf_counter() - self._start, 4),
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "counters": dict(self.counters),
+            "conflicts": {kind: self.conflicts.get(kind, 0) for kind in CONFLICT_KINDS}
+        }
+
+
+def phase(stats, name):
+    """stats.phase(name), or a no-op context when stats is None"""
+    return _NO_PHASE if stats is None else stats.phase(name)
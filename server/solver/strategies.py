@@ -0,0 +1,238 @@
+"""
+Search strategies the solver core runs year by year
+"""
+import time
+
+from .annealing import AnnealingImprover
+from .backtracking import BacktrackingSolver, luby
+from .greedy import GreedySolver
+from .lns import LargeNeighbourhoodSearch
+from .stats import phase
+from .symmetry import SymmetryBreaking
+
+# {strategy name: Strategy subclass}, filled by register_strategy
+STRATEGIES = {}
+
+
+def register_strategy(cls):
+    """Class decorator making a Strategy available under its ``name``"""
+    STRATEGIES[cls.name] = cls
+    return cls
+
+
+def make_strategy(name, model, **options):
+    if name not in STRATEGIES:
+        raise ValueError(f"Solver mode must be one of: {', '.join(STRATEGIES)}")
+    return STRATEGIES[name](model, **options)
+
+
+def improve_budget(improve_time, time_limit):
+    """Seconds of improvement, capped to what is left of the solve"""
+    if time_limit is None or (improve_time is not None and improve_time <= time_limit):
+        return improve_time
+    return time_limit
+
+
+class Strategy:
+    """
+    How solve_model fills a ProblemModel: ``solve_year`` places the sessions
+    of one year on top of the shared index and workload, then ``finish`` may
+    rework the assignment of all years before it is scored and returns it
+    with the sessions still unscheduled.
+
+    solve_year returns (assignment, unscheduled session ids, failure), where
+    failure is None or a dict with "timed_out" and "nodes" when the year
+    was proven to have no solution (its sessions then count as unscheduled).
+    Both methods get the seconds left of the solve as ``time_limit``; when
+    that or the node budget stops a search, the strategy keeps the best
+    partial assignment found, leaves the rest unscheduled and sets
+    ``cut_off``. One instance is made per solve, so strategies may cache
+    per-model data.
+    Options override class attributes of the same name (e.g. improve_time
+    of local_search); unknown ones raise ValueError.
+    """
+
+    name = None
+
+    def __init__(self, model, **options):
+        self.model = model
+        self.cut_off = False
+        for option, value in options.items():
+            if option.startswith("_") or not hasattr(type(self), option) or callable(getattr(type(self), option)):
+                raise ValueError(f"Unknown option for strategy {self.name}: {option}")
+            setattr(self, option, value)
+
+    def solve_year(self, index, session_ids, workload, rng, max_nodes=200000, time_limit=None,
+                   hook=None, stats=None):
+        raise NotImplementedError
+
+    def finish(self, index, assignment, unscheduled, workload, rng, time_limit=None, hook=None, stats=None):
+        return assignment, unscheduled
+
+
+@register_strategy
+class GreedyStrategy(Strategy):
+    """Randomized first fit; leaves what does not fit unscheduled"""
+
+    name = "greedy"
+
+    def solve_year(self, index, session_ids, workload, rng, max_nodes=200000, time_limit=None,
+                   hook=None, stats=None):
+        solver = GreedySolver(self.model, index, session_ids, workload, rng=rng, time_limit=time_limit,
+                              hook=hook, stats=stats)
+        solver.solve()
+        self.cut_off = self.cut_off or solver.timed_out
+        return solver.assignment, solver.unscheduled, None
+
+
+@register_strategy
+class BacktrackingStrategy(Strategy):
+    """
+    Complete search per year within the node and time bounds, symmetric
+    branches pruned.
+
+    The search restarts with fresh random tie-breaks whenever a run uses up
+    its node cap, ``restart_nodes`` times the next term of the Luby
+    sequence, so one unlucky early choice cannot hold a year for its whole
+    budget; the runs share the year's node and time budget. When a year
+    still fails, the previous year is taken out again and both are searched
+    together in the other half of the budget, since its placements may be
+    what boxed this one in.
+    """
+
+    name = "backtracking"
+
+    # Node cap of the shortest run between restarts
+    restart_nodes = 500
+
+    def __init__(self, model, **options):
+        super().__init__(model, **options)
+        self.symmetry = SymmetryBreaking(model)
+        # (session ids, assignment) of the last year solved completely
+        self._previous_year = None
+
+    def solve_year(self, index, session_ids, workload, rng, max_nodes=200000, time_limit=None,
+                   hook=None, stats=None):
+        previous, self._previous_year = self._previous_year, None
+        deadline = time.monotonic() + time_limit if time_limit is not None else None
+        share = 2 if previous is not None else 1
+        assignment, failure, cut_off = self._search(index, session_ids, workload, rng, max_nodes // share,
+                                                    self._remaining(deadline, share), hook, stats)
+        if assignment is not None:
+            self._previous_year = (list(session_ids), assignment)
+            return assignment, [], None
+        if previous is not None and not (hook is not None and hook.cancelled):
+            combined = self._with_previous_year(index, session_ids, workload, rng, previous,
+                                                max_nodes - max_nodes // share, deadline, hook, stats)
+            if combined is not None:
+                return combined, [], None
+        if failure is not None:
+            return {}, list(session_ids), failure
+
+        # Out of time or nodes: keep the deepest partial assignment the search reached
+        self.cut_off = True
+        for session_id, (day, slots, mask, teacher, room) in cut_off.items():
+            session = self.model.sessions[session_id]
+            index.place(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+            workload[teacher] += session.length
+        return cut_off, [session_id for session_id in session_ids if session_id not in cut_off], None
+
+    def _search(self, index, session_ids, workload, rng, max_nodes, time_limit, hook, stats):
+        """
+        Restarted searches within max_nodes and time_limit: (assignment,
+        None, None) when one succeeds, (None, failure, None) when one proves
+        there is no solution, else (None, None, deepest partial assignment)
+        """
+        deadline = time.monotonic() + time_limit if time_limit is not None else None
+        nodes = 0
+        best = {}
+        run = 0
+        while True:
+            run += 1
+            cap = min(self.restart_nodes * luby(run), max_nodes - nodes)
+            solver = BacktrackingSolver(self.model, index, session_ids, workload, rng=rng, max_nodes=cap,
+                                        time_limit=self._remaining(deadline), hook=hook, symmetry=self.symmetry,
+                                        stats=stats)
+            solved = solver.solve()
+            nodes += solver.nodes
+            if solved:
+                return solver.assignment, None, None
+            if not solver.timed_out or solver.cancelled:
+                return None, {"timed_out": solver.timed_out, "nodes": nodes}, None
+            if len(solver.best_assignment) > len(best):
+                best = solver.best_assignment
+            if nodes >= max_nodes or (deadline is not None and time.monotonic() >= deadline):
+                return None, None, best
+            if stats is not None:
+                stats.count("search_restarts")
+
+    def _with_previous_year(self, index, session_ids, workload, rng, previous, max_nodes, deadline, hook, stats):
+        """Search this and the previous year together; None, with the previous year put back, if that fails"""
+        previous_ids, previous_assignment = previous
+        self._apply(index, workload, previous_assignment, index.remove, -1)
+        assignment, failure, cut_off = self._search(index, previous_ids + list(session_ids), workload, rng,
+                                                    max_nodes, self._remaining(deadline), hook, stats)
+        if stats is not None:
+            stats.count("year_retries")
+        if assignment is not None:
+            return assignment
+        self._apply(index, workload, previous_assignment, index.place, 1)
+        return None
+
+    def _apply(self, index, workload, assignment, operation, sign):
+        for session_id, (day, slots, mask, teacher, room) in assignment.items():
+            session = self.model.sessions[session_id]
+            operation(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+            workload[teacher] += sign * session.length
+
+    @staticmethod
+    def _remaining(deadline, share=1):
+        """Seconds to the deadline divided by share, or None without one"""
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic()) / share
+
+
+@register_strategy
+class LocalSearchStrategy(GreedyStrategy):
+    """Greedy construction, then simulated annealing on the soft penalty of all years"""
+
+    name = "local_search"
+
+    # Seconds and iterations of annealing after the construction
+    improve_time = 1.0
+    improve_iterations = None
+
+    def finish(self, index, assignment, unscheduled, workload, rng, time_limit=None, hook=None, stats=None):
+        if hook is not None:
+            hook.begin("improve", placed=len(assignment))
+        improver = AnnealingImprover(self.model, index, assignment, workload, rng=rng,
+                                     time_limit=improve_budget(self.improve_time, time_limit),
+                                     max_iterations=self.improve_iterations, hook=hook, stats=stats)
+        with phase(stats, "local search"):
+            assignment = improver.run()
+        return assignment, unscheduled
+
+
+@register_strategy
+class LnsStrategy(GreedyStrategy):
+    """Greedy construction, then large-neighbourhood search over teachers, year-days and labs"""
+
+    name = "lns"
+
+    # Seconds and iterations of destroy-and-repair after the construction
+    improve_time = 2.0
+    improve_iterations = None
+    # Search nodes allowed for re-solving one freed chunk
+    repair_nodes = 500
+
+    def finish(self, index, assignment, unscheduled, workload, rng, time_limit=None, hook=None, stats=None):
+        if hook is not None:
+            hook.begin("improve", placed=len(assignment))
+        search = LargeNeighbourhoodSearch(self.model, index, assignment, workload, unscheduled, rng=rng,
+                                          time_limit=improve_budget(self.improve_time, time_limit),
+                                          max_iterations=self.improve_iterations,
+                                          repair_nodes=self.repair_nodes, hook=hook, stats=stats)
+        with phase(stats, "lns"):
+            assignment = search.run()
+        return assignment, search.unscheduled
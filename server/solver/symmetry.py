@@ -0,0 +1,78 @@
+"""
+Symmetry breaking for interchangeable rooms, batches and session copies
+"""
+from collections import defaultdict
+
+
+class SymmetryBreaking:
+    """
+    Equivalence classes found once per model for the backtracking search.
+
+    Rooms of the same type and capacity form a class; among the free rooms
+    of a class with identical occupancy only the lowest id is tried.
+
+    Sessions are interchangeable when they are copies (same subject, groups
+    and eligible teachers) or belong to batches of a year with identical practical demand
+    that have nothing placed yet. Once every value at a position failed for
+    one of them, the search excludes that position for the others in the
+    sibling branches, since each of those states is a relabeling of one
+    already refuted. Unlike a fixed canonical order this never fights the
+    MRV/LCV heuristics. ``order_sessions=False`` keeps only the room
+    classes, for searches that start from a partial assignment.
+    """
+
+    def __init__(self, model, order_sessions=True):
+        classes = {}
+        self.room_class = [classes.setdefault((room.type, room.capacity), len(classes))
+                           for room in model.rooms]
+
+        # {session: [other copies]}, {batch: [batches with the same demand]},
+        # {(batch, subject): [session ids]}
+        self.copies = {}
+        self.batch_twins = {}
+        self.batch_sessions = defaultdict(list)
+        if order_sessions:
+            self._find_copies(model)
+            self._find_batch_twins(model)
+
+    def _find_copies(self, model):
+        copies = defaultdict(list)
+        for session in model.sessions:
+            copies[(session.subject, session.groups, tuple(session.teachers))].append(session.id)
+        for session_ids in copies.values():
+            if len(session_ids) > 1:
+                for session_id in session_ids:
+                    self.copies[session_id] = [other for other in session_ids if other != session_id]
+
+    def _find_batch_twins(self, model):
+        for year, batches in model.batch_groups.items():
+            by_batch = defaultdict(list)
+            for session_id in model.year_sessions[year]:
+                session = model.sessions[session_id]
+                if session.batch is not None:
+                    by_batch[session.batch].append(session)
+                    self.batch_sessions[(session.batch, session.subject)].append(session_id)
+
+            classes = defaultdict(list)
+            for batch in batches:
+                sessions = sorted(by_batch[batch], key=lambda session: (session.subject, session.id))
+                if not sessions:
+                    continue
+                signature = tuple((session.subject, session.length, tuple(session.teachers),
+                                   tuple(session.rooms), id(session.positions)) for session in sessions)
+                classes[signature].append(batch)
+            for twins in classes.values():
+                if len(twins) > 1:
+                    for batch in twins:
+                        self.batch_twins[batch] = [other for other in twins if other != batch]
+
+    def equivalent(self, session, unassigned, group_masks):
+        """Unassigned sessions that are a relabeling of ``session`` in the current state"""
+        others = [other for other in self.copies.get(session.id, ()) if other in unassigned]
+        batch = session.batch
+        if batch is not None and batch in self.batch_twins and not group_masks[batch]:
+            for twin in self.batch_twins[batch]:
+                if not group_masks[twin]:
+                    others.extend(other for other in self.batch_sessions[(twin, session.subject)]
+                                  if other in unassigned)
+        return others
@@ -0,0 +1,226 @@
+"""
+Vectorized soft-constraint scoring of timetable batches
+"""
+import numpy as np
+
+from .scoring import BUNCHING_WEIGHT, GAP_WEIGHT, OVERLOAD_WEIGHT, PREFERENCE_WEIGHT
+from .timegrid import TimeGrid
+
+# Teaching slots at the end of each day counted as late
+LATE_SLOTS = 2
+
+# Weights of score_tensors' total. Late cells are reported but not weighted,
+# so totals rank candidates the same way soft_penalty does in the solvers.
+DEFAULT_WEIGHTS = {
+    "gaps": GAP_WEIGHT,
+    "overload": OVERLOAD_WEIGHT,
+    "bunching": BUNCHING_WEIGHT,
+    "preference": PREFERENCE_WEIGHT,
+    "late": 0
+}
+
+
+class OccupancyTensors:
+    """
+    A batch of timetables as dense arrays over (timetable, entity, day, slot).
+
+    ``teacher_cells`` and ``group_cells`` are boolean (B, T, D, S) and
+    (B, G, D, S) occupancy, ``group_sessions`` counts sessions per group and
+    day (B, G, D), ``subject_sessions`` counts sessions per (group, subject)
+    row and day (B, K, D), and ``teaching`` marks the non-break slots (S,).
+    ``preferred`` (T, D, S) holds the preferred slots of teachers with a
+    preference calendar and is all True for the others.
+    """
+    __slots__ = ("teacher_cells", "group_cells", "group_sessions", "subject_sessions", "teaching", "preferred")
+
+    def __init__(self, teacher_cells, group_cells, group_sessions, subject_sessions, teaching, preferred):
+        self.teacher_cells = teacher_cells
+        self.group_cells = group_cells
+        self.group_sessions = group_sessions
+        self.subject_sessions = subject_sessions
+        self.teaching = teaching
+        self.preferred = preferred
+
+
+def assignment_tensors(model, assignments):
+    """Tensors of assignments {session id: (day, slots, mask, teacher, room)} of one model"""
+    batch = len(assignments)
+    num_days, num_slots = len(model.days), model.slots_per_day
+    subject_rows = {}
+    cells = ([], [], [], [], [])          # batch, teacher, group, day, slot per occupied cell
+    starts = ([], [], [], [])             # batch, group, subject row, day per session
+    for b, assignment in enumerate(assignments):
+        for session_id, (day, slots, mask, teacher, room) in assignment.items():
+            session = model.sessions[session_id]
+            for group in session.groups:
+                row = subject_rows.setdefault((group, session.subject), len(subject_rows))
+                for column, value in zip(starts, (b, group, row, day)):
+                    column.append(value)
+                for slot in slots:
+                    for column, value in zip(cells, (b, teacher, group, day, slot)):
+                        column.append(value)
+
+    teaching = np.array([bool(model.teaching_day_mask >> slot & 1) for slot in range(num_slots)], dtype=bool)
+    preferred = _preferred([teacher.preferred for teacher in model.teachers], num_days, num_slots)
+    return _build(batch, len(model.teachers), len(model.groups), len(subject_rows), num_days, num_slots,
+                  cells, starts, teaching, preferred)
+
+
+def grid_tensors(timetable_sets, calendars=None):
+    """
+    Tensors of stored timetables, each a {group label: {day: {slot: cell}}}
+    dict as kept in ``raw_data``. Teachers are matched by code and groups by
+    label across the batch; consecutive identical practical cells are one
+    session. A slot is a break when every cell in it is a break.
+    ``calendars`` maps teacher codes to their stored calendar documents.
+    """
+    days, slots = [], []
+    for timetables in timetable_sets:
+        for grid in timetables.values():
+            for day, row in grid.items():
+                if day not in days:
+                    days.append(day)
+                for slot in row:
+                    if slot not in slots:
+                        slots.append(slot)
+    day_ids = {day: i for i, day in enumerate(days)}
+    slot_ids = {slot: i for i, slot in enumerate(slots)}
+
+    teacher_ids, group_ids, subject_rows = {}, {}, {}
+    teaching = np.zeros(len(slots), dtype=bool)
+    cells = ([], [], [], [], [])
+    starts = ([], [], [], [])
+    for b, timetables in enumerate(timetable_sets):
+        for label, grid in timetables.items():
+            group = group_ids.setdefault(label, len(group_ids))
+            for day_label, row in grid.items():
+                day = day_ids[day_label]
+                previous = None
+                for slot_label, cell in row.items():
+                    slot = slot_ids[slot_label]
+                    kind = cell.get("type") if cell else None
+                    if kind != "break":
+                        teaching[slot] = True
+                    if kind not in ("lecture", "practical"):
+                        previous = None
+                        continue
+                    key = (kind, cell.get("subject"), cell.get("teacher"), cell.get("room"))
+                    if kind == "lecture" or key != previous:
+                        row_id = subject_rows.setdefault((group, kind, key[1]), len(subject_rows))
+                        for column, value in zip(starts, (b, group, row_id, day)):
+                            column.append(value)
+                    previous = key
+                    if key[2] is not None:
+                        teacher = teacher_ids.setdefault(key[2], len(teacher_ids))
+                        for column, value in zip(cells, (b, teacher, group, day, slot)):
+                            column.append(value)
+                    else:
+                        # Keep the group cell; no teacher row to mark
+                        for column, value in zip(cells, (b, -1, group, day, slot)):
+                            column.append(value)
+
+    grid = TimeGrid(days, slots)
+    preferred_masks = [0] * len(teacher_ids)
+    for code, teacher in teacher_ids.items():
+        calendar = (calendars or {}).get(code)
+        if calendar and calendar.get("preferred"):
+            preferred_masks[teacher] = grid.translate_days(calendar["preferred"], calendar["days"],
+                                                           calendar["time_slots"])
+    return _build(len(timetable_sets), len(teacher_ids), len(group_ids), len(subject_rows), len(days),
+                  len(slots), cells, starts, teaching, _preferred(preferred_masks, len(days), len(slots)))
+
+
+def _preferred(masks, num_days, num_slots):
+    """(T, D, S) preferred cells from cell masks; teachers without any prefer every cell"""
+    preferred = np.ones((len(masks), num_days, num_slots), dtype=bool)
+    slot_ids = np.arange(num_slots)
+    for teacher, mask in enumerate(masks):
+        if mask:
+            for day in range(num_days):
+                day_mask = (mask >> (day * num_slots)) & ((1 << num_slots) - 1)
+                preferred[teacher, day] = (day_mask >> slot_ids) & 1
+    return preferred
+
+
+def _build(batch, num_teachers, num_groups, num_rows, num_days, num_slots, cells, starts, teaching, preferred):
+    teacher_cells = np.zeros((batch, num_teachers, num_days, num_slots), dtype=bool)
+    group_cells = np.zeros((batch, num_groups, num_days, num_slots), dtype=bool)
+    group_sessions = np.zeros((batch, num_groups, num_days), dtype=np.int32)
+    subject_sessions = np.zeros((batch, num_rows, num_days), dtype=np.int32)
+
+    b, teacher, group, day, slot = (np.asarray(column, dtype=np.intp) for column in cells)
+    staffed = teacher >= 0
+    teacher_cells[b[staffed], teacher[staffed], day[staffed], slot[staffed]] = True
+    group_cells[b, group, day, slot] = True
+    b, group, row, day = (np.asarray(column, dtype=np.intp) for column in starts)
+    np.add.at(group_sessions, (b, group, day), 1)
+    np.add.at(subject_sessions, (b, row, day), 1)
+    return OccupancyTensors(teacher_cells, group_cells, group_sessions, subject_sessions, teaching, preferred)
+
+
+def score_tensors(tensors, weights=None):
+    """
+    Soft metrics of every timetable in the batch, as arrays of shape (B,):
+
+    - ``gaps``: idle teaching slots between a teacher's first and last busy
+      slot of a day
+    - ``overload``: sessions a group has on a day above its even share,
+      ceil(weekly sessions / days)
+    - ``bunching``: pairs of sessions of one subject for one group on the
+      same or on adjacent days
+    - ``preference``: teacher cells outside the teacher's preferred slots
+    - ``late``: group cells in the last LATE_SLOTS teaching slots of a day
+    - ``penalty``: the weighted sum (DEFAULT_WEIGHTS unless given)
+
+    All but ``late`` equal penalty_breakdown on the same timetable.
+    """
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    busy = tensors.teacher_cells
+    num_slots = busy.shape[-1]
+    slot_ids = np.arange(num_slots)
+
+    # Span from the first to the last busy slot of every teacher-day
+    any_busy = busy.any(axis=-1)
+    first = np.argmax(busy, axis=-1)
+    last = num_slots - 1 - np.argmax(busy[..., ::-1], axis=-1)
+    span = (slot_ids >= first[..., None]) & (slot_ids <= last[..., None]) & any_busy[..., None]
+    gaps = (span & tensors.teaching & ~busy).sum(axis=(1, 2, 3))
+
+    loads = tensors.group_sessions
+    num_days = loads.shape[-1]
+    share = -(-loads.sum(axis=-1, keepdims=True) // max(num_days, 1))
+    overload = np.clip(loads - share, 0, None).sum(axis=(1, 2))
+
+    counts = tensors.subject_sessions
+    same_day = (counts * (counts - 1) // 2).sum(axis=(1, 2))
+    adjacent = (counts[..., :-1] * counts[..., 1:]).sum(axis=(1, 2))
+    bunching = same_day + adjacent
+
+    teaching_rank = np.cumsum(tensors.teaching) - 1
+    late_slots = tensors.teaching & (teaching_rank >= tensors.teaching.sum() - LATE_SLOTS)
+    late = (tensors.group_cells & late_slots).sum(axis=(1, 2, 3))
+
+    preference = (busy & ~tensors.preferred).sum(axis=(1, 2, 3))
+
+    metrics = {"gaps": gaps, "overload": overload, "bunching": bunching, "preference": preference, "late": late}
+    metrics["penalty"] = sum(weights[name] * values for name, values in metrics.items())
+    return metrics
+
+
+def _rows(metrics):
+    names = list(metrics)
+    return [{name: metrics[name][b].item() for name in names} for b in range(len(metrics["penalty"]))]
+
+
+def score_assignments(model, assignments, weights=None):
+    """Score a batch of assignments of one model; one metrics dict per assignment"""
+    if not assignments:
+        return []
+    return _rows(score_tensors(assignment_tensors(model, assignments), weights))
+
+
+def score_grids(timetable_sets, weights=None, calendars=None):
+    """Score a batch of stored timetables; one metrics dict per timetable set"""
+    if not timetable_sets:
+        return []
+    return _rows(score_tensors(grid_tensors(timetable_sets, calendars), weights))
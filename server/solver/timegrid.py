@@ -0,0 +1,151 @@
+"""
+Per-department time grids compiled into slot indices and consecutive runs
+"""
+import re
+
+_TIME = re.compile(r"^\s*(\d{1,2})(?:[:.](\d{2}))?\s*([ap]\.?m\.?)?\s*$", re.IGNORECASE)
+
+
+def parse_time(text):
+    """Minutes after midnight of "9:00 am", "13:15" or "1 pm"; None if unreadable"""
+    match = _TIME.match(text or "")
+    if not match:
+        return None
+    hours, minutes, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if hours > 12:
+            return None
+        hours = hours % 12 + (12 if meridiem.lower().startswith("p") else 0)
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def parse_slot(label):
+    """(start, end) minutes of a "start - end" slot label, or None"""
+    parts = str(label).split("-")
+    if len(parts) != 2:
+        return None
+    start, end = parse_time(parts[0]), parse_time(parts[1])
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+
+class TimeGrid:
+    """
+    A department's bell schedule: days, slot labels with their boundaries,
+    breaks and working days, resolved to integer indices once.
+
+    Two teaching slots are consecutive when they are adjacent in the list
+    and, if both labels carry times, the first ends when the second starts.
+    ``runs`` holds every run of N consecutive teaching slots of a day for
+    each N up to the longest block, so the start positions of a session of
+    any length are one lookup.
+    """
+
+    def __init__(self, days, time_slots, break_slots=(), working_days=None):
+        self.days = list(days)
+        self.time_slots = list(time_slots)
+        self.slots_per_day = len(self.time_slots)
+        slot_index = {slot: i for i, slot in enumerate(self.time_slots)}
+        day_index = {day: i for i, day in enumerate(self.days)}
+
+        self.break_slots = [slot for slot in self.time_slots if slot in set(break_slots)]
+        breaks = {slot_index[slot] for slot in self.break_slots}
+        self.teaching_slots = [slot for slot in range(self.slots_per_day) if slot not in breaks]
+        self.teaching_day_mask = sum(1 << slot for slot in self.teaching_slots)
+        self.working_days = [day_index[day] for day in (working_days or self.days) if day in day_index]
+        self.bounds = [parse_slot(slot) for slot in self.time_slots]
+
+        # Maximal blocks of consecutive teaching slots, then every window of them
+        blocks = []
+        for slot in self.teaching_slots:
+            if blocks and blocks[-1][-1] == slot - 1 and self._joined(slot - 1, slot):
+                blocks[-1].append(slot)
+            else:
+                blocks.append([slot])
+        self.runs = {}
+        for length in range(1, max((len(block) for block in blocks), default=0) + 1):
+            self.runs[length] = [tuple(block[start:start + length]) for block in blocks
+                                 for start in range(len(block) - length + 1)]
+
+    def _joined(self, first, second):
+        if self.bounds[first] is None or self.bounds[second] is None:
+            return True
+        return self.bounds[first][1] == self.bounds[second][0]
+
+    def runs_of(self, length):
+        """Slot tuples of every run of ``length`` consecutive teaching slots in a day"""
+        return self.runs.get(length, [])
+
+    def slot_map(self, time_slots):
+        """
+        For each slot of another grid, the indices of this grid's slots it
+        overlaps in time (by label when either side has no times)
+        """
+        own = {slot: i for i, slot in enumerate(self.time_slots)}
+        mapping = []
+        for label in time_slots:
+            bounds = parse_slot(label)
+            if label in own:
+                mapping.append([own[label]])
+            elif bounds is None:
+                mapping.append([])
+            else:
+                mapping.append([i for i, other in enumerate(self.bounds)
+                                if other is not None and other[0] < bounds[1] and bounds[0] < other[1]])
+        return mapping
+
+    def translate(self, mask, days, time_slots):
+        """Re-express a cell mask laid out over (days, time_slots) in this grid"""
+        if self.days == list(days) and self.time_slots == list(time_slots):
+            return mask
+        day_index = {day: i for i, day in enumerate(self.days)}
+        slot_map = self.slot_map(time_slots)
+        width = len(time_slots)
+        result = 0
+        for day_position, day in enumerate(days):
+            if day not in day_index:
+                continue
+            day_mask = (mask >> (day_position * width)) & ((1 << width) - 1)
+            base = day_index[day] * self.slots_per_day
+            slot = 0
+            while day_mask:
+                if day_mask & 1:
+                    for target in slot_map[slot]:
+                        result |= 1 << (base + target)
+                day_mask >>= 1
+                slot += 1
+        return result
+
+    @classmethod
+    def union(cls, grids):
+        """
+        One grid covering several bell schedules: every day any of them uses
+        and, within a day, the pieces between all their slot boundaries, so a
+        slot of any of the grids maps exactly onto whole slots of the union.
+        Labels without times are kept as they are.
+        """
+        days, labels, boundaries, spans = [], [], set(), []
+        for grid in grids:
+            days.extend(day for day in grid.days if day not in days)
+            for label, bounds in zip(grid.time_slots, grid.bounds):
+                if bounds is None:
+                    if label not in labels:
+                        labels.append(label)
+                else:
+                    boundaries.update(bounds)
+                    spans.append(bounds)
+        points = sorted(boundaries)
+        pieces = [f"{start // 60}:{start % 60:02d} - {end // 60}:{end % 60:02d}"
+                  for start, end in zip(points, points[1:])
+                  if any(span[0] <= start and end <= span[1] for span in spans)]
+        return cls(days, pieces + labels)
+
+    def translate_days(self, day_masks, days, time_slots):
+        """translate() for per-day masks, as stored in occupancy summaries and calendars"""
+        mask = 0
+        for day_idx, day_mask in enumerate(day_masks):
+            mask |= day_mask << (day_idx * len(time_slots))
+        return self.translate(mask, days, time_slots)
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from api.models.department import Department
+from api.models.room import Room
+from api.models.subject import Subject
+from api.models.teacher import Teacher
+from api.models.timetable import Timetable
+from api.services.timetable_generator import result_cache
+from benchmark.instances import InstanceSpec, build_instance
+from benchmark.store import InMemoryDatabase
+from solver.model import compile_problem
+from solver.occupancy import OccupancyIndex
+from timetable_generator import TimetableGenerator
+
+# The generator's year labels, in place of the benchmark's Y1..Yn
+YEARS = ("SE", "TE", "BE")
+
+
+def build_campus(db, **spec):
+    """Synthetic departments labelled with the generator's years; returns their ids"""
+    spec = InstanceSpec(**spec)
+    department_ids = build_instance(db, spec)
+    labels = dict(zip(spec.year_labels, YEARS))
+    for subject in db.subjects.find({}):
+        db.subjects.update_one({"_id": subject["_id"]}, {"$set": {"year": labels[subject["year"]]}})
+    for department in db.departments.find({}):
+        years = {labels[year]: value for year, value in department["years"].items()}
+        db.departments.update_one({"_id": department["_id"]}, {"$set": {"years": years}})
+    return department_ids
+
+
+def compile_department(db, department_id):
+    """(model, index, constraints) of a department, as the generator builds them before solving"""
+    generator = TimetableGenerator(db)
+    department_id, department, year_subjects, teachers, rooms = generator._load_documents(
+        department_id, create_demo=False)
+    constraints = generator._get_constraints(department, year_subjects, teachers, rooms)
+    model = compile_problem(department, year_subjects, teachers, rooms, constraints, constraints["time_grid"])
+    index = OccupancyIndex.for_model(model)
+    generator._block_unavailable(model, index)
+    return model, index, constraints
+
+
+def wait_for_job(client, job_id, timeout=60):
+    """Poll a generation job until it finishes; returns the job"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/generation-jobs/{job_id}").json
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"generation job {job_id} did not finish within {timeout}s")
+
+
+@pytest.fixture
+def db():
+    database = InMemoryDatabase()
+    for model in (Department, Teacher, Subject, Room, Timetable):
+        model.initialize(database)
+    result_cache.clear()
+    return database
+
+
+@pytest.fixture
+def client(db):
+    from api.routes.timetables import timetables
+
+    app = Flask(__name__)
+    app.register_blueprint(timetables)
+    return app.test_client()
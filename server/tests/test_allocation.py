@@ -0,0 +1,40 @@
+from collections import defaultdict
+
+from conftest import build_campus, compile_department
+from solver.allocation import allocate_teachers
+
+
+def demand_teachers(model):
+    """{(subject, groups): teachers} over the model's sessions"""
+    teachers = defaultdict(set)
+    for session in model.sessions:
+        teachers[(session.subject, tuple(session.groups))].update(session.teachers)
+    return teachers
+
+
+def test_each_demand_gets_one_teacher(db):
+    department_id, = build_campus(db, subjects=8, teachers=6, tightness=0.6, seed=4)
+    model, index, constraints = compile_department(db, department_id)
+
+    result = allocate_teachers(model, index, constraints.get("teacher_subjects"))
+
+    assert result["assigned"] > 0 and not result["open"]
+    split = {demand: teachers for demand, teachers in demand_teachers(model).items() if len(teachers) > 1}
+    assert not split
+
+
+def test_demand_is_split_only_without_capacity(db):
+    department_id, = build_campus(db, subjects=4, teachers=3, seed=5)
+    model, index, constraints = compile_department(db, department_id)
+    lecture = max((session for session in model.sessions if session.kind == "lecture"),
+                  key=lambda session: model.subjects[session.subject].per_week)
+    eligible = list(lecture.teachers)
+    assert len(eligible) > 1
+    # Nobody can take every lecture of this class, but together they can
+    for teacher in eligible:
+        model.teachers[teacher].max_workload = model.subjects[lecture.subject].per_week - 1
+
+    allocate_teachers(model, index, constraints.get("teacher_subjects"))
+
+    teachers = demand_teachers(model)[(lecture.subject, tuple(lecture.groups))]
+    assert len(teachers) > 1
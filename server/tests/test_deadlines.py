@@ -0,0 +1,62 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from conftest import build_campus, compile_department
+from solver.multistart import multi_start
+from solver.progress import ProgressHook
+from solver.repair import repair_assignment
+from solver.stats import RunStats
+from timetable_generator import TimetableGenerator
+
+
+def test_repair_stops_at_its_time_limit(db):
+    department_id, = build_campus(db, seed=6)
+    model, index, constraints = compile_department(db, department_id)
+
+    result = repair_assignment(model, index, {}, [0] * len(model.teachers), time_limit=0.0)
+
+    assert result["cut_off"]
+    assert sorted(result["unscheduled"]) == sorted(session.id for session in model.sessions)
+    assert not result["assignment"]
+
+
+def test_repair_within_its_time_limit_is_not_cut_off(db):
+    department_id, = build_campus(db, tightness=0.3, seed=6)
+    model, index, constraints = compile_department(db, department_id)
+
+    result = repair_assignment(model, index, {}, [0] * len(model.teachers), time_limit=10.0)
+
+    assert not result["cut_off"]
+    assert not result["unscheduled"]
+    assert len(result["assignment"]) == len(model.sessions)
+
+
+def test_multi_start_leaves_no_worker_running(db):
+    department_id, = build_campus(db, tightness=0.8, seed=2)
+    model, index, constraints = compile_department(db, department_id)
+    hook = ProgressHook(lambda event: None)
+    threading.Timer(0.2, hook.cancel).start()
+
+    start = time.monotonic()
+    multi_start(model, "lns", index.teachers, index.rooms, 4, time_limit=30, workers=2, seed=1, hook=hook)
+
+    assert time.monotonic() - start < 5
+    assert not multiprocessing.active_children()
+
+
+@pytest.mark.parametrize("solver_mode,phase_name", [("lns", "lns"), ("local_search", "local search")])
+def test_improve_time_is_the_strategy_budget(db, solver_mode, phase_name):
+    department_id, = build_campus(db, seed=3)
+    stats = RunStats()
+
+    start = time.perf_counter()
+    TimetableGenerator(db, solver_mode=solver_mode).generate_timetable(department_id, "2024", create_demo=False,
+                                                                       seed=1, improve_time=0.3, stats=stats)
+
+    assert stats.phases[phase_name] < 0.6
+    # No separate annealing pass on top of the strategy's own improvement
+    assert "improve" not in stats.phases
+    assert time.perf_counter() - start < 1.5
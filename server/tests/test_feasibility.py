@@ -0,0 +1,17 @@
+from conftest import build_campus, compile_department
+from solver.feasibility import check_feasibility
+
+
+def test_pool_demand_sums_the_pools_it_contains(db):
+    department_id, = build_campus(db, tightness=0.9, teachers=3, classrooms=1, labs=1, seed=0)
+    model, index, constraints = compile_department(db, department_id)
+
+    report = check_feasibility(model, index)
+
+    violations = {(violation["resource"], violation["name"]): violation for violation in report["violations"]}
+    everyone = ", ".join(teacher.code for teacher in model.teachers)
+    assert violations[("teacher", everyone)]["demand"] == sum(session.length for session in model.sessions)
+    classroom, = [room for room in model.rooms if room.number == "C001"]
+    assert violations[("room", "C001")]["demand"] == sum(
+        session.length for session in model.sessions if set(session.rooms) == {classroom.id})
+    assert not report["feasible"]
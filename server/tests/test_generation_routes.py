@@ -0,0 +1,115 @@
+import time
+
+from api.services.timetable_generator import TimetableGeneratorService
+from conftest import build_campus, wait_for_job
+from solver.stats import RunStats
+from timetable_generator import TimetableGenerator
+
+
+def generate(client, department_id, **options):
+    body = dict({"department_id": str(department_id), "academic_year": "2024"}, **options)
+    response = client.post("/api/generate-timetable", json=body)
+    assert response.status_code == 202, response.json
+    return wait_for_job(client, response.json["job_id"])
+
+
+def test_generation_is_saved_with_stats(client, db):
+    department_id, = build_campus(db, seed=1)
+
+    job = generate(client, department_id, seed=1)
+
+    assert job["status"] == "done", job["error"]
+    document = db.timetables.find_one({"department_id": department_id})
+    assert str(document["_id"]) == job["result"]["timetable_id"]
+    assert document["occupancy"]["teachers"]
+    assert document["stats"]["counters"]["sessions"] > 0
+
+
+def test_warm_start_reuses_previous_placements(client, db):
+    department_id, = build_campus(db, tightness=0.3, seed=2)
+    first = generate(client, department_id, seed=1)
+    assert first["status"] == "done", first["error"]
+    assert first["result"]["stats"]["counters"]["unscheduled"] == 0
+
+    second = generate(client, department_id, seed=2, warm_start=True)
+
+    assert second["status"] == "done", second["error"]
+    counters = second["result"]["stats"]["counters"]
+    assert counters["kept"] == counters["sessions"] > 0
+    assert counters["moved_cells"] == 0
+    assert second["result"]["timetables"] == first["result"]["timetables"]
+
+
+def test_warm_start_reads_imported_timetable(client, db):
+    department_id, = build_campus(db, tightness=0.3, seed=3)
+    first = generate(client, department_id, seed=1)
+    assert first["status"] == "done", first["error"]
+    assert first["result"]["stats"]["counters"]["unscheduled"] == 0
+    db.timetables.delete_one({"department_id": department_id})
+    response = client.post("/api/timetables/import", json={
+        "department_id": str(department_id), "timetable": {"timetables": first["result"]["timetables"]}})
+    assert response.status_code == 201
+
+    second = generate(client, department_id, seed=2, warm_start=True)
+
+    assert second["status"] == "done", second["error"]
+    counters = second["result"]["stats"]["counters"]
+    assert counters["kept"] == counters["sessions"] > 0
+
+
+def test_cancelled_job_stops(client, db):
+    department_id, = build_campus(db, tightness=0.6, seed=4)
+    response = client.post("/api/generate-timetable", json={
+        "department_id": str(department_id), "academic_year": "2024", "solver": "lns",
+        "time_limit": 60, "improve_time": 60})
+    job_id = response.json["job_id"]
+    while client.get(f"/api/generation-jobs/{job_id}").json["status"] == "queued":
+        time.sleep(0.05)
+
+    assert client.post(f"/api/generation-jobs/{job_id}/cancel").status_code == 200
+    start = time.monotonic()
+    job = wait_for_job(client, job_id)
+
+    assert job["status"] == "cancelled"
+    assert time.monotonic() - start < 10
+    assert db.timetables.count_documents({}) == 0
+
+
+def test_result_clashing_with_a_later_save_is_solved_again(db, monkeypatch):
+    first, second = build_campus(db, departments=2, classrooms=3, labs=3, tightness=0.5, seed=7)
+    service = TimetableGeneratorService(db, cache=None)
+    solve = service.generator.generate_timetable
+    calls = []
+
+    def generate_while_another_saves(department_id, academic_year, **options):
+        timetables = solve(department_id, academic_year, **options)
+        if not calls:
+            # Another job saves the second department from the same empty snapshot meanwhile
+            other = TimetableGenerator(db).generate_timetable(second, "2024", create_demo=False, seed=1)
+            service.save_timetable(second, "2024", other)
+            calls.append(other)
+        return timetables
+
+    monkeypatch.setattr(service.generator, "generate_timetable", generate_while_another_saves)
+    stats = RunStats()
+    timetables, timetable_id = service.generate_and_save(first, "2024", stats=stats, seed=1)
+
+    assert stats.counters["save_retries"] == 1
+    assert str(db.timetables.find_one({"department_id": first})["_id"]) == timetable_id
+    assert not TimetableGenerator(db).load_ledger(exclude_department=first).clashes(timetables)
+
+
+def test_repair_reads_imported_timetable(client, db):
+    department_id, = build_campus(db, tightness=0.3, seed=3)
+    first = generate(client, department_id, seed=1)
+    assert first["status"] == "done", first["error"]
+    db.timetables.delete_one({"department_id": department_id})
+    response = client.post("/api/timetables/import", json={
+        "department_id": str(department_id), "timetable": {"timetables": first["result"]["timetables"]}})
+    assert response.status_code == 201
+
+    response = client.post(f"/api/timetables/{response.json['id']}/repair", json={"changes": []})
+
+    assert response.status_code == 200, response.json
+    assert response.json["moved_cells"] == response.json["unscheduled"] == 0
+    assert response.json["timetables"] == first["result"]["timetables"]
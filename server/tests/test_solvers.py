@@ -0,0 +1,262 @@
+import random
+from collections import Counter
+
+import pytest
+
+from conftest import build_campus, compile_department
+from solver.cache import ResultCache
+from solver.multistart import solve_model
+from solver.progress import GenerationCancelled, ProgressHook
+from solver.repair import recover_assignment, repair_assignment
+from solver.scoring import penalty_breakdown, soft_penalty
+from solver.stats import RunStats
+from solver.strategies import make_strategy
+from solver.tensor_scoring import score_assignments
+from solver.timegrid import parse_slot
+from timetable_generator import SOLVER_MODES, TimetableGenerator
+
+
+def moments(slot):
+    """Five-minute ticks covered by a slot, so grids with other bell schedules compare by time"""
+    bounds = parse_slot(slot)
+    return range(bounds[0], bounds[1], 5) if bounds else [slot]
+
+
+def clashes(timetable_sets):
+    """Teacher, room and class double bookings over the timetables of several departments"""
+    booked = Counter()
+    for department, timetables in enumerate(timetable_sets):
+        lectures, practicals = set(), []
+        for label, grid in timetables.items():
+            year, group = label.split("_", 1)
+            for day, row in grid.items():
+                for slot, cell in row.items():
+                    if not cell or cell.get("type") not in ("lecture", "practical"):
+                        continue
+                    for moment in moments(slot):
+                        booked[("teacher", cell["teacher"], day, moment)] += 1
+                        booked[("room", cell["room"], day, moment)] += 1
+                        if group == "Main":
+                            lectures.add((year, day, moment))
+                        else:
+                            practicals.append((year, day, moment))
+        # A lecture of the whole year clashes with a batch practical at the same time
+        for key in practicals:
+            if key in lectures:
+                booked[("class", department) + key] += 2
+    return [key for key, count in booked.items() if count > 1]
+
+
+def placed_cells(timetables):
+    return sum(1 for grid in timetables.values() for row in grid.values() for cell in row.values()
+               if cell and cell.get("type") in ("lecture", "practical"))
+
+
+@pytest.mark.parametrize("solver_mode", SOLVER_MODES)
+def test_no_double_bookings_across_departments(db, solver_mode):
+    department_ids = build_campus(db, departments=2, classrooms=4, labs=4, tightness=0.5, seed=7)
+    generator = TimetableGenerator(db, solver_mode=solver_mode, search_time_limit=3)
+    ledger = generator.load_ledger(exclude_departments=department_ids)
+
+    results = [generator.generate_timetable(department_id, "2024", ledger=ledger, create_demo=False, seed=1,
+                                            restarts=2)
+               for department_id in department_ids]
+
+    assert all(results)
+    assert all(placed_cells(timetables) > 0 for timetables in results)
+    assert not clashes(results)
+
+
+def test_saved_timetables_seed_the_next_department(db):
+    first, second = build_campus(db, departments=2, classrooms=4, labs=4, tightness=0.5, seed=8)
+    generator = TimetableGenerator(db)
+    timetables = generator.generate_timetable(first, "2024", create_demo=False, seed=1)
+    generator.save_timetable(first, "2024", timetables)
+
+    # A fresh generator only knows the first department through what was saved
+    other = TimetableGenerator(db).generate_timetable(second, "2024", create_demo=False, seed=1)
+
+    assert not clashes([timetables, other])
+
+
+SIX_DAYS = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY"]
+EARLY_BELLS = ["8:30 am - 9:30 am", "9:30 am - 10:30 am", "10:30 am - 10:45 am", "10:45 am - 11:45 am",
+               "11:45 am - 12:45 pm", "12:45 pm - 1:30 pm", "1:30 pm - 2:30 pm", "2:30 pm - 3:30 pm"]
+
+
+@pytest.mark.parametrize("from_saved", [False, True])
+def test_departments_on_other_bell_schedules_share_rooms(db, from_saved):
+    first, second = build_campus(db, departments=2, classrooms=3, labs=3, tightness=0.5, seed=7)
+    # Both work on Saturday; the first also starts half an hour earlier
+    db.departments.update_one({"_id": first}, {"$set": {
+        "working_days": SIX_DAYS, "time_slots": EARLY_BELLS,
+        "breaks": ["10:30 am - 10:45 am", "12:45 pm - 1:30 pm"]}})
+    db.departments.update_one({"_id": second}, {"$set": {"working_days": SIX_DAYS}})
+
+    generator = TimetableGenerator(db)
+    if from_saved:
+        results = []
+        for department_id in (first, second):
+            timetables = TimetableGenerator(db).generate_timetable(department_id, "2024", create_demo=False,
+                                                                   seed=1)
+            generator.save_timetable(department_id, "2024", timetables)
+            results.append(timetables)
+    else:
+        ledger = generator.load_ledger(exclude_departments=[first, second])
+        results = [generator.generate_timetable(department_id, "2024", ledger=ledger, create_demo=False, seed=1)
+                   for department_id in (first, second)]
+
+    assert all(any(cell and cell.get("room") for grid in timetables.values() for cell in grid["SATURDAY"].values())
+               for timetables in results)
+    assert not clashes(results)
+
+
+def test_repair_keeps_every_placement_that_still_fits(db):
+    department_id, = build_campus(db, tightness=0.4, seed=9)
+    model, index, constraints = compile_department(db, department_id)
+    solved = TimetableGenerator(db).generate_timetable(department_id, "2024", create_demo=False, seed=1)
+    previous = recover_assignment(model, solved)
+    assert len(previous) == len(model.sessions)
+
+    # The busiest teacher can no longer teach on the first day
+    teacher = Counter(value[3] for value in previous.values()).most_common(1)[0][0]
+    blocked = (1 << model.slots_per_day) - 1
+    index.teachers[teacher] |= blocked
+    result = repair_assignment(model, index, previous, [0] * len(model.teachers), time_limit=10)
+
+    broken = {session_id for session_id, value in previous.items() if value[3] == teacher and value[0] == 0}
+    assert broken
+    assert not result["widened_years"]
+    for session_id, value in previous.items():
+        if session_id not in broken:
+            assert result["assignment"][session_id] == value
+    for session_id, value in result["assignment"].items():
+        assert not (value[3] == teacher and value[2] & blocked)
+    assert not result["cut_off"]
+
+
+def test_warm_start_keeps_still_valid_cells(db):
+    department_id, = build_campus(db, tightness=0.4, seed=10)
+    generator = TimetableGenerator(db)
+    first = RunStats()
+    timetables = generator.generate_timetable(department_id, "2024", create_demo=False, seed=1, stats=first)
+    generator.save_timetable(department_id, "2024", timetables)
+    assert first.counters["unscheduled"] == 0
+    # One lecture subject gets an extra weekly lecture
+    subject = next(subject for subject in db.subjects.find({"type": "lecture"}) if subject["lectures_per_week"] < 5)
+    db.subjects.update_one({"_id": subject["_id"]}, {"$set": {"lectures_per_week": subject["lectures_per_week"] + 1}})
+
+    stats = RunStats()
+    warm = generator.generate_timetable(department_id, "2024", create_demo=False, seed=2, warm_start=True,
+                                        stats=stats)
+
+    assert stats.counters["kept"] == first.counters["sessions"]
+    assert stats.counters["sessions"] == first.counters["sessions"] + 1
+    assert placed_cells(warm) == placed_cells(timetables) + 1
+    for label, grid in timetables.items():
+        for day, row in grid.items():
+            for slot, cell in row.items():
+                if cell and cell.get("type") in ("lecture", "practical"):
+                    assert warm[label][day][slot] == cell
+
+
+def test_cancelled_hook_stops_generation(db):
+    department_id, = build_campus(db, tightness=0.6, seed=11)
+    hook = ProgressHook()
+    hook.cancel()
+
+    with pytest.raises(GenerationCancelled):
+        TimetableGenerator(db, solver_mode="lns").generate_timetable(department_id, "2024", create_demo=False,
+                                                                      hook=hook)
+
+
+def test_node_limit_cuts_the_search_off(db):
+    department_id, = build_campus(db, tightness=0.7, seed=12)
+    generator = TimetableGenerator(db, solver_mode="backtracking", max_search_nodes=5)
+    stats = RunStats()
+
+    timetables = generator.generate_timetable(department_id, "2024", create_demo=False, seed=1, stats=stats)
+
+    assert timetables is not None
+    assert stats.counters["cut_off"] == 1
+    assert 0 < stats.counters["unscheduled"] < stats.counters["sessions"]
+    assert placed_cells(timetables) > 0
+
+
+def test_batch_scores_match_penalty_breakdown(db):
+    department_id, = build_campus(db, seed=5)
+    generator = TimetableGenerator(db)
+    timetables = generator.generate_timetable(department_id, "2024", create_demo=False, seed=1)
+    saved = generator.save_timetable(department_id, "2024", timetables)
+    imported = db.timetables.insert_one({"department_id": department_id, "timetables": timetables}).inserted_id
+    model, index, constraints = compile_department(db, department_id)
+    assignment = recover_assignment(model, timetables)
+    expected = dict(penalty_breakdown(model, assignment), penalty=soft_penalty(model, assignment))
+
+    scores = generator.score_timetables([saved, str(imported)]) + score_assignments(model, [assignment])
+
+    assert expected["gaps"] and expected["bunching"]
+    for score in scores:
+        assert {name: score[name] for name in expected} == expected
+
+
+def test_backtracking_restarts_instead_of_thrashing(db):
+    # Seeds that used to spend the whole budget of SE in one dead subtree
+    department_id, = build_campus(db, tightness=0.6, seed=2)
+    model, index, constraints = compile_department(db, department_id)
+
+    stats = RunStats()
+    for seed in (6, 7, 8):
+        result = solve_model(model, "backtracking", seed, index.teachers, index.rooms, time_limit=4, stats=stats)
+
+        assert not result["cut_off"] and not result["unscheduled"]
+    assert stats.counters["search_restarts"] > 0
+
+
+@pytest.mark.parametrize("together", [True, False])
+def test_backtracking_retries_a_failed_year_with_the_previous_one(db, together):
+    department_id, = build_campus(db, tightness=0.4, seed=9)
+    model, index, constraints = compile_department(db, department_id)
+    strategy = make_strategy("backtracking", model)
+    workload = [0] * len(model.teachers)
+    rng = random.Random(1)
+    first, second = model.year_sessions["SE"], model.year_sessions["TE"]
+    placed, _, _ = strategy.solve_year(index, first, workload, rng)
+    teachers, rooms = list(index.teachers), list(index.rooms)
+
+    # The second year alone has no solution; with the first one it has, if together
+    search = strategy._search
+
+    def fail_alone(index, session_ids, *args):
+        if len(session_ids) == len(second) or not together:
+            return None, {"timed_out": False, "nodes": 0}, None
+        return search(index, session_ids, *args)
+
+    strategy._search = fail_alone
+    stats = RunStats()
+    assignment, unscheduled, failure = strategy.solve_year(index, second, workload, rng, stats=stats)
+
+    assert stats.counters["year_retries"] == 1
+    if together:
+        assert failure is None and not unscheduled
+        assert set(assignment) == set(first) | set(second)
+    else:
+        assert failure is not None and unscheduled == list(second)
+        # The first year's placements are back where they were
+        assert (list(index.teachers), list(index.rooms)) == (teachers, rooms)
+        assert workload == [sum(model.sessions[session_id].length for session_id, value in placed.items()
+                                if value[3] == teacher) for teacher in range(len(model.teachers))]
+
+
+@pytest.mark.parametrize("seed", [None, 1])
+def test_incomplete_results_are_cached_only_under_a_seed(db, seed):
+    department_id, = build_campus(db, tightness=0.8, seed=1)
+    generator = TimetableGenerator(db, cache=ResultCache())
+    runs = [RunStats(), RunStats()]
+
+    for stats in runs:
+        generator.generate_timetable(department_id, "2024", create_demo=False, precheck=False, seed=seed,
+                                     stats=stats)
+
+    assert runs[0].counters["unscheduled"] > 0
+    assert runs[1].counters["cache_hits"] == (seed is not None)
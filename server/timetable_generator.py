@@ -1,41 +1,75 @@
 """
 Timetable Generator Algorithm using Backtracking
 """
+import time
 from collections import defaultdict
+from datetime import datetime
 from bson.objectid import ObjectId
-import random
+
+from solver.allocation import allocate_teachers
+from solver.annealing import AnnealingImprover
+from solver.cache import fingerprint
+from solver.feasibility import InfeasibleError, check_feasibility
+from solver.ledger import ResourceLedger
+from solver.model import compile_problem
+from solver.multistart import multi_start, solve_model
+from solver.occupancy import OccupancyIndex
+from solver.portfolio import DEFAULT_PORTFOLIO, solve_portfolio
+from solver.progress import GenerationCancelled
+from solver.repair import recover_assignment, repair_assignment
+from solver.scoring import soft_penalty
+from solver.stats import phase
+from solver.strategies import STRATEGIES, improve_budget
+from solver.tensor_scoring import score_grids
+from solver.timegrid import TimeGrid
+
+# Built-in strategies for scheduling a year (see solver.strategies), and
+# "portfolio", which races several of them (see solver.portfolio)
+PORTFOLIO_MODE = "portfolio"
+SOLVER_MODES = tuple(STRATEGIES) + (PORTFOLIO_MODE,)
+
+# Default bell schedule; departments may set their own time_slots, breaks
+# and working_days (see TimetableGenerator._time_grid)
+DEFAULT_DAYS = ("MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY")
+DEFAULT_TIME_SLOTS = (
+    "9:00 am - 10:00 am",
+    "10:00 am - 11:00 am",
+    "11:00 am - 11:15 am",  # Break
+    "11:15 am - 12:15 pm",
+    "12:15 pm - 1:15 pm",
+    "1:15 pm - 1:45 pm",    # Lunch break
+    "1:45 pm - 2:45 pm",
+    "2:45 pm - 3:45 pm",
+    "3:45 pm - 4:45 pm"
+)
+DEFAULT_BREAK_SLOTS = (
+    "11:00 am - 11:15 am",  # Morning break
+    "1:15 pm - 1:45 pm"     # Lunch break
+)
 
 class TimetableGenerator:
-    def __init__(self, db):
+    def __init__(self, db, solver_mode="greedy", max_search_nodes=200000, search_time_limit=30,
+                 portfolio=DEFAULT_PORTFOLIO, cache=None):
+        if solver_mode not in SOLVER_MODES:
+            raise ValueError(f"Solver mode must be one of: {', '.join(SOLVER_MODES)}")
+        
         self.db = db
-        self.days = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY"]
-        self.years = ["SE", "TE", "BE"]
+        self.solver_mode = solver_mode
+        # Entries raced in portfolio mode
+        self.portfolio = portfolio
+        # Optional solver.cache.ResultCache of finished solves
+        self.cache = cache
         
-        # Update time slots to include breaks
-        self.time_slots = [
-            "9:00 am - 10:00 am",
-            "10:00 am - 11:00 am",
-            "11:00 am - 11:15 am",  # Break
-            "11:15 am - 12:15 pm",
-            "12:15 pm - 1:15 pm",
-            "1:15 pm - 1:45 pm",    # Lunch break
-            "1:45 pm - 2:45 pm",
-            "2:45 pm - 3:45 pm",
-            "3:45 pm - 4:45 pm"
-        ]
+        # Bounds for the backtracking search of a single year
+        self.max_search_nodes = max_search_nodes
+        self.search_time_limit = search_time_limit
         
-        # Define which slots are breaks
-        self.break_slots = [
-            "11:00 am - 11:15 am",  # Morning break
-            "1:15 pm - 1:45 pm"     # Lunch break
-        ]
+        self.days = list(DEFAULT_DAYS)
+        self.years = ["SE", "TE", "BE"]
         
-        # Define consecutive slots for practicals (2 hours)
-        self.practical_slot_pairs = [
-            ("9:00 am - 10:00 am", "10:00 am - 11:00 am"),
-            ("11:15 am - 12:15 pm", "12:15 pm - 1:15 pm"),
-            ("1:45 pm - 2:45 pm", "2:45 pm - 3:45 pm")
-        ]
+        # Default bell schedule (see DEFAULT_TIME_SLOTS)
+        self.time_slots = list(DEFAULT_TIME_SLOTS)
+        self.break_slots = list(DEFAULT_BREAK_SLOTS)
         
         # Subject abbreviations from the image
         self.subject_codes = {
@@ -59,8 +93,480 @@ class TimetableGenerator:
             "SE": "Mr. Samsul Ekram"
         }
         
-    def generate_timetable(self, department_id, academic_year):
-        """Main function to generate timetable using backtracking algorithm"""
+    def generate_timetable(self, department_id, academic_year, ledger=None, restarts=1, time_limit=None,
+                           improve_time=None, improve_iterations=None, hook=None, precheck=True,
+                           allocate=True, stats=None, create_demo=True, warm_start=False, seed=None):
+        """
+        Main function to generate timetable using backtracking algorithm
+        
+        Teachers and rooms are checked against a campus-wide ledger shared by
+        every year and department. When no ledger is given it is seeded from
+        the other departments' stored timetables.
+        
+        With restarts > 1 that many independently seeded solves run in
+        parallel and the best one (fewest unscheduled sessions, then lowest
+        soft penalty) is kept. In portfolio mode the entries of
+        self.portfolio race instead and the first complete result wins;
+        restarts is ignored.
+        
+        time_limit (self.search_time_limit by default) is the wall-clock
+        budget in seconds of solving and improving, and self.max_search_nodes
+        bounds every search. Solvers check both as they go; when one runs out
+        the best timetable found so far is returned, sessions it could not
+        place are left empty and stats counts "cut_off".
+        
+        improve_time / improve_iterations are the budget of the improvement
+        phase of strategies that have one (local_search's annealing, lns's
+        destroy-and-repair) instead of their defaults; with other modes they
+        enable a simulated-annealing pass that lowers the soft penalty of the
+        solution within that budget.
+        
+        hook is an optional solver.progress.ProgressHook receiving progress
+        events; GenerationCancelled is raised once it has been cancelled.
+        
+        Unless precheck is False, supply/demand bounds are checked before
+        searching and InfeasibleError (carrying a structured report) is
+        raised when they prove that no complete timetable exists.
+        
+        Unless allocate is False, subjects without a fixed teacher get one per
+        session from a min-cost flow over teacher hours before searching.
+        
+        stats is an optional solver.stats.RunStats that receives the time of
+        every phase (load, constraints, compile, allocate, precheck, solve,
+        improve, format) and the solvers' counters.
+        
+        With create_demo False, missing subjects, teachers or rooms raise
+        ValueError instead of being filled with demo documents.
+        
+        With warm_start, the department's latest stored timetable is mapped
+        onto the new model and every placement that is still valid is kept;
+        only new or broken sessions are searched (see repair_assignment), and
+        teacher allocation, solver_mode, restarts and the portfolio are not
+        used. Without a stored timetable it solves from scratch.
+        
+        seed fixes the solvers' random choices. With self.cache set, the
+        result is cached under a fingerprint of the compiled input, the
+        other departments' occupancy, the solver settings and the seed, and
+        an identical later request is answered from the cache without
+        searching. Results cut off by a budget are not cached, nor are
+        results with unscheduled sessions unless a seed was given.
+        """
+        with phase(stats, "load"):
+            department_id, department, year_subjects, teachers, rooms = self._load_documents(
+                department_id, create_demo=create_demo)
+        if not create_demo:
+            if not any(year_subjects.values()):
+                raise ValueError("No subjects found for this department")
+            if not teachers:
+                raise ValueError("No teachers available")
+            if not rooms:
+                raise ValueError("No rooms available")
+        
+        # Get constraints
+        with phase(stats, "constraints"):
+            constraints = self._get_constraints(department, year_subjects, teachers, rooms)
+        grid = constraints["time_grid"]
+        timetables = self._create_timetables(department, grid)
+        
+        # Compile documents into an integer model the solvers work on
+        with phase(stats, "compile"):
+            model = compile_problem(department, year_subjects, teachers, rooms, constraints, grid)
+        
+        # Teacher and room occupancy shared with other years and departments
+        with phase(stats, "load"):
+            if ledger is None:
+                ledger = self.load_ledger(exclude_department=department_id)
+            index = OccupancyIndex.for_model(model)
+            ledger.load_into(index, model)
+            self._block_unavailable(model, index)
+        if hook is not None:
+            hook.total = len(model.sessions)
+        if stats is not None:
+            stats.count("sessions", len(model.sessions))
+        
+        # Start from the last stored timetable if asked to
+        previous = None
+        if warm_start:
+            with phase(stats, "warm start"):
+                previous = recover_assignment(model, self._latest_timetable(department_id))
+            if not previous:
+                print("Warning: No previous timetable to warm-start from, solving from scratch")
+        
+        # Reuse the result of an identical earlier request
+        cache_key = cached = None
+        if self.cache is not None:
+            with phase(stats, "cache"):
+                cache_key = fingerprint(
+                    model, index.teachers, index.rooms, solver_mode=self.solver_mode, seed=seed,
+                    restarts=restarts, time_limit=time_limit, improve_time=improve_time,
+                    improve_iterations=improve_iterations, allocate=allocate,
+                    max_nodes=self.max_search_nodes, search_time_limit=self.search_time_limit,
+                    portfolio=self.portfolio if self.solver_mode == PORTFOLIO_MODE else None,
+                    previous=sorted(previous.items()) if previous else None)
+                cached = self.cache.get(cache_key)
+            if stats is not None:
+                stats.count("cache_hits" if cached is not None else "cache_misses")
+        
+        # Fix teachers of open subjects so the search only places (subject, teacher) pairs;
+        # a warm start keeps the teachers of the stored timetable instead
+        if allocate and not previous and cached is None:
+            with phase(stats, "allocate"):
+                allocation = allocate_teachers(model, index, constraints.get("teacher_subjects"))
+            if allocation["open"]:
+                print(f"Warning: {len(allocation['open'])} sessions left without a fixed teacher")
+        
+        # Positions no eligible teacher is free for are pruned before any search
+        with phase(stats, "compile"):
+            model.restrict_positions(index.teachers)
+        
+        # Fail fast on inputs that cannot fit, before any search
+        if precheck and cached is None:
+            with phase(stats, "precheck"):
+                report = check_feasibility(model, index)
+            if not report["feasible"]:
+                for violation in report["violations"]:
+                    print(f"Infeasible: {violation['message']}")
+                raise InfeasibleError(report)
+        
+        # Solve every year, keeping the best of several seeded runs if asked to
+        budget = time_limit if time_limit is not None else self.search_time_limit
+        deadline = time.monotonic() + budget
+        # Strategies that improve their own construction take the improvement budget
+        options = {}
+        strategy_improves = not previous and hasattr(STRATEGIES.get(self.solver_mode), "improve_time")
+        if strategy_improves:
+            if improve_time is not None:
+                options["improve_time"] = improve_time
+            if improve_iterations is not None:
+                options["improve_iterations"] = improve_iterations
+        if cached is not None:
+            result = self._cached_result(model, cached)
+        elif previous:
+            with phase(stats, "solve"):
+                result = self._warm_start(model, index, previous, time_limit=max(0.0, deadline - time.monotonic()),
+                                          stats=stats)
+        elif self.solver_mode == PORTFOLIO_MODE:
+            with phase(stats, "solve"):
+                result = solve_portfolio(model, index.teachers, index.rooms, self.portfolio, time_limit=budget,
+                                         max_nodes=self.max_search_nodes, seed=seed, hook=hook, stats=stats)
+            if hook is not None and hook.cancelled:
+                raise GenerationCancelled("Timetable generation was cancelled")
+            if result is None:
+                print("Warning: No portfolio entry finished within the time limit")
+                return None
+        elif restarts > 1:
+            with phase(stats, "solve"):
+                result = multi_start(model, self.solver_mode, index.teachers, index.rooms, restarts,
+                                     time_limit=budget, max_nodes=self.max_search_nodes, seed=seed,
+                                     hook=hook, stats=stats, options=options)
+            if hook is not None and hook.cancelled:
+                raise GenerationCancelled("Timetable generation was cancelled")
+            if result is None:
+                print(f"Warning: No solver run finished within {budget} seconds")
+                return None
+        else:
+            with phase(stats, "solve"):
+                result = solve_model(model, self.solver_mode, seed, index.teachers, index.rooms,
+                                     max_nodes=self.max_search_nodes, time_limit=budget, hook=hook, stats=stats,
+                                     options=options)
+            if hook is not None and hook.cancelled:
+                raise GenerationCancelled("Timetable generation was cancelled")
+        
+        for failure in result["failed_years"]:
+            reason = "search limit reached" if failure["timed_out"] else "no valid assignment exists"
+            print(f"Warning: Could not schedule {failure['year']} ({reason} after {failure['nodes']} nodes)")
+        if result["failed_years"]:
+            return None
+        if result["cut_off"]:
+            print("Warning: Search stopped at its time or node limit; keeping the best timetable found")
+        self._report_unscheduled(model, result["unscheduled"])
+        if stats is not None:
+            stats.count("unscheduled", len(result["unscheduled"]))
+            if result["cut_off"]:
+                stats.count("cut_off")
+        
+        assignment = result["assignment"]
+        workload = [0] * len(model.teachers)
+        for session_id, (day, slots, mask, teacher, room) in assignment.items():
+            session = model.sessions[session_id]
+            index.place(mask, day, teacher=teacher, room=room, groups=session.groups, subject=session.subject)
+            workload[teacher] += session.length
+        
+        # Optional local search on the soft penalty, hard constraints kept
+        if (improve_time or improve_iterations) and cached is None and not strategy_improves:
+            if hook is not None:
+                hook.begin("improve")
+            remaining = max(0.0, deadline - time.monotonic())
+            improver = AnnealingImprover(model, index, assignment, workload,
+                                         time_limit=improve_budget(improve_time, remaining),
+                                         max_iterations=improve_iterations, hook=hook, stats=stats)
+            with phase(stats, "improve"):
+                assignment = improver.run()
+            if hook is not None and hook.cancelled:
+                raise GenerationCancelled("Timetable generation was cancelled")
+        
+        # Cut-off results depend on timing, so only finished solves are cached; one
+        # that left sessions unscheduled only under a seed, so asking again
+        # without one searches again
+        if (cache_key is not None and cached is None and not result["cut_off"]
+                and (seed is not None or not result["unscheduled"])):
+            self.cache.put(cache_key, {
+                "assignment": [[session_id, day, list(slots), teacher, room]
+                               for session_id, (day, slots, mask, teacher, room) in assignment.items()],
+                "unscheduled": result["unscheduled"]
+            })
+        
+        # Make the placements visible to later departments
+        ledger.record(index, model)
+        
+        with phase(stats, "format"):
+            return model.materialize(assignment, timetables)
+    
+    def _cached_result(self, model, entry):
+        """A solve_model result rebuilt from a ResultCache entry"""
+        assignment = {}
+        for session_id, day, slots, teacher, room in entry["assignment"]:
+            assignment[session_id] = (day, tuple(slots), model.cell_mask(day, slots), teacher, room)
+        return {
+            "seed": None,
+            "assignment": assignment,
+            "unscheduled": list(entry["unscheduled"]),
+            "failed_years": [],
+            "penalty": soft_penalty(model, assignment),
+            "cut_off": False
+        }
+    
+    def _latest_timetable(self, department_id):
+        """
+        Grids of the department's most recently stored timetable, generated
+        (raw_data) or imported (timetables), or {}
+        """
+        query = {"department_id": {"$in": [department_id, str(department_id)]}}
+        documents = self.db.timetables.find(query, {"created_at": 1})
+        latest = max(documents, key=lambda d: str(d.get("created_at", "")), default=None)
+        if latest is None:
+            return {}
+        return self._stored_grids(self.db.timetables.find_one({"_id": latest["_id"]}) or {})
+    
+    @staticmethod
+    def _stored_grids(document):
+        """Grids of a stored timetable document, generated (raw_data) or imported (timetables), or {}"""
+        grids = document.get("raw_data") or document.get("timetables") or {}
+        return grids if isinstance(grids, dict) else {}
+    
+    def _warm_start(self, model, index, previous, time_limit=None, stats=None):
+        """
+        Repair a recovered assignment on a copy of the shared occupancy within
+        time_limit seconds; returns a solve_model result
+        """
+        warm_index = OccupancyIndex.for_model(model)
+        warm_index.teachers[:] = index.teachers
+        warm_index.rooms[:] = index.rooms
+        warm_index.track_room_cells(len(model.days) * model.slots_per_day)
+        workload = [0] * len(model.teachers)
+        result = repair_assignment(model, warm_index, previous, workload, max_nodes=self.max_search_nodes,
+                                   time_limit=time_limit)
+        assignment = result["assignment"]
+        if stats is not None:
+            stats.count("kept", sum(1 for session_id, value in assignment.items()
+                                    if previous.get(session_id) == value))
+            stats.count("moved_cells", result["moved_cells"])
+        return {
+            "seed": None,
+            "assignment": assignment,
+            "unscheduled": result["unscheduled"],
+            "failed_years": [],
+            "penalty": soft_penalty(model, assignment),
+            "cut_off": result["cut_off"]
+        }
+    
+    def load_ledger(self, exclude_department=None, exclude_departments=None):
+        """
+        Seed a ledger from the latest stored timetable of every other
+        department. The ledger spans the union of every department's bell
+        schedule, so extra working days and other slot times survive the
+        translation into and out of it.
+        """
+        grid = TimeGrid.union([self._time_grid(None)] +
+                              [self._time_grid(department) for department in self.db.departments.find({})])
+        ledger = ResourceLedger(grid.days, grid.time_slots)
+        excluded = list(exclude_departments or [])
+        if exclude_department is not None:
+            excluded.append(exclude_department)
+        ledger.seed_from_collection(self.db.timetables, exclude_departments=excluded)
+        return ledger
+    
+    def save_timetable(self, department_id, academic_year, timetables, stats=None):
+        """
+        Store raw timetables with the occupancy summary used to seed ledgers
+        and, if given, the RunStats (or its as_dict()) of their generation
+        """
+        if isinstance(department_id, str):
+            try:
+                department_id = ObjectId(department_id)
+            except:
+                pass
+        
+        grid = self._time_grid(self.db.departments.find_one({"_id": department_id}))
+        ledger = ResourceLedger(grid.days, grid.time_slots)
+        document = {
+            "department_id": department_id,
+            "academic_year": academic_year,
+            "type": "raw",
+            "raw_data": timetables,
+            "occupancy": ledger.occupancy_document(timetables),
+            "created_at": datetime.now()
+        }
+        if stats is not None:
+            document["stats"] = stats if isinstance(stats, dict) else stats.as_dict()
+        result = self.db.timetables.insert_one(document)
+        return str(result.inserted_id)
+
+    def repair_timetable(self, timetable_id, changes):
+        """
+        Update a stored timetable after a change without regenerating it.
+
+        Supported changes:
+            {"type": "teacher_unavailable", "teacher": code, "days": [...], "time_slots": [...]}
+            {"type": "room_unavailable", "room": number, "days": [...], "time_slots": [...]}
+            {"type": "subject_sessions", "subject": code, "year": year, "per_week": count}
+        Omitted days or time_slots mean all of them. Only the sessions the
+        change invalidates are re-solved; the rest keep their cells. The
+        stored document is updated in place.
+        """
+        if isinstance(timetable_id, str):
+            try:
+                timetable_id = ObjectId(timetable_id)
+            except:
+                pass
+
+        document = self.db.timetables.find_one({"_id": timetable_id})
+        if not document:
+            raise ValueError("Timetable not found")
+
+        department_id, department, year_subjects, teachers, rooms = self._load_documents(
+            document["department_id"], create_demo=False)
+        year_subjects = self._apply_subject_changes(year_subjects, changes)
+        constraints = self._get_constraints(department, year_subjects, teachers, rooms)
+        grid = constraints["time_grid"]
+        model = compile_problem(department, year_subjects, teachers, rooms, constraints, grid)
+
+        ledger = self.load_ledger(exclude_department=department_id)
+        index = OccupancyIndex.for_model(model)
+        ledger.load_into(index, model)
+        self._block_unavailable(model, index)
+        self._block_resources(model, index, changes)
+
+        previous = recover_assignment(model, self._stored_grids(document))
+        workload = [0] * len(model.teachers)
+        result = repair_assignment(model, index, previous, workload, max_nodes=self.max_search_nodes,
+                                   time_limit=self.search_time_limit)
+        self._report_unscheduled(model, result["unscheduled"])
+
+        timetables = model.materialize(result["assignment"], self._create_timetables(department, grid))
+        self.db.timetables.update_one({"_id": timetable_id}, {"$set": {
+            "raw_data": timetables,
+            "occupancy": ResourceLedger(grid.days, grid.time_slots).occupancy_document(timetables),
+            "updated_at": datetime.now()
+        }})
+
+        return {
+            "timetables": timetables,
+            "moved_cells": result["moved_cells"],
+            "reassigned": result["reassigned"],
+            "unscheduled": len(result["unscheduled"]),
+            "resolved_years": result["widened_years"]
+        }
+
+    def score_timetables(self, timetable_ids, weights=None):
+        """
+        Soft-constraint metrics of stored timetables, scored as one batch.
+        
+        Returns one dict per found timetable with its id and the metrics of
+        solver.tensor_scoring.score_tensors; weights override the default
+        weight of any metric in the penalty. Unknown ids are skipped.
+        """
+        documents = []
+        for timetable_id in timetable_ids:
+            if isinstance(timetable_id, str):
+                try:
+                    timetable_id = ObjectId(timetable_id)
+                except:
+                    pass
+            document = self.db.timetables.find_one({"_id": timetable_id})
+            if document:
+                documents.append(document)
+        
+        calendars = {teacher.get("code"): teacher["calendar"]
+                     for teacher in self.db.teachers.find({}) if teacher.get("calendar")}
+        scores = score_grids([self._stored_grids(document) for document in documents], weights, calendars)
+        return [dict(score, timetable_id=str(document["_id"])) for document, score in zip(documents, scores)]
+
+    def _apply_subject_changes(self, year_subjects, changes):
+        """Copies of the subject documents with per-week counts overridden"""
+        overrides = {}
+        for change in changes:
+            if change.get("type") != "subject_sessions":
+                continue
+            per_week = change.get("per_week")
+            if not isinstance(per_week, int) or per_week < 0:
+                raise ValueError("per_week must be a non-negative integer")
+            overrides[(change.get("year"), change.get("subject"))] = per_week
+
+        updated = {}
+        for year, subjects in year_subjects.items():
+            updated[year] = []
+            for subject in subjects:
+                subject = dict(subject)
+                for key in ((year, subject.get("code")), (None, subject.get("code"))):
+                    if key in overrides:
+                        field = "lectures_per_week" if subject.get("type") == "lecture" else "practicals_per_week"
+                        subject[field] = overrides[key]
+                        break
+                updated[year].append(subject)
+        return updated
+
+    def _block_resources(self, model, index, changes):
+        """Mark the cells a teacher or room became unavailable in as taken"""
+        day_ids = {day: i for i, day in enumerate(model.days)}
+        slot_ids = {slot: i for i, slot in enumerate(model.time_slots)}
+        teacher_ids = {teacher.code: teacher.id for teacher in model.teachers}
+        room_ids = {room.number: room.id for room in model.rooms}
+
+        for change in changes:
+            kind = change.get("type")
+            if kind == "subject_sessions":
+                continue
+            if kind not in ("teacher_unavailable", "room_unavailable"):
+                raise ValueError(f"Unknown change type: {kind}")
+
+            days = change.get("days") or model.days
+            slots = change.get("time_slots") or model.time_slots
+            if any(day not in day_ids for day in days) or any(slot not in slot_ids for slot in slots):
+                raise ValueError("Unknown day or time slot in change")
+            mask = 0
+            for day in days:
+                mask |= model.cell_mask(day_ids[day], [slot_ids[slot] for slot in slots])
+
+            if kind == "teacher_unavailable":
+                if change.get("teacher") not in teacher_ids:
+                    raise ValueError(f"Unknown teacher: {change.get('teacher')}")
+                index.teachers[teacher_ids[change["teacher"]]] |= mask
+            else:
+                if change.get("room") not in room_ids:
+                    raise ValueError(f"Unknown room: {change.get('room')}")
+                index.rooms[room_ids[change["room"]]] |= mask
+
+    def _block_unavailable(self, model, index):
+        """Take the cells teachers' calendars mark unavailable"""
+        for teacher in model.teachers:
+            index.teachers[teacher.id] |= teacher.unavailable
+
+    def _load_documents(self, department_id, create_demo=True):
+        """
+        Fetch the department with its subjects per year, teachers and rooms.
+        Demo data is created for anything missing when create_demo is set.
+        """
         # Convert string ID to ObjectId if needed
         if isinstance(department_id, str):
             try:
@@ -85,7 +591,7 @@ class TimetableGenerator:
                 "year": year
             }))
             
-            if not subjects:
+            if not subjects and create_demo:
                 print(f"No subjects found for {year} year. Creating demo subjects...")
                 # Create demo subjects
                 if year == "SE":
@@ -105,7 +611,7 @@ class TimetableGenerator:
                 {"departments": department_id}
             ]
         }))
-        if not teachers:
+        if not teachers and create_demo:
             print("No teachers found. Creating demo teachers...")
             teachers = self._create_demo_teachers(department_id)
         
@@ -113,72 +619,59 @@ class TimetableGenerator:
         rooms = list(self.db.rooms.find({
             "type": {"$in": ["classroom", "lecture_hall", "lab", "computer_lab"]}
         }))
-        if not rooms:
+        if not rooms and create_demo:
             print("No rooms found. Creating demo rooms...")
             rooms = self._create_demo_rooms()
         
+        return department_id, department, year_subjects, teachers, rooms
+    
+    def _create_timetables(self, department, grid):
+        """Empty Main and batch timetables for every year"""
         # Initialize timetables for all years and batches
         timetables = {}
         for year in self.years:
-            timetables[f"{year}_Main"] = self._create_empty_timetable()  # For lectures
+            timetables[f"{year}_Main"] = self._create_empty_timetable(grid)  # For lectures
             # Create batch timetables based on department configuration
             num_batches = department.get("years", {}).get(year, {}).get("num_batches", 3)
             for batch_num in range(1, num_batches + 1):
-                timetables[f"{year}_B{batch_num}"] = self._create_empty_timetable()
-        
-        # Get constraints
-        constraints = self._get_constraints(department, year_subjects, teachers, rooms)
-        
-        # Schedule for each year
-        for year in self.years:
-            year_success = self._schedule_year(
-                year,
-                timetables,
-                year_subjects[year],
-                teachers,
-                rooms,
-                constraints,
-                existing_timetables={}  # We'll check conflicts directly in the timetables object
-            )
-            if not year_success:
-                return None
-        
+                timetables[f"{year}_B{batch_num}"] = self._create_empty_timetable(grid)
         return timetables
     
-    def _schedule_year(self, year, timetables, subjects, teachers, rooms, constraints, existing_timetables):
-        """Schedule timetable for a specific year"""
-        # First schedule lectures
-        lecture_success = self._schedule_lectures(
-            timetables[f"{year}_Main"],
-            [s for s in subjects if s.get("type") == "lecture"],
-            teachers,
-            rooms,
-            constraints,
-            existing_timetables
-        )
-        
-        if not lecture_success:
-            return False
-        
-        # Then schedule practicals for each batch
-        practical_success = self._schedule_practicals(
-            timetables,
-            [s for s in subjects if s.get("type") == "practical"],
-            teachers,
-            rooms,
-            constraints,
-            existing_timetables
-        )
+    def _time_grid(self, department):
+        """
+        The department's bell schedule compiled into a TimeGrid: its own
+        time_slots ("start - end" labels), breaks and working_days where set,
+        the defaults otherwise
+        """
+        department = department or {}
+        working_days = department.get("working_days") or self.days
+        days = self.days + [day for day in working_days if day not in self.days]
+        return TimeGrid(days, department.get("time_slots") or self.time_slots,
+                        department.get("breaks", self.break_slots), working_days)
+    
+    def _report_unscheduled(self, model, session_ids):
+        """Print a warning for every subject and group with missing sessions"""
+        missing = defaultdict(int)
+        for session_id in session_ids:
+            session = model.sessions[session_id]
+            missing[(session.subject, session.groups[0])] += 1
         
-        return practical_success
+        for (subject_id, group), count in missing.items():
+            subject = model.subjects[subject_id]
+            if subject.kind == "lecture":
+                scheduled = subject.per_week - count
+                print(f"Warning: Scheduled only {scheduled} of {subject.per_week} lectures for {subject.name or subject.code}")
+            else:
+                batch = model.groups[group].split("_", 1)[1]
+                print(f"Warning: Could not schedule all practicals for {subject.name or subject.code} - Batch {batch}")
     
-    def _create_empty_timetable(self):
+    def _create_empty_timetable(self, grid):
         """Create an empty timetable structure"""
         timetable = {}
-        for day in self.days:
+        for day in grid.days:
             timetable[day] = {}
-            for time_slot in self.time_slots:
-                if time_slot in self.break_slots:
+            for time_slot in grid.time_slots:
+                if time_slot in grid.break_slots:
                     timetable[day][time_slot] = {
                         "subject": "BREAK",
                         "teacher": None,
@@ -196,6 +689,7 @@ class TimetableGenerator:
     
     def _get_constraints(self, department, year_subjects, teachers, rooms):
         """Get all constraints for timetable generation"""
+        grid = self._time_grid(department)
         constraints = {
             "teacher_availability": defaultdict(dict),
             "room_availability": defaultdict(dict),
@@ -207,9 +701,9 @@ class TimetableGenerator:
             "max_practicals_per_subject": 1,  # Practicals once per week
             "practical_duration": 2,          # Practicals are 2 hours
             "lecture_duration": 1,            # Lectures are 1 hour
-            "break_slots": self.break_slots,
-            "practical_slot_pairs": self.practical_slot_pairs,
-            "working_days": self.days         # Default to all weekdays
+            "time_grid": grid,                # Slots, breaks and working days of the department
+            "break_slots": grid.break_slots,
+            "working_days": [grid.days[day] for day in grid.working_days]
         }
         
         # Set up department subject priority
@@ -248,14 +742,6 @@ class TimetableGenerator:
         
         # Add department-specific constraints if available
         if department:
-            # Department might specify specific working days
-            if "working_days" in department:
-                constraints["working_days"] = department["working_days"]
-                
-            # Department might specify specific break times
-            if "breaks" in department:
-                constraints["break_slots"] = department["breaks"]
-                
             # Department might have specific room requirements
             if "room_requirements" in department:
                 constraints["room_requirements"] = department["room_requirements"]
@@ -267,345 +753,12 @@ class TimetableGenerator:
                     
         return constraints
     
-    def _check_teacher_conflict(self, teacher_id, day, time_slot, existing_timetables):
-        """Check if a teacher is already scheduled in other years/batches"""
-        for year_timetable in existing_timetables:
-            for timetable in year_timetable.values():
-                if timetable[day][time_slot].get("teacher") == teacher_id:
-                    return True
-        return False
-    
-    def _check_room_conflict(self, room_id, day, time_slot, existing_timetables):
-        """Check if a room is already scheduled in other years/batches"""
-        for year_timetable in existing_timetables:
-            for timetable in year_timetable.values():
-                if timetable[day][time_slot].get("room") == room_id:
-                    return True
-        return False
-    
-    def _schedule_lectures(self, timetable, subjects, teachers, rooms, constraints, existing_timetables):
-        """
-        Schedule lectures for all branches together in the Main timetable
-        """
-        # Get working days (default or department-specific)
-        working_days = constraints.get("working_days", self.days)
-        
-        # Get lecture subjects and sort by priority
-        lecture_subjects = subjects
-        if not lecture_subjects:
-            return True  # No lectures to schedule
-            
-        # Sort by priority if available
-        if "department_subject_priority" in constraints:
-            lecture_subjects.sort(key=lambda s: constraints["department_subject_priority"].get(str(s["_id"]), 5), reverse=True)
-        
-        # Track subjects that have been scheduled
-        scheduled_subjects = defaultdict(int)
-        
-        # Try to schedule each subject
-        for subject in lecture_subjects:
-            subject_id = subject.get("code", "SUBJ")  # Use code as ID for display
-            max_lectures = subject.get("lectures_per_week", constraints.get("max_lectures_per_subject", 3))
-            
-            while scheduled_subjects[subject_id] < max_lectures:
-                # Try to find a valid slot for this lecture
-                scheduled = False
-                
-                # Randomize day and time slot order for variety
-                days = list(working_days)
-                random.shuffle(days)
-                
-                for day in days:
-                    # Skip if we've already scheduled this subject on this day
-                    day_scheduled = False
-                    for time in self.time_slots:
-                        if time in self.break_slots:
-                            continue
-                        if timetable[day][time]["subject"] == subject_id:
-                            day_scheduled = True
-                            break
-                            
-                    if day_scheduled:
-                        continue
-                        
-                    # Get available time slots (excluding breaks)
-                    available_slots = [time for time in self.time_slots 
-                                      if time not in self.break_slots 
-                                      and timetable[day][time]["subject"] is None]
-                    random.shuffle(available_slots)
-                    
-                    for time_slot in available_slots:
-                        # Check if valid slot (not a break)
-                        if time_slot in self.break_slots:
-                            continue
-                            
-                        # Select an available teacher for this subject
-                        available_teachers = [t for t in teachers 
-                                            if subject.get("teacher_id") is None  # If no specific teacher
-                                            or t["_id"] == subject.get("teacher_id")]
-                                            
-                        random.shuffle(available_teachers)
-                        teacher_assigned = False
-                        
-                        for teacher in available_teachers:
-                            teacher_id = teacher.get("code", "TCH")  # Use code for display
-                            
-                            # Check if teacher is available at this time
-                            if self._check_teacher_conflict(teacher_id, day, time_slot, existing_timetables):
-                                continue
-                                
-                            # Check if teacher workload constraint is satisfied
-                            if constraints["teacher_workload"][teacher_id] >= constraints["teacher_max_workload"][teacher_id]:
-                                continue
-                                
-                            # Select an appropriate room
-                            room_types = constraints["room_types"]["lecture"]
-                            available_rooms = [r for r in rooms if r.get("type", "") in room_types]
-                            random.shuffle(available_rooms)
-                            
-                            room_assigned = False
-                            for room in available_rooms:
-                                room_id = room.get("number", "RM")  # Use room number for display
-                                
-                                # Check if room is available
-                                if self._check_room_conflict(room_id, day, time_slot, existing_timetables):
-                                    continue
-                                    
-                                # We can schedule the lecture here!
-                                timetable[day][time_slot] = {
-                                    "subject": subject_id,
-                                    "teacher": teacher_id,
-                                    "room": room_id,
-                                    "type": "lecture"
-                                }
-                                
-                                # Update constraints
-                                constraints["teacher_workload"][teacher_id] += 1
-                                scheduled_subjects[subject_id] += 1
-                                scheduled = True
-                                teacher_assigned = True
-                                room_assigned = True
-                                break
-                                
-                            if room_assigned:
-                                break
-                                
-                        if teacher_assigned:
-                            break
-                            
-                    if scheduled:
-                        break
-                        
-                if not scheduled:
-                    # Could not schedule this lecture, might be impossible with current constraints
-                    print(f"Warning: Could not schedule all lectures for {subject.get('name', subject_id)}")
-                    break
-        
-        # Check if all required lectures were scheduled
-        for subject in lecture_subjects:
-            subject_id = subject.get("code", "SUBJ")
-            required_lectures = subject.get("lectures_per_week", constraints.get("max_lectures_per_subject", 3))
-            if scheduled_subjects[subject_id] < required_lectures:
-                print(f"Warning: Scheduled only {scheduled_subjects[subject_id]} of {required_lectures} lectures for {subject.get('name', subject_id)}")
-                
-        return True  # Return success even with warnings
-        
-    def _schedule_practicals(self, timetables, subjects, teachers, rooms, constraints, existing_timetables):
-        """
-        Schedule practical sessions for each batch separately (B1, B2, B3)
-        """
-        # Get working days
-        working_days = constraints.get("working_days", self.days)
-        
-        # Get practical subjects
-        practical_subjects = subjects
-        if not practical_subjects:
-            return True  # No practicals to schedule
-            
-        # Get batch structure from constraints
-        batch_counts = {}
-        for year in self.years:
-            year_key = f"{year}_batch_count"
-            batch_counts[year] = constraints.get(year_key, 3)  # Default to 3 batches if not specified
-            
-        # Track practicals that have been scheduled
-        scheduled_practicals = defaultdict(lambda: defaultdict(int))  # {subject_id: {batch: count}}
-        
-        # Try to schedule each practical for each batch
-        for subject in practical_subjects:
-            subject_id = subject.get("code", "SUBJ")
-            year = subject.get("year", "TE")  # Default to TE if not specified
-            max_practicals = subject.get("practicals_per_week", constraints.get("max_practicals_per_subject", 1))
-            
-            # Get all batch names for this year
-            batch_names = [f"B{i}" for i in range(1, batch_counts.get(year, 3) + 1)]
-            
-            # For each batch, schedule the practical
-            for batch_num, batch_name in enumerate(batch_names, 1):
-                while scheduled_practicals[subject_id][batch_name] < max_practicals:
-                    # Try to find a valid slot for this practical
-                    scheduled = False
-                    
-                    # Get consecutive slots needed for practical
-                    consecutive_slots = subject.get("consecutive_slots", constraints.get("practical_duration", 2))
-                    
-                    # Get list of slot pairs
-                    slot_pairs = constraints.get("practical_slot_pairs", self.practical_slot_pairs)
-                    if consecutive_slots > 2:
-                        # If we need more than 2 consecutive slots, we need to build custom pairs
-                        # This is a simplified version that assumes 2-hour practicals
-                        slot_pairs = self.practical_slot_pairs
-                        
-                    # Randomize day order for variety
-                    days = list(working_days)
-                    random.shuffle(days)
-                    
-                    for day in days:
-                        # Randomize slot pair order
-                        slot_pair_indices = list(range(len(slot_pairs)))
-                        random.shuffle(slot_pair_indices)
-                        
-                        for idx in slot_pair_indices:
-                            slot_group = slot_pairs[idx]
-                            
-                            # Check if these slots are available for this batch
-                            batch_timetable_key = f"{year}_{batch_name}"
-                            
-                            # Check if all slots are available
-                            can_schedule = True
-                            for slot in slot_group:
-                                # Skip if slot is a break
-                                if slot in self.break_slots:
-                                    can_schedule = False
-                                    break
-                                    
-                                # Check if slot is already scheduled in main or batch timetable
-                                if timetables[f"{year}_Main"][day][slot]["subject"] is not None:
-                                    can_schedule = False
-                                    break
-                                    
-                                if timetables[batch_timetable_key][day][slot]["subject"] is not None:
-                                    can_schedule = False
-                                    break
-                                    
-                            if not can_schedule:
-                                continue
-                                
-                            # Find an available teacher
-                            available_teachers = [t for t in teachers 
-                                                if subject.get("teacher_id") is None  # If no specific teacher
-                                                or t["_id"] == subject.get("teacher_id")]
-                            random.shuffle(available_teachers)
-                            
-                            teacher_assigned = False
-                            for teacher in available_teachers:
-                                teacher_id = teacher.get("code", "TCH")
-                                
-                                # Check if teacher is available for all slots
-                                teacher_available = True
-                                for slot in slot_group:
-                                    # Check conflicts with existing timetables
-                                    if self._check_teacher_conflict(teacher_id, day, slot, existing_timetables):
-                                        teacher_available = False
-                                        break
-                                        
-                                    # Check if teacher is busy with another practical in a different batch
-                                    for other_batch in batch_names:
-                                        if other_batch != batch_name:
-                                            other_batch_key = f"{year}_{other_batch}"
-                                            if other_batch_key in timetables:
-                                                other_slot = timetables[other_batch_key][day][slot]
-                                                if other_slot.get("teacher") == teacher_id and other_slot.get("type") == "practical":
-                                                    teacher_available = False
-                                                    break
-                                                    
-                                if not teacher_available:
-                                    continue
-                                    
-                                # Find an available lab room
-                                room_types = constraints["room_types"]["practical"]
-                                available_rooms = [r for r in rooms if r.get("type", "") in room_types]
-                                random.shuffle(available_rooms)
-                                
-                                room_assigned = False
-                                for room in available_rooms:
-                                    room_id = room.get("number", "LAB")
-                                    
-                                    # Check if room is available for all slots
-                                    room_available = True
-                                    for slot in slot_group:
-                                        # Check conflicts with existing timetables
-                                        if self._check_room_conflict(room_id, day, slot, existing_timetables):
-                                            room_available = False
-                                            break
-                                            
-                                        # Check if room is busy with another practical
-                                        for other_batch in batch_names:
-                                            if other_batch != batch_name:
-                                                other_batch_key = f"{year}_{other_batch}"
-                                                if other_batch_key in timetables:
-                                                    other_slot = timetables[other_batch_key][day][slot]
-                                                    if (other_slot.get("room") == room_id and 
-                                                        other_slot.get("type") == "practical"):
-                                                        room_available = False
-                                                        break
-                                                        
-                                    if not room_available:
-                                        continue
-                                        
-                                    # We can schedule the practical here!
-                                    for slot in slot_group:
-                                        timetables[batch_timetable_key][day][slot] = {
-                                            "subject": subject_id,
-                                            "teacher": teacher_id,
-                                            "room": room_id,
-                                            "type": "practical",
-                                            "batch": batch_name
-                                        }
-                                        
-                                    # Update counters
-                                    constraints["teacher_workload"][teacher_id] += consecutive_slots
-                                    scheduled_practicals[subject_id][batch_name] += 1
-                                    scheduled = True
-                                    room_assigned = True
-                                    break
-                                    
-                                if room_assigned:
-                                    teacher_assigned = True
-                                    break
-                                    
-                            if teacher_assigned:
-                                break
-                                
-                        if scheduled:
-                            break
-                            
-                    if not scheduled:
-                        # Could not schedule this practical
-                        print(f"Warning: Could not schedule practical for {subject.get('name', subject_id)} - Batch {batch_name}")
-                        break
-                        
-        # Check if all required practicals were scheduled
-        all_scheduled = True
-        for subject in practical_subjects:
-            subject_id = subject.get("code", "SUBJ")
-            year = subject.get("year", "TE")
-            required_practicals = subject.get("practicals_per_week", constraints.get("max_practicals_per_subject", 1))
-            
-            batch_names = [f"B{i}" for i in range(1, batch_counts.get(year, 3) + 1)]
-            for batch_name in batch_names:
-                if scheduled_practicals[subject_id][batch_name] < required_practicals:
-                    print(f"Warning: Could not schedule all practicals for {subject.get('name', subject_id)} - Batch {batch_name}")
-                    all_scheduled = False
-                    
-        return True  # Return success even with warnings
-        
-    def generate_formatted_timetable(self, department_id, academic_year):
+    def generate_formatted_timetable(self, department_id, academic_year, stats=None):
         """
         Generate timetable and format it according to department-specific requirements
         """
         # Generate raw timetable first
-        timetables = self.generate_timetable(department_id, academic_year)
+        timetables = self.generate_timetable(department_id, academic_year, stats=stats)
         if not timetables:
             return None
             
@@ -620,7 +773,8 @@ class TimetableGenerator:
         # Process each academic year
         for year in ["SE", "TE", "BE"]:
             # Create a combined timetable for this year
-            formatted_timetables[year] = self._format_combined_timetable(timetables, year, department)
+            with phase(stats, "format"):
+                formatted_timetables[year] = self._format_combined_timetable(timetables, year, department)
                 
         return formatted_timetables
         
@@ -641,17 +795,18 @@ class TimetableGenerator:
         combined_timetable = {}
         
         # Initialize the structure first - time slots as primary keys
-        time_slots_without_breaks = [ts for ts in self.time_slots if ts not in self.break_slots]
+        grid = self._time_grid(department)
+        time_slots_without_breaks = [grid.time_slots[slot] for slot in grid.teaching_slots]
         for time_slot in time_slots_without_breaks:
             combined_timetable[time_slot] = {}
-            for day in self.days:
+            for day in grid.days:
                 combined_timetable[time_slot][day] = "-"  # Empty slot by default
         
         # Fill in the lectures from main timetable
-        for day in self.days:
+        for day in grid.days:
             for time_slot in time_slots_without_breaks:
                 # Skip breaks
-                if time_slot in self.break_slots:
+                if time_slot in grid.break_slots:
                     continue
                 
                 # Get main timetable entry (lectures)
@@ -671,10 +826,10 @@ class TimetableGenerator:
             batch_key = f"{year}_{batch_name}"
             
             if batch_key in timetables:
-                for day in self.days:
+                for day in grid.days:
                     for time_slot in time_slots_without_breaks:
                         # Skip breaks
-                        if time_slot in self.break_slots:
+                        if time_slot in grid.break_slots:
                             continue
                         
                         batch_slot = timetables[batch_key][day][time_slot]